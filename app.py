@@ -1,23 +1,55 @@
 import streamlit as st
+import argparse
 import base64
 import cv2
+import json
 import numpy as np
 import pandas as pd
-import plotly.express as px
 from datetime import datetime
 import time
+from streamlit.runtime.scriptrunner import add_script_run_ctx
 
 from cam_handler import CameraHandler
-from pose_behavior import BehaviorDetector
-from emotion_engine import EmotionDetector
+from dashboard_charts import AnalyticsPanelState
 from dashboard_metrics import AnalyticsTracker
+from detection_log import DetectionLog
+from detector_factory import DETECTOR_FACTORY
+from frame_pacer import FramePacer
+from inference_scheduler import InferenceScheduler
+from inference_service import get_inference_service
+from person_tracker import PersonTracker
+from preview_output import PreviewOutput
+from stage_timing import StageTimer
 
 st.set_page_config(page_title="Human Behavior & Emotion Recognition", layout="wide")
 
+# Chart window choices -> seconds (None = whole session)
+CHART_WINDOWS = {
+    "Whole session": None,
+    "Last minute": 60,
+    "Last 5 minutes": 300,
+    "Last hour": 3600,
+}
+
+def parse_app_args(argv=None):
+    """Process-wide options, shared by every browser session: streamlit run app.py -- --target-latency-ms 60"""
+    parser = argparse.ArgumentParser(description="Human behavior and emotion recognition dashboard")
+    parser.add_argument('--target-latency-ms', type=float, default=None,
+                        help="Adapt model quality to hold per-frame inference near this time")
+    args, _ = parser.parse_known_args(argv)
+    return args
+
+APP_ARGS = parse_app_args()
+
+@st.cache_resource(show_spinner=False)
 def get_base64_encoded_image(image_path):
-    with open(image_path, "rb") as img_file:
-        encoded = base64.b64encode(img_file.read()).decode()
-    return encoded
+    """Base64 of an image file, read and encoded once per process ("" if it is missing)"""
+    try:
+        with open(image_path, "rb") as img_file:
+            return base64.b64encode(img_file.read()).decode()
+    except OSError as e:
+        print(f"Icon not loaded: {str(e)}")
+        return ""
 
 icon_path = r"C:\Users\asus\Downloads\freepik__multi_emotions_person.png"
 icon_base64 = get_base64_encoded_image(icon_path)
@@ -116,9 +148,11 @@ def add_custom_styles():
 
 add_custom_styles()
 
+icon_html = (f'<img src="data:image/png;base64,{icon_base64}" '
+             'style="width:96px; height:96px; vertical-align:middle; margin-right:12px;">' if icon_base64 else '')
 st.markdown(f'''
 <h1 class="animated-title">
-  <img src="data:image/png;base64,{icon_base64}" style="width:96px; height:96px; vertical-align:middle; margin-right:12px;">
+  {icon_html}
   Human Behavior & Emotion Recognition System
 </h1>
 ''', unsafe_allow_html=True)
@@ -130,31 +164,38 @@ threshold = st.sidebar.slider("Select Threshold", 0, 100, 50)
 
 if st.sidebar.button("▶️ Start Detection", key="start", type="primary"):
     st.session_state.running = True
-    st.session_state.camera_handler.initialize_camera(0)
+    st.session_state.start_pressed_at = time.perf_counter()
+    if st.session_state.camera_handler.initialize_camera(0):
+        st.session_state.camera_handler.start_capture(buffer_size=2, drop_policy='oldest')
 
 if st.sidebar.button("⏹️ Stop Detection", key="stop", type="secondary"):
     st.session_state.running = False
     st.session_state.camera_handler.release_camera()
+    if st.session_state.get('detection_log') is not None:
+        st.session_state.detection_log.flush(wait=False)
 
 if st.sidebar.button("🔄 Reset Analytics", key="reset", type="secondary"):
-    st.session_state.analytics = AnalyticsTracker()
+    st.session_state.analytics = AnalyticsTracker(event_log=st.session_state.get('detection_log'))
+    st.session_state.analytics_panel = AnalyticsPanelState()
 
 if st.sidebar.button("📤 Export Session Data", key="export", type="secondary"):
     session_data = st.session_state.analytics.export_session_data()
-    st.download_button("Download JSON", data=str(session_data), file_name="session_data.json")
+    st.download_button("Download JSON", data=json.dumps(session_data, indent=2),
+                       file_name="session_data.json", mime="application/json")
 
 st.sidebar.checkbox("Enable Feature")
 
 if 'analytics' not in st.session_state:
     st.session_state.analytics = AnalyticsTracker()
+if 'analytics_panel' not in st.session_state:
+    st.session_state.analytics_panel = AnalyticsPanelState()
 if 'camera_handler' not in st.session_state:
     st.session_state.camera_handler = CameraHandler()
-if 'behavior_detector' not in st.session_state:
-    st.session_state.behavior_detector = BehaviorDetector()
-if 'emotion_detector' not in st.session_state:
-    st.session_state.emotion_detector = EmotionDetector()
 if 'running' not in st.session_state:
     st.session_state.running = False
+if 'stage_timer' not in st.session_state:
+    # Per browser session: the inference workers are shared, the measurements are not
+    st.session_state.stage_timer = StageTimer()
 
 def main():
     duration = datetime.now() - st.session_state.analytics.session_start
@@ -171,6 +212,33 @@ def main():
         st.header("🖼️ Display Options")
         show_landmarks = st.checkbox("Show Pose Landmarks", True)
         show_face_landmarks = st.checkbox("Show Face Landmarks", True)
+        max_faces = st.slider("Max Faces", 1, 5, 1)
+        chart_window = CHART_WINDOWS[st.selectbox("Chart Window", list(CHART_WINDOWS), index=0)]
+        preview_settings = {
+            'display_width': st.selectbox("Preview Width", [320, 480, 640, 960], index=2),
+            'jpeg_quality': st.slider("Preview JPEG Quality", 30, 95, 70, 5),
+            'max_fps': st.slider("Preview FPS", 1, 30, 15),
+        }
+
+        st.header("⚡ Performance")
+        parallel_inference = st.checkbox("Run pose and face models in parallel", False)
+        use_pose_roi = st.checkbox("Crop face using pose keypoints", False)
+        motion_gating = st.checkbox("Skip inference on static scenes", False)
+        target_fps = st.slider("Target FPS", 5, 30, 30)
+        if APP_ARGS.target_latency_ms is not None:
+            st.caption(f"Adaptive model quality: {APP_ARGS.target_latency_ms:.0f} ms target")
+        fps_placeholder = st.empty()
+        st.session_state.stage_timer.enabled = st.checkbox("Profile pipeline stages", False)
+        timing_placeholder = st.empty()
+        startup_placeholder = st.empty()
+
+        st.header("💾 Logging")
+        update_detection_log(st.checkbox("Save detections to Parquet log", False))
+
+    # Models load after the page is drawn; all browser sessions share one inference service
+    session = ensure_inference_session(max_faces)
+    session.configure(use_pose_roi=use_pose_roi, stage_timer=st.session_state.stage_timer)
+    show_startup_stats(startup_placeholder)
 
     col1, col2 = st.columns([2, 1])
     with col1:
@@ -188,68 +256,182 @@ def main():
         behavior_chart_placeholder = st.empty()
         emotion_chart_placeholder = st.empty()
         activity_placeholder = st.empty()
+        render_placeholder = st.empty()
 
     if st.session_state.running:
         process_video_stream(
             video_placeholder, behavior_placeholder, emotion_placeholder,
             stats_placeholder, behavior_chart_placeholder, emotion_chart_placeholder,
             activity_placeholder, behavior_threshold, emotion_threshold,
-            show_landmarks, show_face_landmarks
+            show_landmarks, show_face_landmarks, parallel_inference, motion_gating,
+            target_fps, fps_placeholder, timing_placeholder, chart_window, render_placeholder,
+            preview_settings
         )
 
+def ensure_inference_session(max_faces):
+    """This browser session's handle on the shared inference service (reopened if the face count changed)"""
+    session = st.session_state.get('inference_session')
+    if session is not None and not session.closed and session.service.max_num_faces == max_faces:
+        return session
+    if session is not None:
+        session.close()
+    with st.spinner("Loading models..."):
+        service = get_inference_service(max_faces, quality_target_ms=APP_ARGS.target_latency_ms)
+        session = st.session_state.inference_session = service.open_session()
+    return session
+
+def show_startup_stats(placeholder):
+    """Cold start and time-to-first-detection for this process"""
+    stats = DETECTOR_FACTORY.get_stats()
+    if stats['cold_start_ms'] is None:
+        return
+    lines = [f"Cold start: {stats['cold_start_ms']:.0f} ms "
+             f"(import {stats['import_ms']:.0f}, build {stats['construct_ms']:.0f}, "
+             f"warm-up {stats['warm_up_ms']:.0f})"]
+    if stats['time_to_first_detection_ms'] is not None:
+        lines.append(f"First detection: {stats['time_to_first_detection_ms']:.0f} ms after start")
+    placeholder.caption("  \n".join(lines))
+
+def update_detection_log(enabled):
+    """Open or close the on-disk detection log and attach it to the tracker"""
+    log = st.session_state.get('detection_log')
+    if enabled and log is None:
+        log = st.session_state.detection_log = DetectionLog()
+    elif not enabled and log is not None:
+        log.close()
+        log = st.session_state.detection_log = None
+    st.session_state.analytics.event_log = log
+    if log is not None:
+        stats = log.get_stats()
+        st.caption(f"{stats['events_written']} events written to {log.directory}/ "
+                   f"({stats['segments_closed']} closed segments)")
+
 def process_video_stream(video_placeholder, behavior_placeholder, emotion_placeholder,
                          stats_placeholder, behavior_chart_placeholder, emotion_chart_placeholder,
                          activity_placeholder, behavior_threshold, emotion_threshold,
-                         show_landmarks, show_face_landmarks):
+                         show_landmarks, show_face_landmarks, parallel_inference=False,
+                         motion_gating=False, target_fps=30, fps_placeholder=None,
+                         timing_placeholder=None, chart_window=None, render_placeholder=None,
+                         preview_settings=None):
+    # Time to first detection is counted from pressing Start, camera setup included
+    started_at = st.session_state.get('start_pressed_at') or time.perf_counter()
+    first_detection = True
     frame_count = 0
-    fps_counter = time.time()
+    pacer = FramePacer(target_fps)
+    scheduler = InferenceScheduler() if motion_gating else None
+    person_tracker = PersonTracker()
+    session = st.session_state.inference_session
+    session.configure(concurrent=parallel_inference, scheduler=scheduler)
+    stage_timer = st.session_state.stage_timer
+    # Placeholders are new on every script run, so everything must be drawn once
+    st.session_state.analytics_panel.invalidate()
+
+    # JPEG encoding and upload of the preview run on their own thread at their own rate
+    preview = PreviewOutput(
+        lambda data: video_placeholder.image(data, output_format="JPEG", use_container_width=True),
+        **(preview_settings or {})
+    )
+    add_script_run_ctx(preview.thread)
+    preview.start()
 
     while st.session_state.running:
-        frame = st.session_state.camera_handler.get_frame()
+        pacer.begin_frame()
+        with stage_timer.stage('capture'):
+            frame = st.session_state.camera_handler.get_frame()
         if frame is None:
             video_placeholder.error("❌ Camera not available.")
             break
 
-        processed_frame = frame.copy()
+        # Detectors read the shared RGB buffer, so landmarks can be drawn on the BGR frame directly
+        processed_frame = frame
 
         try:
-            behavior_result = st.session_state.behavior_detector.detect(frame)
+            result = session.infer(frame)
+            if result is None:
+                # The shared service is saturated: show the frame without new detections
+                ctx, behavior_result, emotion_result = None, None, None
+            else:
+                ctx, behavior_result, emotion_result = result
+            if first_detection and (behavior_result or emotion_result):
+                first_detection = False
+                DETECTOR_FACTORY.record_first_detection(started_at)
             if behavior_result and behavior_result['confidence'] >= behavior_threshold:
                 st.session_state.analytics.add_behavior_detection(
                     behavior_result['behavior'], behavior_result['confidence']
                 )
                 if show_landmarks and behavior_result.get('landmarks'):
-                    processed_frame = st.session_state.behavior_detector.draw_landmarks(
-                        processed_frame, behavior_result['landmarks']
-                    )
-
-            emotion_result = st.session_state.emotion_detector.detect(frame)
-            if emotion_result and emotion_result['confidence'] >= emotion_threshold:
+                    with stage_timer.stage('draw_landmarks'):
+                        processed_frame = session.draw_pose(
+                            processed_frame, behavior_result['landmarks']
+                        )
+
+            faces = emotion_result['faces'] if emotion_result else []
+            # Frames without faces still count as misses, so people who left are dropped
+            if ctx is not None and not ctx.reused:
+                person_tracker.update(faces, ctx.timestamp)
+            for face in faces:
+                if face['confidence'] < emotion_threshold:
+                    continue
                 st.session_state.analytics.add_emotion_detection(
-                    emotion_result['emotion'], emotion_result['confidence']
+                    face['emotion'], face['confidence'], person_id=face.get('person_id')
                 )
-                if show_face_landmarks and emotion_result.get('landmarks'):
-                    processed_frame = st.session_state.emotion_detector.draw_landmarks(
-                        processed_frame, emotion_result['landmarks']
-                    )
+                if show_face_landmarks and face.get('landmarks'):
+                    with stage_timer.stage('draw_landmarks'):
+                        processed_frame = session.draw_face(
+                            processed_frame, face['landmarks']
+                        )
 
-            video_placeholder.image(processed_frame, channels="BGR", use_container_width=True)
-            update_current_detections(behavior_placeholder, emotion_placeholder, behavior_result, emotion_result)
+            with stage_timer.stage('display'):
+                preview.submit(processed_frame)
+            if ctx is not None:
+                update_current_detections(behavior_placeholder, emotion_placeholder, behavior_result, emotion_result)
 
             if frame_count % 30 == 0:
                 update_analytics_display(stats_placeholder, behavior_chart_placeholder,
-                                        emotion_chart_placeholder, activity_placeholder, frame_count)
-
-            fps = 1 / (time.time() - fps_counter)
-            fps_counter = time.time()
-            st.sidebar.metric("FPS", f"{fps:.1f}")
+                                        emotion_chart_placeholder, activity_placeholder, frame_count,
+                                        chart_window, render_placeholder)
 
             frame_count += 1
-            time.sleep(0.033)
+            skipped = pacer.end_frame()
+            if skipped:
+                st.session_state.camera_handler.skip_frames(skipped)
+
+            if fps_placeholder is not None and frame_count % 10 == 0:
+                pacing = pacer.get_stats()
+                preview_stats = preview.get_stats()
+                service_stats = session.service.get_stats()
+                with fps_placeholder.container():
+                    st.metric(
+                        "FPS", f"{pacing['achieved_fps']:.1f} / {pacing['target_fps']:.0f}",
+                        delta=f"{pacing['missed_deadlines']} missed deadlines", delta_color="off"
+                    )
+                    st.caption(f"Preview: {preview_stats['preview_fps']:.1f} fps, "
+                               f"{preview_stats['mean_encode_ms']:.1f} ms encode, "
+                               f"{preview_stats['bytes_per_second'] / 1024:.0f} KB/s  \n"
+                               f"Inference: {service_stats['sessions']} sessions on "
+                               f"{service_stats['workers']} workers, queue {service_stats['queue_depth']}, "
+                               f"{service_stats['mean_wait_ms']:.1f} ms wait, "
+                               f"{service_stats['rejected']} rejected" +
+                               "".join(f", {quality['tier']} quality" for quality in service_stats['quality']))
+
+            if timing_placeholder is not None and stage_timer.enabled and frame_count % 30 == 0:
+                update_stage_timings(timing_placeholder, session.get_stats()['roi'])
 
         except Exception as e:
             st.error(f"Detection error: {str(e)}")
 
+    preview.stop()
+
+def update_stage_timings(timing_placeholder, roi):
+    summary = st.session_state.stage_timer.get_summary()
+    if not summary:
+        return
+    df = pd.DataFrame.from_dict(summary, orient='index')
+    with timing_placeholder.container():
+        st.dataframe(df[['count', 'p50_ms', 'p95_ms', 'p99_ms']].round(2), use_container_width=True)
+        st.caption(f"Face crop: {roi['roi_hits']} hits, {roi['roi_fallbacks']} fallbacks to the full frame "
+                   f"({roi['roi_rate']:.0%} of faces found in the crop)")
+
 def update_current_detections(behavior_placeholder, emotion_placeholder, behavior_result, emotion_result):
     with behavior_placeholder.container():
         st.subheader("🏃 Current Behavior")
@@ -277,50 +459,59 @@ def update_current_detections(behavior_placeholder, emotion_placeholder, behavio
             st.write("*No emotion detected*")
 
 def update_analytics_display(stats_placeholder, behavior_chart_placeholder,
-                            emotion_chart_placeholder, activity_placeholder, frame_count):
+                            emotion_chart_placeholder, activity_placeholder, frame_count,
+                            window_seconds=None, render_placeholder=None):
     analytics = st.session_state.analytics
+    panel = st.session_state.analytics_panel
+    start = time.perf_counter()
 
-    with stats_placeholder.container():
-        st.subheader("📈 Session Stats")
+    with st.session_state.stage_timer.stage('analytics_render'):
         stats = analytics.get_session_stats()
-
-        col1, col2 = st.columns(2)
-        with col1:
-            st.metric("Total Detections", stats['total_detections'])
-            st.metric("Session Duration", f"{stats['duration_minutes']:.1f} min")
-        with col2:
-            st.metric("Behaviors Detected", stats['unique_behaviors'])
-            st.metric("Emotions Detected", stats['unique_emotions'])
-
-    with behavior_chart_placeholder.container():
-        st.subheader("🏃 Behavior Distribution")
-        behavior_data = analytics.get_behavior_distribution()
-        if behavior_data:
-            df = pd.DataFrame(list(behavior_data.items()), columns=['Behavior', 'Count'])
-            fig = px.pie(df, values='Count', names='Behavior', title="Behavior Distribution")
-            st.plotly_chart(fig, use_container_width=True, key=f"behavior_chart_{frame_count}")
-        else:
-            st.write("*No behavior data yet*")
-
-    with emotion_chart_placeholder.container():
-        st.subheader("😊 Emotion Distribution")
-        emotion_data = analytics.get_emotion_distribution()
-        if emotion_data:
-            df = pd.DataFrame(list(emotion_data.items()), columns=['Emotion', 'Count'])
-            colors = {'happy': '#FFD700', 'sad': '#4169E1', 'surprised': '#FF6347', 'neutral': '#808080'}
-            fig = px.bar(df, x='Emotion', y='Count', color='Emotion', color_discrete_map=colors, title="Emotion Distribution")
-            st.plotly_chart(fig, use_container_width=True, key=f"emotion_chart_{frame_count}")
-        else:
-            st.write("*No emotion data yet*")
-
-    with activity_placeholder.container():
-        st.subheader("⏱️ Recent Activity")
-        recent = st.session_state.analytics.get_recent_activity(10)
-        if recent:
-            df = pd.DataFrame(recent)
-            st.dataframe(df, use_container_width=True)
-        else:
-            st.write("*No recent activity*")
+        stats_signature = (stats['total_detections'], stats['unique_behaviors'],
+                           stats['unique_emotions'], round(stats['duration_minutes'], 1))
+        if panel.changed('stats', stats_signature):
+            with stats_placeholder.container():
+                st.subheader("📈 Session Stats")
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.metric("Total Detections", stats['total_detections'])
+                    st.metric("Session Duration", f"{stats['duration_minutes']:.1f} min")
+                with col2:
+                    st.metric("Behaviors Detected", stats['unique_behaviors'])
+                    st.metric("Emotions Detected", stats['unique_emotions'])
+
+        if panel.behavior_chart.update(analytics.get_behavior_distribution(window_seconds)):
+            with behavior_chart_placeholder.container():
+                st.subheader("🏃 Behavior Distribution")
+                if panel.behavior_chart.data:
+                    st.plotly_chart(panel.behavior_chart.figure, use_container_width=True)
+                else:
+                    st.write("*No behavior data yet*")
+
+        if panel.emotion_chart.update(analytics.get_emotion_distribution(window_seconds)):
+            with emotion_chart_placeholder.container():
+                st.subheader("😊 Emotion Distribution")
+                if panel.emotion_chart.data:
+                    st.plotly_chart(panel.emotion_chart.figure, use_container_width=True)
+                else:
+                    st.write("*No emotion data yet*")
+
+        if panel.changed('activity', stats['total_detections']):
+            with activity_placeholder.container():
+                st.subheader("⏱️ Recent Activity")
+                recent = analytics.get_recent_activity(10)
+                if recent:
+                    st.dataframe(pd.DataFrame(recent), use_container_width=True)
+                else:
+                    st.write("*No recent activity*")
+
+    panel.record_render(time.perf_counter() - start)
+    if render_placeholder is not None:
+        render_stats = panel.get_stats()
+        render_placeholder.caption(
+            f"Analytics refresh: {render_stats['last_ms']:.1f} ms "
+            f"(mean {render_stats['mean_ms']:.1f} ms, {render_stats['chart_skips']} unchanged charts skipped)"
+        )
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,195 @@
+"""Headless batch processing of recorded footage.
+
+Runs BehaviorDetector and EmotionDetector over video files and image
+directories and writes one JSON line per frame:
+
+    python batch_process.py recordings/*.mp4 stills/ -o results.jsonl --workers 4
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+from frame_pipeline import FramePipeline
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm', '.m4v')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+# Images of a directory are split into jobs of this size so they spread across the pool
+IMAGES_PER_JOB = 16
+# Records a worker buffers before writing them to its part file
+RECORDS_PER_CHUNK = 256
+
+# Detector pairs of this worker process, keyed by static_image_mode and leased on first use:
+# videos track across frames, stills are unrelated images
+_detector_leases = {}
+
+
+def _worker_detectors(static_image_mode):
+    """This worker's (behavior, emotion) detector pair, built and warmed up once"""
+    lease = _detector_leases.get(static_image_mode)
+    if lease is None:
+        from detector_factory import DETECTOR_FACTORY
+        lease = _detector_leases[static_image_mode] = DETECTOR_FACTORY.acquire(static_image_mode=static_image_mode)
+    return lease.behavior_detector, lease.emotion_detector
+
+
+def collect_inputs(paths, images_per_job=IMAGES_PER_JOB):
+    """Expand the given paths into (kind, files) jobs: one per video, up to images_per_job images each"""
+    jobs = []
+    for path in paths:
+        if os.path.isdir(path):
+            names = sorted(os.listdir(path))
+            images = [os.path.join(path, name) for name in names if name.lower().endswith(IMAGE_EXTENSIONS)]
+            for start in range(0, len(images), images_per_job):
+                jobs.append(('images', images[start:start + images_per_job]))
+            for name in names:
+                if name.lower().endswith(VIDEO_EXTENSIONS):
+                    jobs.append(('video', [os.path.join(path, name)]))
+        elif path.lower().endswith(VIDEO_EXTENSIONS):
+            jobs.append(('video', [path]))
+        elif path.lower().endswith(IMAGE_EXTENSIONS):
+            jobs.append(('images', [path]))
+        else:
+            print(f"Skipping unsupported input: {path}")
+    return jobs
+
+
+def job_label(kind, files):
+    """Name of a job in progress output"""
+    if kind == 'video' or len(files) == 1:
+        return files[0]
+    return f"{os.path.dirname(files[0])} ({os.path.basename(files[0])} .. {os.path.basename(files[-1])})"
+
+
+def _iter_frames(kind, files):
+    """Yield (source, frame_index, frame) for a video file or a list of images"""
+    if kind == 'video':
+        cap = cv2.VideoCapture(files[0])
+        try:
+            index = 0
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                yield files[0], index, frame
+                index += 1
+        finally:
+            cap.release()
+    else:
+        for file_path in files:
+            frame = cv2.imread(file_path)
+            if frame is not None:
+                yield file_path, 0, frame
+
+
+def process_input(kind, files, part_path, chunk_size=RECORDS_PER_CHUNK):
+    """Run both detectors over every frame of one job, writing JSON lines to part_path in chunks"""
+    behavior_detector, emotion_detector = _worker_detectors(static_image_mode=(kind == 'images'))
+    behavior_detector.reset_history()
+    pipeline = FramePipeline(behavior_detector, emotion_detector)
+    frames = 0
+    chunk = []
+    start = time.perf_counter()
+
+    with open(part_path, 'w') as output:
+        for source, index, frame in _iter_frames(kind, files):
+            if kind == 'images':
+                # Stills are unrelated: no temporal behavior across them
+                behavior_detector.reset_history()
+            _, behavior_result, emotion_result = pipeline.process(frame, frame_id=index)
+            chunk.append(json.dumps({
+                'source': source,
+                'frame': index,
+                'behavior': behavior_result['behavior'] if behavior_result else None,
+                'behavior_confidence': behavior_result['confidence'] if behavior_result else None,
+                'emotion': emotion_result['emotion'] if emotion_result else None,
+                'emotion_confidence': emotion_result['confidence'] if emotion_result else None,
+                'features': emotion_result['features'] if emotion_result else None
+            }))
+            frames += 1
+            if len(chunk) >= chunk_size:
+                output.write('\n'.join(chunk) + '\n')
+                chunk = []
+        if chunk:
+            output.write('\n'.join(chunk) + '\n')
+
+    elapsed = time.perf_counter() - start
+    return {
+        'source': job_label(kind, files),
+        'frames': frames,
+        'seconds': elapsed,
+        'fps': frames / elapsed if elapsed > 0 else 0.0
+    }
+
+
+def run_batch(paths, output_path, workers=None, images_per_job=IMAGES_PER_JOB):
+    """Process all inputs on a process pool and write results as JSON lines.
+
+    Workers stream their records to one part file per job; each part is
+    appended to the output when its job finishes, so memory stays bounded
+    however long the inputs are.
+    """
+    jobs = collect_inputs(paths, images_per_job)
+    if not jobs:
+        print("No supported inputs found")
+        return []
+
+    workers = workers or os.cpu_count() or 1
+    summaries = []
+    total_frames = 0
+    start = time.perf_counter()
+    part_dir = tempfile.mkdtemp(prefix='.batch-parts-', dir=os.path.dirname(os.path.abspath(output_path)))
+
+    try:
+        with open(output_path, 'w') as output, ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {}
+            for index, (kind, files) in enumerate(jobs):
+                part_path = os.path.join(part_dir, f"{index}.jsonl")
+                futures[pool.submit(process_input, kind, files, part_path)] = (job_label(kind, files), part_path)
+            for future in as_completed(futures):
+                label, part_path = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Error processing {label}: {str(e)}")
+                    continue
+
+                with open(part_path) as part:
+                    shutil.copyfileobj(part, output)
+                os.remove(part_path)
+                total_frames += result['frames']
+                summaries.append(result)
+                print(f"{result['source']}: {result['frames']} frames in "
+                      f"{result['seconds']:.1f}s ({result['fps']:.1f} fps)")
+    finally:
+        shutil.rmtree(part_dir, ignore_errors=True)
+
+    elapsed = time.perf_counter() - start
+    total_fps = total_frames / elapsed if elapsed > 0 else 0.0
+    print(f"Total: {total_frames} frames from {len(summaries)} jobs in {elapsed:.1f}s "
+          f"({total_fps:.1f} fps across {workers} workers)")
+    return summaries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run behavior and emotion detection over recorded footage")
+    parser.add_argument('inputs', nargs='+', help="Video files, images or image directories")
+    parser.add_argument('-o', '--output', default='batch_results.jsonl', help="Output JSON lines file")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--images-per-job', type=int, default=IMAGES_PER_JOB,
+                        help="Images of a directory handed to a worker at a time")
+    args = parser.parse_args(argv)
+
+    summaries = run_batch(args.inputs, args.output, args.workers, args.images_per_job)
+    return 0 if summaries else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
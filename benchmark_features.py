@@ -0,0 +1,96 @@
+"""Micro-benchmark: scalar vs vectorized facial feature extraction.
+
+The live path reads only the 24 landmarks the features use from the
+MediaPipe results; "batch from arrays" starts from an existing stack.
+
+    python benchmark_features.py --frames 2000
+"""
+import argparse
+import time
+
+import numpy as np
+from mediapipe.framework.formats import landmark_pb2
+
+from emotion_engine import EmotionDetector
+
+FRAME_SHAPE = (480, 640, 3)
+
+
+def synthetic_faces(count, num_landmarks=478, seed=0):
+    """Random face-mesh landmark lists in normalized coordinates"""
+    rng = np.random.default_rng(seed)
+    faces = []
+    for _ in range(count):
+        face = landmark_pb2.NormalizedLandmarkList()
+        for x, y, z in zip(rng.uniform(0.3, 0.7, num_landmarks),
+                           rng.uniform(0.2, 0.8, num_landmarks),
+                           rng.uniform(-0.1, 0.1, num_landmarks)):
+            face.landmark.add(x=x, y=y, z=z)
+        faces.append(face)
+    return faces
+
+
+def synthetic_multi_faces(frames, faces_per_frame, num_landmarks=478, seed=0):
+    """Frames of several small faces on a grid, each drifting slowly; a list of landmark lists per frame"""
+    rng = np.random.default_rng(seed)
+    columns = int(np.ceil(np.sqrt(faces_per_frame)))
+    cell = 1.0 / columns
+    shapes = [np.column_stack([rng.uniform(0, 1, num_landmarks), rng.uniform(0, 1, num_landmarks),
+                               rng.uniform(-0.1, 0.1, num_landmarks)]) for _ in range(faces_per_frame)]
+
+    sequence = []
+    for i in range(frames):
+        faces = []
+        for k, shape in enumerate(shapes):
+            row, column = divmod(k, columns)
+            drift = 0.01 * np.sin(2 * np.pi * i / frames + k)
+            origin = ((column + 0.25) * cell + drift, (row + 0.25) * cell)
+            face = landmark_pb2.NormalizedLandmarkList()
+            for x, y, z in shape:
+                face.landmark.add(x=origin[0] + x * cell / 2, y=origin[1] + y * cell / 2, z=z)
+            faces.append(face)
+        sequence.append(faces)
+    return sequence
+
+
+def _time_per_frame(fn, items):
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    return (time.perf_counter() - start) / len(items) * 1e6
+
+
+def run(frames):
+    detector = EmotionDetector()
+    faces = synthetic_faces(min(frames, 200))
+    faces = (faces * (frames // len(faces) + 1))[:frames]
+
+    scalar_us = _time_per_frame(
+        lambda face: detector._extract_facial_features_scalar(face.landmark, FRAME_SHAPE), faces)
+    vector_us = _time_per_frame(lambda face: detector._extract_facial_features(face, FRAME_SHAPE), faces)
+
+    # Several faces per frame, as classify_faces sees them: one gather and one feature matrix
+    groups = [faces[i:i + 4] for i in range(0, len(faces) - 3, 4)]
+    multi_us = _time_per_frame(
+        lambda group: detector._feature_matrix(detector._feature_points(group), FRAME_SHAPE), groups) / 4
+
+    start = time.perf_counter()
+    stack = np.stack([detector._landmarks_to_array(face) for face in faces])
+    convert_us = (time.perf_counter() - start) / frames * 1e6
+    start = time.perf_counter()
+    detector.extract_features_batch(stack, FRAME_SHAPE)
+    arrays_us = (time.perf_counter() - start) / frames * 1e6
+
+    print(f"scalar per face:          {scalar_us:8.2f} us")
+    print(f"vectorized per face:      {vector_us:8.2f} us  ({scalar_us / vector_us:.2f}x)")
+    print(f"4 faces per frame:        {multi_us:8.2f} us/face  ({scalar_us / multi_us:.2f}x)")
+    print(f"full landmark conversion: {convert_us:8.2f} us/face")
+    print(f"batch from arrays:        {arrays_us:8.2f} us/face  ({scalar_us / arrays_us:.2f}x)")
+    return {'scalar_us': scalar_us, 'vectorized_us': vector_us, 'multi_face_us': multi_us,
+            'conversion_us': convert_us, 'batch_from_arrays_us': arrays_us}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=2000)
+    run(parser.parse_args().frames)
@@ -0,0 +1,299 @@
+"""Reproducible CPU benchmarks for the detectors and analytics.
+
+    python benchmark_suite.py --output bench.json
+    python benchmark_suite.py --baseline benchmark_baseline.json --threshold 0.2
+    python benchmark_suite.py --save-baseline benchmark_baseline.json
+
+Every case runs on synthetic, seeded inputs (landmark streams and a
+generated video file), so no camera, network or dataset is needed.
+Results are throughput numbers (higher is better); a case regresses when
+it falls more than its threshold below the stored baseline.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+from mediapipe.framework.formats import landmark_pb2
+
+from benchmark_features import synthetic_faces, synthetic_multi_faces
+from dashboard_metrics import AnalyticsTracker
+from emotion_engine import EmotionDetector
+from frame_pipeline import FramePipeline
+from person_tracker import PersonTracker
+from pose_behavior import BehaviorDetector
+
+FRAME_SHAPE = (480, 640, 3)
+BEHAVIORS = ('standing', 'sitting', 'walking', 'waving', 'unknown')
+EMOTIONS = ('happy', 'sad', 'surprised', 'neutral', 'sleepy', 'anger')
+
+
+def synthetic_poses(count, seed=0):
+    """Pose landmark lists of a person swinging arms and legs"""
+    rng = np.random.default_rng(seed)
+    base = np.column_stack([rng.uniform(0.3, 0.7, 33), np.linspace(0.1, 0.95, 33), np.zeros(33)])
+    poses = []
+    for i in range(count):
+        phase = np.sin(i / 3.0) * 0.03
+        pose = landmark_pb2.NormalizedLandmarkList()
+        for j, (x, y, z) in enumerate(base):
+            swing = phase if j in (15, 16, 27, 28) else 0.0
+            pose.landmark.add(x=x + swing, y=y, z=z, visibility=0.9)
+        poses.append(pose)
+    return poses
+
+
+def write_synthetic_video(path, frames=90, size=(640, 480)):
+    """Moving shapes on a noisy background, as an MJPG AVI"""
+    rng = np.random.default_rng(0)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 30, size)
+    for i in range(frames):
+        frame = rng.integers(0, 40, (size[1], size[0], 3), dtype=np.uint8)
+        cv2.circle(frame, (100 + i * 4, 200), 60, (180, 160, 140), -1)
+        cv2.rectangle(frame, (300, 100 + i), (400, 300 + i), (90, 120, 200), -1)
+        writer.write(frame)
+    writer.release()
+
+
+# ------------------ CASES ------------------
+# Each case prepares its inputs, then returns a callable that does one
+# timed run and the number of operations that run performs.
+
+def case_emotion_per_frame(size):
+    """Features and label of one face at a time, as the live per-frame path computes them"""
+    detector = EmotionDetector()
+    faces = synthetic_faces(min(size, 200))
+    faces = (faces * (size // len(faces) + 1))[:size]
+
+    def run():
+        for face in faces:
+            detector._classify_emotion(detector._extract_facial_features(face, FRAME_SHAPE))
+        return len(faces)
+    return run, 'frames'
+
+
+def case_emotion_batch(size):
+    """Features and labels for a landmark stack that is already an array"""
+    detector = EmotionDetector()
+    faces = synthetic_faces(min(size, 200))
+    stack = np.stack([detector._landmarks_to_array(face) for face in faces])
+    stack = np.resize(stack, (size,) + stack.shape[1:])
+
+    def run():
+        detector.classify_batch(detector.extract_features_batch(stack, FRAME_SHAPE))
+        return len(stack)
+    return run, 'frames'
+
+
+def case_emotion_batch_from_landmarks(size):
+    """Same as emotion_batch, including the conversion of MediaPipe landmarks to the stack"""
+    detector = EmotionDetector()
+    faces = synthetic_faces(min(size, 200))
+    faces = (faces * (size // len(faces) + 1))[:size]
+
+    def run():
+        stack = np.stack([detector._landmarks_to_array(face) for face in faces])
+        detector.classify_batch(detector.extract_features_batch(stack, FRAME_SHAPE))
+        return len(faces)
+    return run, 'frames'
+
+
+def case_behavior_with_history(size):
+    detector = BehaviorDetector()
+    poses = synthetic_poses(size)
+
+    def run():
+        detector.reset_history()
+        for pose in poses:
+            array = detector._extract_pose_array(pose.landmark)
+            detector.pose_history.append(array)
+            detector._classify_behavior(detector._pose_array_to_keypoints(array))
+        return len(poses)
+    return run, 'frames'
+
+
+def case_multi_face(size, faces_per_frame):
+    # A 30-frame drift cycle repeated, so tracks stay continuous across repeats
+    detector = EmotionDetector()
+    sequence = synthetic_multi_faces(30, faces_per_frame)
+    frames = max(1, size // faces_per_frame)
+
+    def run():
+        tracker = PersonTracker()
+        analytics = AnalyticsTracker()
+        for i in range(frames):
+            faces = tracker.update(detector.classify_faces(sequence[i % len(sequence)], FRAME_SHAPE))
+            for face in faces:
+                analytics.add_emotion_detection(face['emotion'], face['confidence'], person_id=face['person_id'])
+        return frames * faces_per_frame
+    return run, 'faces'
+
+
+def case_analytics_ingest(size):
+    rng = np.random.default_rng(0)
+    behaviors = [BEHAVIORS[i] for i in rng.integers(0, len(BEHAVIORS), size)]
+    emotions = [EMOTIONS[i] for i in rng.integers(0, len(EMOTIONS), size)]
+    confidences = rng.uniform(0.3, 1.0, size).tolist()
+
+    def run():
+        tracker = AnalyticsTracker()
+        for behavior, emotion, confidence in zip(behaviors, emotions, confidences):
+            tracker.add_behavior_detection(behavior, confidence)
+            tracker.add_emotion_detection(emotion, confidence)
+        return 2 * size
+    return run, 'events'
+
+
+def case_analytics_query(size):
+    tracker = AnalyticsTracker()
+    rng = np.random.default_rng(1)
+    for i in range(size):
+        tracker.add_behavior_detection(BEHAVIORS[i % len(BEHAVIORS)], float(rng.uniform(0.3, 1.0)))
+        tracker.add_emotion_detection(EMOTIONS[i % len(EMOTIONS)], float(rng.uniform(0.3, 1.0)))
+    queries = 200
+
+    def run():
+        for _ in range(queries):
+            tracker.get_session_stats()
+            tracker.get_behavior_distribution()
+            tracker.get_emotion_distribution()
+            tracker.get_average_confidence()
+            tracker.get_recent_activity(10)
+            tracker.get_top_behaviors()
+        return queries
+    return run, 'queries'
+
+
+def case_end_to_end(size):
+    workdir = tempfile.mkdtemp(prefix="hbr_bench_")
+    video_path = os.path.join(workdir, "synthetic.avi")
+    write_synthetic_video(video_path, frames=size)
+    pipeline = FramePipeline(BehaviorDetector(), EmotionDetector())
+
+    def run():
+        cap = cv2.VideoCapture(video_path)
+        frames = 0
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            pipeline.process(frame)
+            frames += 1
+        cap.release()
+        return frames
+    return run, 'frames'
+
+
+CASES = {
+    'emotion_per_frame': (case_emotion_per_frame, 2000),
+    'emotion_batch': (case_emotion_batch, 20000),
+    'emotion_batch_from_landmarks': (case_emotion_batch_from_landmarks, 2000),
+    'behavior_with_history': (case_behavior_with_history, 2000),
+    'multi_face_x1': (lambda size: case_multi_face(size, 1), 2000),
+    'multi_face_x8': (lambda size: case_multi_face(size, 8), 2000),
+    'analytics_ingest': (case_analytics_ingest, 20000),
+    'analytics_query': (case_analytics_query, 20000),
+    'end_to_end': (case_end_to_end, 60),
+}
+
+
+def run_suite(names=None, repeats=5, scale=1.0):
+    """Run the selected cases; returns {case: result dict}"""
+    results = {}
+    for name in names or CASES:
+        factory, size = CASES[name]
+        run, unit = factory(max(1, int(size * scale)))
+        run()  # warm-up: graph init, caches, lazy imports
+
+        rates = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            ops = run()
+            elapsed = time.perf_counter() - start
+            rates.append(ops / elapsed if elapsed > 0 else float('inf'))
+
+        results[name] = {
+            'unit': f'{unit}/s',
+            'median': statistics.median(rates),
+            'best': max(rates),
+            'repeats': repeats
+        }
+        print(f"{name:24s} {results[name]['median']:14.1f} {unit}/s (best {results[name]['best']:.1f})")
+    return results
+
+
+def compare_to_baseline(results, baseline, threshold, case_thresholds=None, metric='best'):
+    """List regressions: cases whose throughput fell more than their threshold below baseline"""
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get('results', {}).get(name)
+        if not reference:
+            continue
+        allowed = (case_thresholds or {}).get(name, threshold)
+        change = result[metric] / reference[metric] - 1.0
+        status = 'REGRESSION' if change < -allowed else 'ok'
+        print(f"{name:24s} {change * 100:+7.1f}% vs baseline (allowed -{allowed * 100:.0f}%) {status}")
+        if status != 'ok':
+            regressions.append({'case': name, 'change': change, 'allowed': allowed})
+    return regressions
+
+
+def _environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Detector and analytics benchmarks")
+    parser.add_argument('--cases', nargs='+', choices=sorted(CASES), help="Cases to run (default: all)")
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--scale', type=float, default=1.0, help="Multiply every case's input size")
+    parser.add_argument('--output', help="Write results as JSON to this file")
+    parser.add_argument('--baseline', help="Baseline JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="Allowed fractional slowdown vs baseline (default 0.2)")
+    parser.add_argument('--case-threshold', action='append', default=[], metavar='CASE=FRACTION',
+                        help="Per-case override of --threshold")
+    parser.add_argument('--metric', choices=('best', 'median'), default='best',
+                        help="Statistic compared against the baseline (best-of-N is least noisy)")
+    parser.add_argument('--save-baseline', help="Write results to this file as the new baseline")
+    args = parser.parse_args(argv)
+
+    case_thresholds = {}
+    for item in args.case_threshold:
+        name, _, value = item.partition('=')
+        case_thresholds[name] = float(value)
+
+    report = {'environment': _environment(), 'results': run_suite(args.cases, args.repeats, args.scale)}
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report['regressions'] = compare_to_baseline(
+            report['results'], baseline, args.threshold, case_thresholds, args.metric)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'environment': report['environment'], 'results': report['results']}, f, indent=2)
+
+    return 1 if report.get('regressions') else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
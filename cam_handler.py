@@ -1,62 +1,251 @@
+import threading
+import time
+from collections import deque
+
 import cv2
 import numpy as np
 import streamlit as st
 
 class CameraHandler:
-    def __init__(self):
+    DROP_POLICIES = ('oldest', 'newest')
+
+    def __init__(self, headless=False):
         self.cap = None
         self.is_initialized = False
-    
+        self.headless = headless
+        self.mirror = True
+        self.last_error = None
+
+        # Background capture state (see start_capture)
+        self.capture_thread = None
+        self.frame_buffer = None
+        self.buffer_condition = threading.Condition()
+        self.drop_policy = 'oldest'
+        self.capture_running = False
+        self.source_exhausted = False
+        self.frames_captured = 0
+        self.frames_served = 0
+        self.frames_dropped = 0
+        self.next_frame_id = 0
+        self.shared_ring = None
+
     def initialize_camera(self, camera_index=0):
-        """Initialize camera with given index"""
+        """Initialize camera with given index or video file path"""
         try:
             if self.cap is not None:
-                self.cap.release()
-            
+                self.release_camera()
+
             self.cap = cv2.VideoCapture(camera_index)
-            
+
             if not self.cap.isOpened():
-                st.error(f"❌ Could not open camera {camera_index}")
+                self._notify_error(f"❌ Could not open camera {camera_index}")
                 return False
-            
+
             # Set camera properties for better performance
             self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
             self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
             self.cap.set(cv2.CAP_PROP_FPS, 30)
-            
+
             self.is_initialized = True
-            st.success(f"✅ Camera {camera_index} initialized successfully")
+            if not self.headless:
+                st.success(f"✅ Camera {camera_index} initialized successfully")
             return True
-            
+
         except Exception as e:
-            st.error(f"❌ Error initializing camera: {str(e)}")
+            self._notify_error(f"❌ Error initializing camera: {str(e)}")
             return False
-    
+
     def get_frame(self):
         """Get current frame from camera"""
+        if self.capture_running or self.frame_buffer is not None:
+            return self.read_latest()
+        return self._read_frame()
+
+    def _read_frame(self, notify=True):
+        """Read and mirror a single frame directly from the capture device"""
         if not self.is_initialized or self.cap is None:
             return None
-        
+
         try:
             ret, frame = self.cap.read()
             if not ret:
                 return None
-            
+
             # Flip frame horizontally for mirror effect
-            frame = cv2.flip(frame, 1)
+            if self.mirror:
+                frame = cv2.flip(frame, 1)
             return frame
-            
+
         except Exception as e:
-            st.error(f"❌ Error capturing frame: {str(e)}")
+            message = f"❌ Error capturing frame: {str(e)}"
+            if notify:
+                self._notify_error(message)
+            else:
+                self.last_error = message
             return None
-    
+
+    # ------------------ BACKGROUND CAPTURE ------------------
+    def start_capture(self, buffer_size=2, drop_policy='oldest'):
+        """Start reading frames continuously into a bounded ring buffer.
+
+        drop_policy decides what happens when the buffer is full:
+        'oldest' evicts the oldest buffered frame, 'newest' discards
+        the frame that was just captured.
+        """
+        if drop_policy not in self.DROP_POLICIES:
+            raise ValueError(f"drop_policy must be one of {self.DROP_POLICIES}")
+        if not self.is_initialized or self.cap is None:
+            return False
+
+        self.stop_capture()
+        self.drop_policy = drop_policy
+        self.frame_buffer = deque(maxlen=max(1, int(buffer_size)))
+        self.source_exhausted = False
+        self.capture_running = True
+        self.capture_thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self.capture_thread.start()
+        return True
+
+    def stop_capture(self):
+        """Stop the background capture thread and clear the buffer"""
+        self.capture_running = False
+        with self.buffer_condition:
+            self.buffer_condition.notify_all()
+        if self.capture_thread is not None:
+            if self.capture_thread is not threading.current_thread():
+                self.capture_thread.join(timeout=2.0)
+            self.capture_thread = None
+        self.frame_buffer = None
+
+    def _capture_loop(self):
+        """Read frames until stopped or the source runs out"""
+        while self.capture_running:
+            frame = self._read_frame(notify=False)
+            if frame is None:
+                with self.buffer_condition:
+                    self.source_exhausted = True
+                    self.capture_running = False
+                    if self.shared_ring is not None:
+                        self.shared_ring.close_stream()
+                    self.buffer_condition.notify_all()
+                break
+
+            with self.buffer_condition:
+                buffer = self.frame_buffer
+                if buffer is None:
+                    break
+                self.frames_captured += 1
+                entry = (self.next_frame_id, time.time(), frame)
+                self.next_frame_id += 1
+                if self.shared_ring is not None:
+                    self.shared_ring.write(frame, entry[0], entry[1])
+                if len(buffer) == buffer.maxlen:
+                    self.frames_dropped += 1
+                    if self.drop_policy == 'newest':
+                        continue
+                buffer.append(entry)
+                self.buffer_condition.notify()
+
+    def publish_to(self, shared_ring):
+        """Also copy every captured frame into a SharedFrameRing for consumer processes"""
+        self.shared_ring = shared_ring
+
+    def read_latest(self, timeout=1.0):
+        """Return the most recent buffered frame, dropping any older ones"""
+        entry = self.read_latest_entry(timeout)
+        return entry[2] if entry is not None else None
+
+    def read_latest_entry(self, timeout=1.0):
+        """Return (frame_id, timestamp, frame) for the most recent frame"""
+        with self.buffer_condition:
+            if not self._wait_for_frame(timeout):
+                return None
+            buffer = self.frame_buffer
+            entry = buffer.pop()
+            self.frames_dropped += len(buffer)
+            buffer.clear()
+            self.frames_served += 1
+            return entry
+
+    def read_next(self, timeout=1.0):
+        """Return the oldest buffered frame so that no frame is skipped"""
+        entry = self.read_next_entry(timeout)
+        return entry[2] if entry is not None else None
+
+    def read_next_entry(self, timeout=1.0):
+        """Return (frame_id, timestamp, frame) for the oldest buffered frame"""
+        with self.buffer_condition:
+            if not self._wait_for_frame(timeout):
+                return None
+            self.frames_served += 1
+            return self.frame_buffer.popleft()
+
+    def _wait_for_frame(self, timeout):
+        """Block until a frame is buffered; must hold buffer_condition"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self.frame_buffer is None:
+                return False
+            if self.frame_buffer:
+                return True
+            if not self.capture_running:
+                return False
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            self.buffer_condition.wait(remaining)
+
+    def skip_frames(self, count):
+        """Discard up to count stale frames, e.g. after the pacer fell behind.
+
+        A no-op while the capture thread runs: it already keeps only the
+        freshest frames, and popping would throw away the one the next read
+        is waiting for.
+        """
+        if count <= 0 or self.capture_running:
+            return 0
+        if self.frame_buffer is not None:
+            with self.buffer_condition:
+                skipped = min(count, len(self.frame_buffer))
+                for _ in range(skipped):
+                    self.frame_buffer.popleft()
+                self.frames_dropped += skipped
+                return skipped
+        if not self.is_initialized or self.cap is None:
+            return 0
+        skipped = 0
+        while skipped < count and self.cap.grab():
+            skipped += 1
+        return skipped
+
+    def get_capture_stats(self):
+        """Get frame counters for the background capture mode"""
+        with self.buffer_condition:
+            return {
+                'captured': self.frames_captured,
+                'served': self.frames_served,
+                'dropped': self.frames_dropped,
+                'buffered': len(self.frame_buffer) if self.frame_buffer is not None else 0,
+                'running': self.capture_running,
+                'source_exhausted': self.source_exhausted
+            }
+
+    def _notify_error(self, message):
+        """Report an error without touching Streamlit when headless"""
+        self.last_error = message
+        if self.headless:
+            print(message)
+        else:
+            st.error(message)
+
     def release_camera(self):
         """Release camera resources"""
+        self.stop_capture()
         if self.cap is not None:
             self.cap.release()
             self.cap = None
         self.is_initialized = False
-    
+
     def __del__(self):
         """Cleanup when object is destroyed"""
         self.release_camera()
@@ -0,0 +1,69 @@
+import pytest
+
+from detector_factory import DetectorFactory
+from emotion_engine import ROI_COUNTERS, roi_stats
+
+
+class FakeDetector:
+    """Stands in for a BehaviorDetector or EmotionDetector; detect_context() is answered by respond"""
+
+    def __init__(self, kind, key, respond=None):
+        self.kind = kind
+        self.key = key
+        self.respond = respond
+        self.frames = 0
+        self.history_resets = 0
+        self.tracking_resets = 0
+        self.graph_resets = 0
+        self.tracked = None  # what a tracking graph carries from one frame to the next
+        self.closed = False
+        self.max_history = 10
+        self.pose_history = []
+        self.use_pose_roi = False
+        self.roi_attempts = self.roi_hits = 0
+        self.full_frame_runs = self.full_frame_hits = 0
+
+    def detect(self, frame):
+        self.frames += 1
+        return None
+
+    def detect_context(self, ctx, pose_keypoints=None):
+        return self.respond(self, ctx) if self.respond else None
+
+    def reset_history(self):
+        self.history_resets += 1
+        self.pose_history = []
+
+    def reset_graphs(self):
+        self.graph_resets += 1
+        self.tracked = None
+
+    def reset_tracking(self):
+        self.tracking_resets += 1
+        self.use_pose_roi = False
+        self.reset_history()
+        self.reset_graphs()
+
+    def get_roi_stats(self):
+        return roi_stats({name: getattr(self, name) for name in ROI_COUNTERS})
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def fake_factory():
+    """make(behavior=None, emotion=None, unavailable=()) -> a DetectorFactory that builds FakeDetector pairs.
+
+    behavior and emotion are the respond functions of the two detectors;
+    building a model_complexity listed in unavailable fails.
+    """
+    def make(behavior=None, emotion=None, unavailable=()):
+        def builder(max_num_faces, model_complexity, refine_landmarks, static_image_mode):
+            if model_complexity in unavailable:
+                raise RuntimeError(f"model_complexity {model_complexity} is not available")
+            key = (max_num_faces, model_complexity, refine_landmarks, static_image_mode)
+            return FakeDetector('behavior', key, behavior), FakeDetector('emotion', key, emotion)
+
+        return DetectorFactory(warm_up_shape=(48, 64, 3), builder=builder)
+    return make
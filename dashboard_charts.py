@@ -0,0 +1,109 @@
+import plotly.graph_objects as go
+from plotly.colors import qualitative
+
+EMOTION_COLORS = {'happy': '#FFD700', 'sad': '#4169E1', 'surprised': '#FF6347', 'neutral': '#808080'}
+
+
+class IncrementalChart:
+    """Plotly pie or bar chart built once and updated in place when its data changes.
+
+    update() compares the new {label: count} dict with the last drawn one
+    and only touches the figure when they differ, so unchanged refreshes
+    cost one dict comparison. Streamlit derives a chart's element id from
+    its figure spec and rejects an id (or user key) drawn twice in one
+    script run, and the video loop is one long run. So charts are drawn
+    without a key, and the figure carries nothing but its data: the same
+    counts always give the same element, also across reruns. Only when
+    the data returns to a state already drawn in this run is the revision
+    in layout.meta bumped to keep the id unique. uirevision keeps legend
+    and zoom state in the browser across updates.
+    """
+
+    def __init__(self, name, kind, title, colors=None):
+        self.kind = kind
+        self.colors = colors or {}
+        self.data = None
+        self.drawn = set()  # states drawn in this script run
+        self.revision = 0
+        self.updates = 0
+        self.skipped = 0
+
+        if kind == 'pie':
+            trace = go.Pie(labels=[], values=[])
+        else:
+            trace = go.Bar(x=[], y=[])
+        self.figure = go.Figure(trace)
+        self.figure.update_layout(title=title, uirevision=name, meta=0)
+
+    def update(self, data):
+        """Apply new data; returns True if the chart needs redrawing"""
+        if data == self.data:
+            self.skipped += 1
+            return False
+        self.data = dict(data)
+        self.updates += 1
+        state = frozenset(self.data.items())
+        if state in self.drawn:
+            self.revision += 1
+        self.drawn.add(state)
+
+        labels = list(self.data)
+        values = list(self.data.values())
+        trace = self.figure.data[0]
+        if self.kind == 'pie':
+            trace.labels = labels
+            trace.values = values
+        else:
+            palette = qualitative.Plotly
+            trace.x = [label.title() for label in labels]
+            trace.y = values
+            trace.marker.color = [self.colors.get(label, palette[i % len(palette)])
+                                  for i, label in enumerate(labels)]
+        self.figure.layout.meta = self.revision
+        return True
+
+    def invalidate(self):
+        """Force a redraw on the next update (e.g. after the page was rebuilt)"""
+        self.data = None
+        self.drawn.clear()
+        self.revision = 0
+
+
+class AnalyticsPanelState:
+    """Last drawn state of the analytics panel plus its render cost"""
+
+    def __init__(self):
+        self.behavior_chart = IncrementalChart('behavior', 'pie', "Behavior Distribution")
+        self.emotion_chart = IncrementalChart('emotion', 'bar', "Emotion Distribution", EMOTION_COLORS)
+        self.signatures = {}
+        self.renders = 0
+        self.total_seconds = 0.0
+        self.last_seconds = 0.0
+
+    def changed(self, section, signature):
+        """True (and remembered) if a section's signature differs from the last drawn one"""
+        if self.signatures.get(section) == signature:
+            return False
+        self.signatures[section] = signature
+        return True
+
+    def invalidate(self):
+        self.signatures.clear()
+        self.behavior_chart.invalidate()
+        self.emotion_chart.invalidate()
+
+    def record_render(self, seconds):
+        self.renders += 1
+        self.total_seconds += seconds
+        self.last_seconds = seconds
+
+    def get_stats(self):
+        """Render cost and how many chart refreshes were skipped as unchanged"""
+        return {
+            'renders': self.renders,
+            'last_ms': self.last_seconds * 1000,
+            'mean_ms': self.total_seconds / self.renders * 1000 if self.renders else 0.0,
+            'chart_updates': self.behavior_chart.updates + self.emotion_chart.updates,
+            'chart_skips': self.behavior_chart.skipped + self.emotion_chart.skipped
+        }
+
@@ -1,42 +1,378 @@
 from datetime import datetime, timedelta
 from collections import defaultdict, deque
+import math
+import random
+import time
 import pandas as pd
 
-class AnalyticsTracker:
+class ConfidenceStats:
+    """Streaming summary of confidence values in constant memory.
+
+    Keeps count, sum, running mean/variance (Welford), min/max and a
+    fixed 100-bin histogram over [0, 1] used as an approximate quantile
+    sketch (error at most one bin width, 0.01).
+    """
+    BINS = 100
+
     def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.histogram = [0] * self.BINS
+
+    def add(self, value):
+        """Add one confidence value"""
+        self.count += 1
+        self.total += value
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        index = int(value * self.BINS)
+        self.histogram[min(max(index, 0), self.BINS - 1)] += 1
+
+    @property
+    def variance(self):
+        return self.m2 / self.count if self.count else 0.0
+
+    def quantile(self, q):
+        """Approximate q-quantile (0..1), interpolated inside the histogram bin"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bin_count in enumerate(self.histogram):
+            if bin_count and seen + bin_count >= rank:
+                fraction = (rank - seen) / bin_count
+                value = (index + fraction) / self.BINS
+                return min(max(value, self.min), self.max)
+            seen += bin_count
+        return self.max
+
+    def to_dict(self):
+        """Aggregates for export"""
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'std': math.sqrt(self.variance),
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99)
+        }
+
+class ReservoirSample:
+    """Uniform random sample of at most `size` values from a stream"""
+
+    def __init__(self, size, seed=None):
+        self.size = size
+        self.seen = 0
+        self.values = []
+        self.rng = random.Random(seed)
+
+    def add(self, value):
+        self.seen += 1
+        if len(self.values) < self.size:
+            self.values.append(value)
+        else:
+            slot = self.rng.randrange(self.seen)
+            if slot < self.size:
+                self.values[slot] = value
+
+class RollupRing:
+    """Fixed-size ring of time buckets holding per-label counts and confidence sums.
+
+    Slot i holds bucket number `bucket_ids[i]` (timestamp // bucket_seconds);
+    a slot is zeroed and reused when a newer bucket maps onto it, so memory
+    stays at num_buckets x labels no matter how long the session runs.
+    Rows are plain lists: one event touches two elements, which is far
+    cheaper than indexing into numpy arrays from Python.
+    """
+
+    def __init__(self, bucket_seconds, num_buckets):
+        self.bucket_seconds = bucket_seconds
+        self.num_buckets = num_buckets
+        self.num_labels = 0
+        self.bucket_ids = [-1] * num_buckets
+        self.counts = [[] for _ in range(num_buckets)]
+        self.confidence_sums = [[] for _ in range(num_buckets)]
+
+    @property
+    def span_seconds(self):
+        return self.bucket_seconds * self.num_buckets
+
+    def add(self, column, confidence, timestamp):
+        """Count one event for a label column at a unix timestamp"""
+        if column >= self.num_labels:
+            self.num_labels = column + 1
+        bucket = int(timestamp // self.bucket_seconds)
+        slot = bucket % self.num_buckets
+        counts = self.counts[slot]
+        sums = self.confidence_sums[slot]
+        if self.bucket_ids[slot] != bucket:
+            self.bucket_ids[slot] = bucket
+            counts[:] = [0] * self.num_labels
+            sums[:] = [0.0] * self.num_labels
+        elif column >= len(counts):
+            counts.extend([0] * (self.num_labels - len(counts)))
+            sums.extend([0.0] * (self.num_labels - len(sums)))
+        counts[column] += 1
+        sums[column] += confidence
+
+    def window(self, seconds, now):
+        """Per-label (counts, confidence sums) lists over the buckets of the last `seconds`"""
+        newest = int(now // self.bucket_seconds)
+        oldest = newest - max(1, math.ceil(seconds / self.bucket_seconds)) + 1
+        counts = [0] * self.num_labels
+        sums = [0.0] * self.num_labels
+        for slot, bucket in enumerate(self.bucket_ids):
+            if oldest <= bucket <= newest:
+                for column, count in enumerate(self.counts[slot]):
+                    counts[column] += count
+                    sums[column] += self.confidence_sums[slot][column]
+        return counts, sums
+
+    def clear(self):
+        self.num_labels = 0
+        self.bucket_ids = [-1] * self.num_buckets
+        self.counts = [[] for _ in range(self.num_buckets)]
+        self.confidence_sums = [[] for _ in range(self.num_buckets)]
+
+class LabelRollup:
+    """Per-second and per-minute rollups of one detection type.
+
+    Windows up to five minutes are answered from 1 s buckets, longer ones
+    (up to an hour) from 1 min buckets.
+    """
+
+    def __init__(self, second_buckets=300, minute_buckets=60):
+        self.labels = {}
+        self.per_second = RollupRing(1, second_buckets)
+        self.per_minute = RollupRing(60, minute_buckets)
+
+    def add(self, label, confidence, timestamp):
+        column = self.labels.get(label)
+        if column is None:
+            column = self.labels[label] = len(self.labels)
+        self.per_second.add(column, confidence, timestamp)
+        self.per_minute.add(column, confidence, timestamp)
+
+    def window(self, seconds, now):
+        """{label: (count, confidence_sum)} for labels seen in the window"""
+        ring = self.per_second if seconds <= self.per_second.span_seconds else self.per_minute
+        counts, sums = ring.window(seconds, now)
+        return {label: (int(counts[column]), float(sums[column]))
+                for label, column in self.labels.items() if counts[column]}
+
+    def clear(self):
+        self.labels.clear()
+        self.per_second.clear()
+        self.per_minute.clear()
+
+class LabelSegment:
+    """A run of consecutive detections of one label"""
+    __slots__ = ('type', 'label', 'stream_id', 'person_id', 'start', 'end', 'frames', 'flicker_frames',
+                 'confidence_sum', 'confidence_min', 'confidence_max')
+
+    def __init__(self, detection_type, label, confidence, timestamp, stream_id=None, person_id=None):
+        self.type = detection_type
+        self.label = label
+        self.stream_id = stream_id
+        self.person_id = person_id
+        self.start = timestamp
+        self.end = timestamp
+        self.frames = 1
+        self.flicker_frames = 0
+        self.confidence_sum = confidence
+        self.confidence_min = confidence
+        self.confidence_max = confidence
+
+    def add(self, confidence, timestamp):
+        self.frames += 1
+        self.end = timestamp
+        self.confidence_sum += confidence
+        if confidence < self.confidence_min:
+            self.confidence_min = confidence
+        elif confidence > self.confidence_max:
+            self.confidence_max = confidence
+
+    def absorb(self, frames, timestamp):
+        """Count a short run of other labels as part of this segment"""
+        self.flicker_frames += frames
+        self.end = timestamp
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+    @property
+    def mean_confidence(self):
+        return self.confidence_sum / self.frames
+
+    def to_dict(self):
+        data = {
+            'type': self.type,
+            'label': self.label,
+            'start': self.start,
+            'end': self.end,
+            'duration': self.duration,
+            'frames': self.frames,
+            'flicker_frames': self.flicker_frames,
+            'mean_confidence': self.mean_confidence,
+            'min_confidence': self.confidence_min,
+            'max_confidence': self.confidence_max
+        }
+        if self.stream_id is not None:
+            data['stream'] = self.stream_id
+        if self.person_id is not None:
+            data['person'] = self.person_id
+        return data
+
+class LabelSegmenter:
+    """Run-length encodes the label sequence of one source, with hysteresis.
+
+    A new label only closes the current segment once it has been seen on
+    min_frames consecutive detections; shorter runs of other labels are
+    absorbed into the current segment as flicker frames. A pause of more
+    than max_gap seconds between detections also closes the segment.
+    """
+
+    def __init__(self, detection_type, stream_id=None, person_id=None, min_frames=3, max_gap=2.0):
+        self.type = detection_type
+        self.stream_id = stream_id
+        self.person_id = person_id
+        self.min_frames = min_frames
+        self.max_gap = max_gap
+        self.current = None
+        self.candidate_label = None
+        self.candidate = []  # (confidence, timestamp) of the pending new label
+        self.last_timestamp = None
+
+    def add(self, label, confidence, timestamp):
+        """Feed one detection; returns the segment it closed, if any"""
+        closed = None
+        if self.current is not None and timestamp - self.last_timestamp > self.max_gap:
+            closed = self.flush()
+        self.last_timestamp = timestamp
+
+        current = self.current
+        if current is None:
+            self.current = LabelSegment(self.type, label, confidence, timestamp, self.stream_id, self.person_id)
+            return closed
+
+        if label == current.label:
+            if self.candidate:
+                current.absorb(len(self.candidate), self.candidate[-1][1])
+                self.candidate = []
+            current.add(confidence, timestamp)
+            return closed
+
+        if self.candidate and label != self.candidate_label:
+            current.absorb(len(self.candidate), self.candidate[-1][1])
+            self.candidate = []
+        self.candidate_label = label
+        self.candidate.append((confidence, timestamp))
+        if len(self.candidate) < self.min_frames:
+            return closed
+
+        first_confidence, first_timestamp = self.candidate[0]
+        segment = LabelSegment(self.type, label, first_confidence, first_timestamp, self.stream_id, self.person_id)
+        for pending_confidence, pending_timestamp in self.candidate[1:]:
+            segment.add(pending_confidence, pending_timestamp)
+        self.candidate = []
+        self.current = segment
+        return current
+
+    def flush(self):
+        """Close and return the current segment (None if there is none)"""
+        segment = self.current
+        if segment is not None and self.candidate:
+            segment.absorb(len(self.candidate), self.candidate[-1][1])
+        self.current = None
+        self.candidate = []
+        return segment
+
+class AnalyticsTracker:
+    def __init__(self, reservoir_size=0, event_log=None, segment_min_frames=3, segment_max_gap=2.0):
         self.session_start = datetime.now()
         self.behavior_counts = defaultdict(int)
         self.emotion_counts = defaultdict(int)
-        self.behavior_confidences = defaultdict(list)
-        self.emotion_confidences = defaultdict(list)
-        self.recent_activity = deque(maxlen=100)
+        self.behavior_confidences = defaultdict(ConfidenceStats)
+        self.emotion_confidences = defaultdict(ConfidenceStats)
+        # Optional bounded sample of raw confidence values per label
+        self.reservoir_size = reservoir_size
+        self.behavior_samples = defaultdict(lambda: ReservoirSample(self.reservoir_size))
+        self.emotion_samples = defaultdict(lambda: ReservoirSample(self.reservoir_size))
+        # Bucketed counts for "last N minutes" queries
+        self.behavior_rollup = LabelRollup()
+        self.emotion_rollup = LabelRollup()
+        # Per-stream label counts when detections come from several sources
+        self.stream_behavior_counts = defaultdict(lambda: defaultdict(int))
+        self.stream_emotion_counts = defaultdict(lambda: defaultdict(int))
+        # Per-person label counts from the person tracker's ids
+        self.person_behavior_counts = defaultdict(lambda: defaultdict(int))
+        self.person_emotion_counts = defaultdict(lambda: defaultdict(int))
+        # Optional DetectionLog that persists every event
+        self.event_log = event_log
+        # Activity as label segments: one open segmenter per (type, stream, person),
+        # closed segments kept in order of closing
+        self.segment_min_frames = segment_min_frames
+        self.segment_max_gap = segment_max_gap
+        self.segmenters = {}
+        self.recent_activity = deque(maxlen=1000)
         self.total_detections = 0
     
-    def add_behavior_detection(self, behavior, confidence):
+    def add_behavior_detection(self, behavior, confidence, timestamp=None, stream_id=None, person_id=None):
         """Add a behavior detection to analytics"""
         self.behavior_counts[behavior] += 1
-        self.behavior_confidences[behavior].append(confidence)
+        timestamp = time.time() if timestamp is None else timestamp
+        self.behavior_rollup.add(behavior, confidence, timestamp)
+        if stream_id is not None:
+            self.stream_behavior_counts[stream_id][behavior] += 1
+        if person_id is not None:
+            self.person_behavior_counts[person_id][behavior] += 1
+        if self.event_log is not None:
+            self.event_log.append('behavior', behavior, confidence, timestamp, stream_id)
+        self.behavior_confidences[behavior].add(confidence)
+        if self.reservoir_size:
+            self.behavior_samples[behavior].add(confidence)
         self.total_detections += 1
-        
-        self.recent_activity.append({
-            'timestamp': datetime.now().strftime('%H:%M:%S'),
-            'type': 'Behavior',
-            'detection': behavior.title(),
-            'confidence': f"{confidence:.2f}"
-        })
+        self._add_to_segment('behavior', behavior, confidence, timestamp, stream_id, person_id)
     
-    def add_emotion_detection(self, emotion, confidence):
+    def add_emotion_detection(self, emotion, confidence, timestamp=None, stream_id=None, person_id=None):
         """Add an emotion detection to analytics"""
         self.emotion_counts[emotion] += 1
-        self.emotion_confidences[emotion].append(confidence)
+        timestamp = time.time() if timestamp is None else timestamp
+        self.emotion_rollup.add(emotion, confidence, timestamp)
+        if stream_id is not None:
+            self.stream_emotion_counts[stream_id][emotion] += 1
+        if person_id is not None:
+            self.person_emotion_counts[person_id][emotion] += 1
+        if self.event_log is not None:
+            self.event_log.append('emotion', emotion, confidence, timestamp, stream_id)
+        self.emotion_confidences[emotion].add(confidence)
+        if self.reservoir_size:
+            self.emotion_samples[emotion].add(confidence)
         self.total_detections += 1
-        
-        self.recent_activity.append({
-            'timestamp': datetime.now().strftime('%H:%M:%S'),
-            'type': 'Emotion',
-            'detection': emotion.title(),
-            'confidence': f"{confidence:.2f}"
-        })
+        self._add_to_segment('emotion', emotion, confidence, timestamp, stream_id, person_id)
+
+    def _add_to_segment(self, detection_type, label, confidence, timestamp, stream_id, person_id):
+        key = (detection_type, stream_id, person_id)
+        segmenter = self.segmenters.get(key)
+        if segmenter is None:
+            segmenter = self.segmenters[key] = LabelSegmenter(
+                detection_type, stream_id, person_id, self.segment_min_frames, self.segment_max_gap
+            )
+        closed = segmenter.add(label, confidence, timestamp)
+        if closed is not None:
+            self.recent_activity.append(closed)
     
     def get_session_stats(self):
         """Get overall session statistics"""
@@ -51,17 +387,97 @@ class AnalyticsTracker:
             'session_start': self.session_start.strftime('%H:%M:%S')
         }
     
-    def get_behavior_distribution(self):
-        """Get behavior count distribution"""
-        return dict(self.behavior_counts)
+    def get_behavior_distribution(self, window_seconds=None, now=None):
+        """Get behavior count distribution, over the whole session or the last window_seconds"""
+        if window_seconds is None:
+            return dict(self.behavior_counts)
+        return self._windowed_counts(self.behavior_rollup, window_seconds, now)
     
-    def get_emotion_distribution(self):
-        """Get emotion count distribution"""
-        return dict(self.emotion_counts)
+    def get_emotion_distribution(self, window_seconds=None, now=None):
+        """Get emotion count distribution, over the whole session or the last window_seconds"""
+        if window_seconds is None:
+            return dict(self.emotion_counts)
+        return self._windowed_counts(self.emotion_rollup, window_seconds, now)
+
+    def _rollup(self, detection_type):
+        return self.behavior_rollup if detection_type == 'behavior' else self.emotion_rollup
+
+    def _windowed_counts(self, rollup, window_seconds, now):
+        now = time.time() if now is None else now
+        return {label: count for label, (count, _) in rollup.window(window_seconds, now).items()}
+
+    def get_detection_rates(self, detection_type='behavior', window_seconds=60, now=None):
+        """Detections per second for each label over the last window_seconds"""
+        now = time.time() if now is None else now
+        # Early in a session the window is only partly filled
+        elapsed = min(window_seconds, max(now - self.session_start.timestamp(), 1.0))
+        window = self._rollup(detection_type).window(window_seconds, now)
+        return {label: count / elapsed for label, (count, _) in window.items()}
+
+    def get_windowed_confidence(self, detection_type='behavior', window_seconds=60, now=None):
+        """Mean confidence for each label over the last window_seconds"""
+        now = time.time() if now is None else now
+        window = self._rollup(detection_type).window(window_seconds, now)
+        return {label: total / count for label, (count, total) in window.items()}
+    
+    def get_stream_distribution(self, stream_id):
+        """Behavior and emotion counts of one stream"""
+        return {
+            'behavior': dict(self.stream_behavior_counts.get(stream_id, {})),
+            'emotion': dict(self.stream_emotion_counts.get(stream_id, {}))
+        }
+
+    def get_streams(self):
+        """Ids of every stream that reported a detection"""
+        return sorted(set(self.stream_behavior_counts) | set(self.stream_emotion_counts))
+    
+    def get_person_distribution(self, person_id):
+        """Behavior and emotion counts of one tracked person"""
+        return {
+            'behavior': dict(self.person_behavior_counts.get(person_id, {})),
+            'emotion': dict(self.person_emotion_counts.get(person_id, {}))
+        }
+
+    def get_people(self):
+        """Ids of every tracked person with at least one detection"""
+        return sorted(set(self.person_behavior_counts) | set(self.person_emotion_counts))
     
+    def close_stale_segments(self, now=None):
+        """Close the segments of sources not seen for more than segment_max_gap seconds"""
+        now = time.time() if now is None else now
+        for key, segmenter in list(self.segmenters.items()):
+            if now - segmenter.last_timestamp > self.segment_max_gap:
+                closed = segmenter.flush()
+                if closed is not None:
+                    self.recent_activity.append(closed)
+                del self.segmenters[key]
+
+    def get_activity_segments(self, include_open=True, now=None):
+        """Closed (and still open) label segments, oldest first"""
+        self.close_stale_segments(now)
+        segments = list(self.recent_activity)
+        if include_open:
+            segments.extend(segmenter.current for segmenter in self.segmenters.values()
+                            if segmenter.current is not None)
+        segments.sort(key=lambda segment: segment.start)
+        return segments
+
     def get_recent_activity(self, limit=10):
-        """Get recent detection activity"""
-        return list(self.recent_activity)[-limit:]
+        """The latest label segments as display rows"""
+        rows = []
+        for segment in self.get_activity_segments()[-limit:]:
+            row = {
+                'timestamp': time.strftime('%H:%M:%S', time.localtime(segment.start)),
+                'type': segment.type.title(),
+                'detection': segment.label.title(),
+                'duration': f"{segment.duration:.1f}s",
+                'frames': segment.frames,
+                'confidence': f"{segment.mean_confidence:.2f}"
+            }
+            if segment.person_id is not None:
+                row['person'] = segment.person_id
+            rows.append(row)
+        return rows
     
     def get_top_behaviors(self, limit=5):
         """Get top detected behaviors"""
@@ -84,18 +500,12 @@ class AnalyticsTracker:
     def get_average_confidence(self, detection_type='all'):
         """Get average confidence scores"""
         if detection_type == 'behavior' or detection_type == 'all':
-            behavior_confidences = []
-            for confidences in self.behavior_confidences.values():
-                behavior_confidences.extend(confidences)
-            avg_behavior = sum(behavior_confidences) / len(behavior_confidences) if behavior_confidences else 0
+            avg_behavior = self._overall_mean(self.behavior_confidences)
         else:
             avg_behavior = 0
         
         if detection_type == 'emotion' or detection_type == 'all':
-            emotion_confidences = []
-            for confidences in self.emotion_confidences.values():
-                emotion_confidences.extend(confidences)
-            avg_emotion = sum(emotion_confidences) / len(emotion_confidences) if emotion_confidences else 0
+            avg_emotion = self._overall_mean(self.emotion_confidences)
         else:
             avg_emotion = 0
         
@@ -109,19 +519,38 @@ class AnalyticsTracker:
             return avg_behavior
         else:
             return avg_emotion
+
+    def _overall_mean(self, confidence_stats):
+        """Mean over every value of every label, from the per-label sums"""
+        count = sum(stats.count for stats in confidence_stats.values())
+        total = sum(stats.total for stats in confidence_stats.values())
+        return total / count if count else 0
+
+    def get_confidence_stats(self, detection_type='behavior'):
+        """Per-label confidence aggregates (count, mean, std, min, max, quantiles)"""
+        stats = self.behavior_confidences if detection_type == 'behavior' else self.emotion_confidences
+        return {label: label_stats.to_dict() for label, label_stats in stats.items()}
     
     def export_session_data(self):
         """Export session data as dictionary for saving"""
-        return {
+        data = {
             'session_start': self.session_start.isoformat(),
             'session_end': datetime.now().isoformat(),
             'behavior_counts': dict(self.behavior_counts),
             'emotion_counts': dict(self.emotion_counts),
-            'behavior_confidences': {k: v for k, v in self.behavior_confidences.items()},
-            'emotion_confidences': {k: v for k, v in self.emotion_confidences.items()},
+            'behavior_confidences': self.get_confidence_stats('behavior'),
+            'emotion_confidences': self.get_confidence_stats('emotion'),
             'total_detections': self.total_detections,
-            'recent_activity': list(self.recent_activity)
+            'recent_activity': [segment.to_dict() for segment in self.get_activity_segments()]
         }
+        if self.stream_behavior_counts or self.stream_emotion_counts:
+            data['streams'] = {stream_id: self.get_stream_distribution(stream_id) for stream_id in self.get_streams()}
+        if self.person_behavior_counts or self.person_emotion_counts:
+            data['people'] = {str(person_id): self.get_person_distribution(person_id) for person_id in self.get_people()}
+        if self.reservoir_size:
+            data['behavior_confidence_samples'] = {k: list(v.values) for k, v in self.behavior_samples.items()}
+            data['emotion_confidence_samples'] = {k: list(v.values) for k, v in self.emotion_samples.items()}
+        return data
     
     def reset_session(self):
         """Reset all analytics data"""
@@ -130,5 +559,14 @@ class AnalyticsTracker:
         self.emotion_counts.clear()
         self.behavior_confidences.clear()
         self.emotion_confidences.clear()
+        self.behavior_samples.clear()
+        self.emotion_samples.clear()
+        self.behavior_rollup.clear()
+        self.emotion_rollup.clear()
+        self.stream_behavior_counts.clear()
+        self.stream_emotion_counts.clear()
+        self.person_behavior_counts.clear()
+        self.person_emotion_counts.clear()
+        self.segmenters.clear()
         self.recent_activity.clear()
         self.total_detections = 0
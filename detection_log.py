@@ -0,0 +1,284 @@
+import glob
+import os
+import threading
+import time
+import uuid
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+SCHEMA = pa.schema([
+    ('timestamp', pa.float64()),
+    ('type', pa.string()),
+    ('label', pa.string()),
+    ('confidence', pa.float32()),
+    ('stream', pa.string()),
+])
+
+SEGMENT_PREFIX = "detections_"
+SEGMENT_SUFFIX = ".parquet"
+OPEN_SUFFIX = ".part"  # segment still being written; readers skip it
+
+
+class DetectionLog:
+    """Append-only detection log written in batches to Parquet segments.
+
+    append() only adds to in-memory column lists; a background thread turns
+    full buffers into record batches and writes them as row groups. A
+    segment is closed and a new one started once it exceeds
+    max_segment_bytes or has been open for max_segment_seconds. Closed
+    segments are named detections_<first_ms>_<last_ms>_<log id>.parquet so
+    readers can skip files outside a time range without opening them; the
+    log id keeps logs sharing a directory from replacing each other's files.
+
+    A batch that cannot be written is reported and counted in
+    events_failed; if the writer thread itself stops, append() and flush()
+    raise instead of buffering forever.
+    """
+
+    def __init__(self, directory="detection_logs", batch_size=1024, flush_interval=2.0,
+                 max_segment_bytes=16 * 1024 * 1024, max_segment_seconds=600, compression="zstd"):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_seconds = max_segment_seconds
+        self.compression = compression
+        os.makedirs(directory, exist_ok=True)
+        self.log_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+        self._new_buffer()
+        self.pending = []
+        self.condition = threading.Condition()
+        self.closed = False
+        self.writer_error = None
+
+        self.writer = None
+        self.segment_path = None
+        self.segment_opened_at = None
+        self.segment_first = None
+        self.segment_last = None
+
+        self.events_logged = 0
+        self.events_written = 0
+        self.events_failed = 0
+        self.batches_written = 0
+        self.segments_closed = 0
+        self.write_seconds = 0.0
+
+        self.thread = threading.Thread(target=self._run_writer, daemon=True)
+        self.thread.start()
+
+    def _new_buffer(self):
+        self.timestamps = []
+        self.types = []
+        self.labels = []
+        self.confidences = []
+        self.streams = []
+
+    def append(self, detection_type, label, confidence, timestamp=None, stream_id=None):
+        """Buffer one detection; writing happens on the background thread"""
+        if stream_id is not None and not isinstance(stream_id, str):
+            stream_id = str(stream_id)  # e.g. a camera index
+        with self.condition:
+            self._check_writer()
+            self.timestamps.append(time.time() if timestamp is None else timestamp)
+            self.types.append(detection_type)
+            self.labels.append(label)
+            self.confidences.append(confidence)
+            self.streams.append(stream_id)
+            self.events_logged += 1
+            if len(self.timestamps) >= self.batch_size:
+                self._hand_off()
+
+    def _check_writer(self):
+        if self.writer_error is not None:
+            raise RuntimeError(f"Detection log writer stopped: {self.writer_error}")
+
+    def _hand_off(self):
+        """Move the current buffer to the writer queue (condition held)"""
+        if self.timestamps:
+            self.pending.append((self.timestamps, self.types, self.labels, self.confidences, self.streams))
+            self._new_buffer()
+            self.condition.notify()
+
+    def flush(self, wait=True):
+        """Write everything buffered so far"""
+        with self.condition:
+            self._check_writer()
+            self._hand_off()
+            target = self.events_logged
+            if wait:
+                while self.events_written + self.events_failed < target and self.thread.is_alive():
+                    self.condition.wait(0.1)
+            self._check_writer()
+
+    def close(self):
+        """Flush, close the open segment and stop the writer thread"""
+        with self.condition:
+            self._hand_off()
+            self.closed = True
+            self.condition.notify()
+        self.thread.join()
+
+    # ------------------ WRITER THREAD ------------------
+    def _run_writer(self):
+        try:
+            self._writer_loop()
+        except Exception as e:
+            print(f"Detection log writer stopped: {str(e)}")
+            with self.condition:
+                self.writer_error = e
+                self.condition.notify_all()
+
+    def _writer_loop(self):
+        while True:
+            with self.condition:
+                if not self.pending and not self.closed:
+                    self.condition.wait(self.flush_interval)
+                    if not self.pending:
+                        self._hand_off()  # periodic flush of a partly filled buffer
+                batches = self.pending
+                self.pending = []
+                closing = self.closed
+
+            for columns in batches:
+                try:
+                    self._write_batch(*columns)
+                except Exception as e:
+                    print(f"Error writing detection log batch: {str(e)}")
+                    with self.condition:
+                        self.events_failed += len(columns[0])
+            if batches:
+                with self.condition:
+                    self.condition.notify_all()
+
+            if self.writer is not None and self._segment_full():
+                self._close_segment()
+            if closing:
+                with self.condition:
+                    if self.pending:
+                        continue
+                self._close_segment()
+                return
+
+    def _write_batch(self, timestamps, types, labels, confidences, streams):
+        start = time.perf_counter()
+        batch = pa.record_batch([
+            pa.array(timestamps, pa.float64()),
+            pa.array(types, pa.string()),
+            pa.array(labels, pa.string()),
+            pa.array(confidences, pa.float32()),
+            pa.array(streams, pa.string()),
+        ], schema=SCHEMA)
+
+        if self.writer is not None and self._segment_full():
+            self._close_segment()
+        if self.writer is None:
+            self._open_segment(timestamps[0])
+        self.writer.write_batch(batch)
+        self.segment_first = min(self.segment_first, min(timestamps))
+        self.segment_last = max(self.segment_last, max(timestamps))
+
+        self.events_written += len(timestamps)
+        self.batches_written += 1
+        self.write_seconds += time.perf_counter() - start
+
+    def _open_segment(self, first_timestamp):
+        name = f"{SEGMENT_PREFIX}{int(first_timestamp * 1000)}_open_{self.log_id}{SEGMENT_SUFFIX}{OPEN_SUFFIX}"
+        self.segment_path = os.path.join(self.directory, name)
+        self.writer = pq.ParquetWriter(self.segment_path, SCHEMA, compression=self.compression)
+        self.segment_opened_at = time.time()
+        self.segment_first = first_timestamp
+        self.segment_last = first_timestamp
+
+    def _segment_full(self):
+        if time.time() - self.segment_opened_at >= self.max_segment_seconds:
+            return True
+        try:
+            return os.path.getsize(self.segment_path) >= self.max_segment_bytes
+        except OSError:
+            return False
+
+    def _close_segment(self):
+        if self.writer is None:
+            return
+        self.writer.close()
+        name = (f"{SEGMENT_PREFIX}{int(self.segment_first * 1000)}_"
+                f"{int(self.segment_last * 1000)}_{self.log_id}{SEGMENT_SUFFIX}")
+        os.replace(self.segment_path, os.path.join(self.directory, name))
+        self.writer = None
+        self.segment_path = None
+        self.segments_closed += 1
+
+    def get_stats(self):
+        """Events buffered/written and time spent writing"""
+        with self.condition:
+            buffered = len(self.timestamps) + sum(len(columns[0]) for columns in self.pending)
+        return {
+            'events_logged': self.events_logged,
+            'events_written': self.events_written,
+            'events_failed': self.events_failed,
+            'events_buffered': buffered,
+            'batches_written': self.batches_written,
+            'segments_closed': self.segments_closed,
+            'write_ms_per_event': self.write_seconds * 1000 / self.events_written if self.events_written else 0.0
+        }
+
+
+# ------------------ READER ------------------
+def _segment_range(path):
+    """(first, last) timestamp in seconds parsed from a closed segment's name"""
+    stem = os.path.basename(path)[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]
+    first, last = stem.split('_')[:2]
+    return int(first) / 1000.0, int(last) / 1000.0
+
+
+def list_segments(directory="detection_logs", start=None, end=None):
+    """Closed segment files in time order, optionally only those overlapping [start, end]"""
+    segments = []
+    for path in glob.glob(os.path.join(directory, f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}")):
+        try:
+            first, last = _segment_range(path)
+        except ValueError:
+            continue
+        # Names are truncated to whole milliseconds, so widen by one
+        if start is not None and last + 0.001 < start:
+            continue
+        if end is not None and first > end:
+            continue
+        segments.append((first, path))
+    return [path for _, path in sorted(segments)]
+
+
+def read_detection_log(source="detection_logs", start=None, end=None, labels=None,
+                       detection_type=None, streams=None, columns=None):
+    """Load detections as a pandas DataFrame.
+
+    source is a log directory, a segment path or a list of segment paths.
+    Segments outside [start, end] are skipped by name; the remaining
+    filters are pushed down to pyarrow so row groups are pruned by their
+    statistics. Stream ids are matched as the strings they are stored as,
+    so streams=[0] finds the detections appended with stream_id=0.
+    """
+    if isinstance(source, str) and os.path.isdir(source):
+        paths = list_segments(source, start, end)
+    else:
+        paths = [source] if isinstance(source, str) else list(source)
+
+    filters = []
+    if start is not None:
+        filters.append(('timestamp', '>=', start))
+    if end is not None:
+        filters.append(('timestamp', '<=', end))
+    if labels is not None:
+        filters.append(('label', 'in', list(labels)))
+    if detection_type is not None:
+        filters.append(('type', '=', detection_type))
+    if streams is not None:
+        filters.append(('stream', 'in', [str(stream) for stream in streams]))
+
+    if not paths:
+        return SCHEMA.empty_table().to_pandas()
+    tables = [pq.read_table(path, columns=columns, filters=filters or None) for path in paths]
+    return pa.concat_tables(tables).to_pandas()
@@ -0,0 +1,189 @@
+import os
+import threading
+import time
+import weakref
+from collections import defaultdict
+
+import numpy as np
+
+
+def _process_age():
+    """Seconds since this process started, from /proc; 0.0 where that is not available"""
+    try:
+        with open('/proc/self/stat') as f:
+            stat = f.read()
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        # starttime (field 22, in clock ticks after boot) counted from the field after the command name
+        start_ticks = int(stat.rsplit(')', 1)[1].split()[19])
+        return max(0.0, uptime - start_ticks / os.sysconf('SC_CLK_TCK'))
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+# perf_counter() value at process start (at this module's import where /proc is missing)
+PROCESS_START = time.perf_counter() - _process_age()
+
+
+def build_detectors(max_num_faces=1, model_complexity=1, refine_landmarks=True, static_image_mode=False):
+    """Build a BehaviorDetector/EmotionDetector pair with both MediaPipe graphs loaded"""
+    from emotion_engine import EmotionDetector
+    from pose_behavior import BehaviorDetector
+    behavior_detector = BehaviorDetector(model_complexity=model_complexity, static_image_mode=static_image_mode)
+    emotion_detector = EmotionDetector(max_num_faces=max_num_faces, refine_landmarks=refine_landmarks,
+                                       static_image_mode=static_image_mode)
+    behavior_detector.pose
+    emotion_detector.face_mesh
+    return behavior_detector, emotion_detector
+
+
+class DetectorLease:
+    """A BehaviorDetector/EmotionDetector pair checked out of a DetectorFactory.
+
+    The pair goes back to the factory's idle pool when release() is called
+    or when the lease is garbage collected (e.g. with the Streamlit session
+    that held it), so the next session starts with already built graphs.
+    """
+
+    def __init__(self, factory, key, behavior_detector, emotion_detector):
+        self.key = key
+        self.behavior_detector = behavior_detector
+        self.emotion_detector = emotion_detector
+        self._finalizer = weakref.finalize(self, factory._give_back, key, behavior_detector, emotion_detector)
+
+    @property
+    def released(self):
+        return not self._finalizer.alive
+
+    def release(self):
+        """Return the pair to the pool; the detectors must not be used afterwards"""
+        self._finalizer()
+
+
+class DetectorFactory:
+    """Process-wide cache of built and warmed-up detector pairs.
+
+    Importing mediapipe, building the Pose and FaceMesh graphs and the
+    first inference through each (which initializes the models) are paid
+    once per pair instead of on the first video frame: acquire() hands out
+    an idle pair if one exists and otherwise builds one and runs warm_up()
+    on a blank frame. Pairs are keyed by their configuration (max_num_faces,
+    model_complexity, refine_landmarks, static_image_mode) and are never shared by two leases
+    at a time, since MediaPipe graphs keep per-stream tracking state. A lease that serves
+    several streams in turn (e.g. an InferenceService worker) resets its graphs between them.
+
+    builder is called with the four configuration values and returns a
+    new (behavior_detector, emotion_detector) pair; build_detectors() by
+    default, stand-ins in tests. At most max_idle pairs per configuration
+    are kept idle; further released pairs (e.g. quality tiers that were
+    swapped out) have their graphs closed.
+    """
+
+    def __init__(self, warm_up_shape=(480, 640, 3), builder=build_detectors, max_idle=2):
+        self.warm_up_shape = warm_up_shape
+        self.builder = builder
+        self.max_idle = max_idle
+        self.lock = threading.Lock()
+        self.idle = defaultdict(list)
+
+        self.pairs_built = 0
+        self.pairs_closed = 0
+        self.leases = 0
+        self.pool_hits = 0
+        self.import_ms = None
+        self.construct_ms = []
+        self.warm_up_ms = []
+        self.cold_start_ms = None
+        self.time_to_first_detection_ms = None
+
+    def acquire(self, max_num_faces=1, model_complexity=1, refine_landmarks=True, static_image_mode=False,
+                warm=True):
+        """Lease a detector pair for this configuration, building it if none is idle"""
+        key = (max_num_faces, model_complexity, refine_landmarks, static_image_mode)
+        with self.lock:
+            pair = self.idle[key].pop() if self.idle[key] else None
+            self.leases += 1
+            if pair is not None:
+                self.pool_hits += 1
+        if pair is None:
+            pair = self._build(key)
+            if warm:
+                self.warm_up(*pair)
+        return DetectorLease(self, key, *pair)
+
+    def prewarm(self, count=1, max_num_faces=1, model_complexity=1, refine_landmarks=True,
+                static_image_mode=False):
+        """Build and warm count idle pairs ahead of the first acquire()"""
+        key = (max_num_faces, model_complexity, refine_landmarks, static_image_mode)
+        for _ in range(count):
+            pair = self._build(key)
+            self.warm_up(*pair)
+            self._give_back(key, *pair)
+
+    def _build(self, key):
+        start = time.perf_counter()
+        if self.import_ms is None and self.builder is build_detectors:
+            import mediapipe  # noqa: F401  (timed separately: it dominates the first build)
+            self.import_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+
+        behavior_detector, emotion_detector = self.builder(*key)
+
+        with self.lock:
+            self.pairs_built += 1
+            self.construct_ms.append((time.perf_counter() - start) * 1000)
+        return behavior_detector, emotion_detector
+
+    def warm_up(self, behavior_detector, emotion_detector, frame_shape=None):
+        """Run a blank frame through both detectors so model setup is not paid on a live frame; returns ms"""
+        frame = np.zeros(frame_shape or self.warm_up_shape, dtype=np.uint8)
+        start = time.perf_counter()
+        behavior_detector.detect(frame)
+        emotion_detector.detect(frame)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        behavior_detector.reset_history()
+
+        with self.lock:
+            self.warm_up_ms.append(elapsed_ms)
+            if self.cold_start_ms is None:
+                self.cold_start_ms = (time.perf_counter() - PROCESS_START) * 1000
+        return elapsed_ms
+
+    def _give_back(self, key, behavior_detector, emotion_detector):
+        # The next lease may be another stream: nothing tracked in this one may carry over
+        behavior_detector.reset_tracking()
+        emotion_detector.reset_tracking()
+        with self.lock:
+            if len(self.idle[key]) < self.max_idle:
+                self.idle[key].append((behavior_detector, emotion_detector))
+                return
+            self.pairs_closed += 1
+        behavior_detector.close()
+        emotion_detector.close()
+
+    def record_first_detection(self, started_at):
+        """Record the time from a perf_counter() start (e.g. pressing Start) to the first result"""
+        elapsed_ms = (time.perf_counter() - started_at) * 1000
+        with self.lock:
+            if self.time_to_first_detection_ms is None:
+                self.time_to_first_detection_ms = elapsed_ms
+        return elapsed_ms
+
+    def get_stats(self):
+        """Startup costs and pool usage, in milliseconds"""
+        with self.lock:
+            return {
+                'cold_start_ms': self.cold_start_ms,
+                'import_ms': self.import_ms,
+                'construct_ms': self.construct_ms[0] if self.construct_ms else None,
+                'warm_up_ms': self.warm_up_ms[0] if self.warm_up_ms else None,
+                'time_to_first_detection_ms': self.time_to_first_detection_ms,
+                'pairs_built': self.pairs_built,
+                'pairs_closed': self.pairs_closed,
+                'idle_pairs': sum(len(pairs) for pairs in self.idle.values()),
+                'leases': self.leases,
+                'pool_hits': self.pool_hits
+            }
+
+
+DETECTOR_FACTORY = DetectorFactory()
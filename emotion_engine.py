@@ -1,20 +1,46 @@
-import mediapipe as mp
 import math
+import numpy as np
 
-class EmotionDetector:
-    def __init__(self):
-        
+from emotion_rules import compile_rules
+from frame_pipeline import preprocess_frame
+from stage_timing import STAGE_TIMER
+
+# Order of the columns returned by EmotionDetector.extract_features_batch
+FEATURE_NAMES = ('eye_aspect_ratio', 'mouth_aspect_ratio', 'eyebrow_position', 'mouth_curve')
+
+# Emotion rule table compiled once per process and shared by all detectors
+EMOTION_RULE_ENGINE = compile_rules(FEATURE_NAMES)
+
+# Face outline (MediaPipe FACEMESH_FACE_OVAL); its extent is the face bounding box
+FACE_OVAL = [10, 338, 297, 332, 284, 251, 389, 356, 454, 323, 361, 288, 397, 365, 379, 378, 400, 377,
+             152, 148, 176, 149, 150, 136, 172, 58, 132, 93, 234, 127, 162, 21, 54, 103, 67, 109]
 
-        self.mp_face_mesh = mp.solutions.face_mesh
-        self.face_mesh = self.mp_face_mesh.FaceMesh(
-            static_image_mode=False,
-            max_num_faces=1,
-            refine_landmarks=True,
-            min_detection_confidence=0.5,
-            min_tracking_confidence=0.5
-        )
-        self.mp_drawing = mp.solutions.drawing_utils
-        self.mp_drawing_styles = mp.solutions.drawing_styles
+# Counters behind EmotionDetector.get_roi_stats; the inference service also keeps them per session
+ROI_COUNTERS = ('roi_attempts', 'roi_hits', 'full_frame_runs', 'full_frame_hits')
+
+def roi_stats(counts):
+    """ROI counters plus roi_fallbacks (crops that found no face) and roi_rate, the share of found faces from crops"""
+    stats = {name: counts[name] for name in ROI_COUNTERS}
+    total = stats['roi_hits'] + stats['full_frame_hits']
+    stats['roi_fallbacks'] = stats['roi_attempts'] - stats['roi_hits']
+    stats['roi_rate'] = stats['roi_hits'] / total if total else 0.0
+    return stats
+
+def _solutions():
+    """mediapipe.solutions, imported on first use (importing mediapipe takes about a second)"""
+    import mediapipe as mp
+    return mp.solutions
+
+class EmotionDetector:
+    def __init__(self, use_pose_roi=False, max_num_faces=1, refine_landmarks=True, static_image_mode=False):
+        self.max_num_faces = max_num_faces
+        # Iris refinement adds 10 landmarks the emotion features do not use
+        self.refine_landmarks = refine_landmarks
+        # Detect on every image instead of tracking faces across frames
+        self.static_image_mode = static_image_mode
+        # The FaceMesh graph is built on first use (see the face_mesh property)
+        self._face_mesh = None
+        self.rule_engine = EMOTION_RULE_ENGINE
         
         self.key_landmarks = {
             'left_eye': [33, 7, 163, 144, 145, 153, 154, 155, 133, 173, 157, 158, 159, 160, 161, 246],
@@ -23,95 +49,300 @@ class EmotionDetector:
             'eyebrows': [70, 63, 105, 66, 107, 55, 65, 52, 53, 46, 296, 334, 293, 300, 276, 283, 282, 295, 285]
         }
 
+        # Landmarks used by the vectorized features, gathered in one indexing op.
+        # [0:8] and [8:16] are the endpoints of the eight distances: EAR pairs
+        # (1,5), (2,4), (0,3) of the left then right eye, mouth width (0,10)
+        # and mouth height (5,15). [16:20] are the first four eyebrow points
+        # and [20:24] the first four left-eye points.
+        left_eye = self.key_landmarks['left_eye']
+        right_eye = self.key_landmarks['right_eye']
+        mouth = self.key_landmarks['mouth']
+        eyebrows = self.key_landmarks['eyebrows']
+        pairs = [(left_eye[a], left_eye[b]) for a, b in ((1, 5), (2, 4), (0, 3))]
+        pairs += [(right_eye[a], right_eye[b]) for a, b in ((1, 5), (2, 4), (0, 3))]
+        pairs += [(mouth[0], mouth[10]), (mouth[5], mouth[15])]
+        self.feature_indices = [a for a, _ in pairs] + [b for _, b in pairs] + eyebrows[:4] + left_eye[:4]
+
+        # The features as a few array products over those landmarks (see _feature_matrix).
+        # ratio_terms sums the eight distances into the numerators [0] and denominators [1]
+        # of the left EAR, right EAR and MAR; y_terms turns the y coordinates into eyebrow
+        # minus eye height and mouth centre minus corners; output_terms scales both into
+        # FEATURE_NAMES order, and feature_bounds are the clipping limits.
+        self.ratio_terms = np.zeros((2, 8, 3))
+        self.ratio_terms[0, [0, 1], 0] = self.ratio_terms[0, [3, 4], 1] = self.ratio_terms[0, 7, 2] = 1.0
+        self.ratio_terms[1, 2, 0] = self.ratio_terms[1, 5, 1] = 2.0
+        self.ratio_terms[1, 6, 2] = 1.0
+        self.ratio_defaults = np.array([0.3, 0.3, 0.5])
+        self.y_terms = np.zeros((24, 2))
+        self.y_terms[16:20, 0], self.y_terms[20:24, 0] = 0.25, -0.25
+        self.y_terms[[7, 15], 1], self.y_terms[[6, 14], 1] = 0.5, -0.5
+        self.output_terms = np.zeros((5, 4))
+        self.output_terms[[0, 1], 0] = 0.5
+        self.output_terms[2, 1] = 1.0
+        self.output_terms[3, 2] = 1 / 100.0
+        self.output_terms[4, 3] = 1 / 50.0
+        self.feature_bounds = (np.array([-np.inf, -np.inf, 0.0, -1.0]), np.array([np.inf, np.inf, 1.0, 1.0]))
+
+        # Optional face cropping from pose keypoints (see _detect_in_roi); single-face only.
+        # Crops get their own FaceMesh so its tracking state stays in crop coordinates.
+        self.use_pose_roi = use_pose_roi
+        self.roi_face_mesh = None
+        self.roi_attempts = 0
+        self.roi_hits = 0
+        self.full_frame_runs = 0
+        self.full_frame_hits = 0
+
+    @property
+    def mp_face_mesh(self):
+        return _solutions().face_mesh
+
+    @property
+    def mp_drawing(self):
+        return _solutions().drawing_utils
+
+    @property
+    def mp_drawing_styles(self):
+        return _solutions().drawing_styles
+
+    @property
+    def face_mesh(self):
+        """MediaPipe FaceMesh graph, built on first access"""
+        if self._face_mesh is None:
+            self._face_mesh = self.mp_face_mesh.FaceMesh(
+                static_image_mode=self.static_image_mode,
+                max_num_faces=self.max_num_faces,
+                refine_landmarks=self.refine_landmarks,
+                min_detection_confidence=0.5,
+                min_tracking_confidence=0.5
+            )
+        return self._face_mesh
+
+    @property
+    def is_loaded(self):
+        """True once the FaceMesh graph has been built"""
+        return self._face_mesh is not None
+
+    def reset_graphs(self):
+        """Forget the faces both FaceMesh graphs track"""
+        for graph in (self._face_mesh, self.roi_face_mesh):
+            if graph is not None:
+                graph.reset()
+
+    def reset_tracking(self):
+        """Forget the faces both FaceMesh graphs track and the ROI settings and counters"""
+        self.reset_graphs()
+        self.use_pose_roi = False
+        self.roi_attempts = self.roi_hits = 0
+        self.full_frame_runs = self.full_frame_hits = 0
+
+    def close(self):
+        """Free both FaceMesh graphs; they are built again if the detector is used afterwards"""
+        for graph in (self._face_mesh, self.roi_face_mesh):
+            if graph is not None:
+                graph.close()
+        self._face_mesh = None
+        self.roi_face_mesh = None
+
     # ------------------ DETECT FUNCTION ------------------
     def detect(self, frame):
-        import cv2
-        try:
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = self.face_mesh.process(rgb_frame)
+        return self.detect_context(preprocess_frame(frame))
 
-            if not results.multi_face_landmarks:
-                return None
+    def detect_context(self, ctx, pose_keypoints=None):
+        """Detect emotion in a FrameContext, cropping to the face when pose keypoints are given.
 
-            landmarks = results.multi_face_landmarks[0].landmark
-            features = self._extract_facial_features(landmarks, frame.shape)
-            emotion, confidence = self._classify_emotion(features)
+        The result describes the first face; result['faces'] holds one
+        result per detected face (up to max_num_faces), each with its
+        normalized bounding box and centre for tracking.
+        """
+        try:
+            image = ctx.inference_rgb
+            face_landmarks = None
+            if self.use_pose_roi and pose_keypoints and self.max_num_faces == 1:
+                face_landmarks = self._detect_in_roi(image, pose_keypoints, ctx.timer)
 
-            return {
-                'emotion': emotion,
-                'confidence': confidence,
-                'landmarks': results.multi_face_landmarks[0],
-                'features': features
-            }
+            if face_landmarks is not None:
+                face_landmarks_list = [face_landmarks]
+            else:
+                self.full_frame_runs += 1
+                with ctx.timer.stage('face_inference'):
+                    results = self.face_mesh.process(image)
+                if not results.multi_face_landmarks:
+                    return None
+                self.full_frame_hits += 1
+                face_landmarks_list = results.multi_face_landmarks
+
+            faces = self.classify_faces(face_landmarks_list, ctx.shape, ctx.timer)
+            result = dict(faces[0])
+            result['faces'] = faces
+            return result
 
         except Exception as e:
             print(f"Error in emotion detection: {str(e)} - emotion_engine.py:48")
             return None
 
+    # ------------------ FACE ROI ------------------
+    def _face_roi(self, pose_keypoints, image_shape):
+        """Square face crop (x0, y0, x1, y1) in pixels from the nose and shoulders, or None"""
+        nose = pose_keypoints.get('nose')
+        left = pose_keypoints.get('left_shoulder')
+        right = pose_keypoints.get('right_shoulder')
+        if not nose or not left or not right or nose['visibility'] < 0.5:
+            return None
+
+        h, w = image_shape[:2]
+        shoulder_width = math.hypot((left['x'] - right['x']) * w, (left['y'] - right['y']) * h)
+        size = max(shoulder_width * 1.2, 64.0)
+        if size >= 0.8 * min(w, h):
+            return None  # the face fills most of the frame anyway
+
+        # The nose sits slightly below the centre of the head
+        cx, cy = nose['x'] * w, nose['y'] * h - 0.1 * size
+        x0, y0 = max(int(cx - size / 2), 0), max(int(cy - size / 2), 0)
+        x1, y1 = min(int(cx + size / 2), w), min(int(cy + size / 2), h)
+        if x1 - x0 < 32 or y1 - y0 < 32:
+            return None
+        return x0, y0, x1, y1
+
+    def _detect_in_roi(self, image, pose_keypoints, timer=STAGE_TIMER):
+        """Run FaceMesh on the pose-derived face crop; landmarks come back in full-image coordinates"""
+        roi = self._face_roi(pose_keypoints, image.shape)
+        if roi is None:
+            return None
+
+        self.roi_attempts += 1
+        if self.roi_face_mesh is None:
+            self.roi_face_mesh = self.mp_face_mesh.FaceMesh(
+                static_image_mode=self.static_image_mode,
+                max_num_faces=1,
+                refine_landmarks=self.refine_landmarks,
+                min_detection_confidence=0.5,
+                min_tracking_confidence=0.5
+            )
+
+        x0, y0, x1, y1 = roi
+        crop = np.ascontiguousarray(image[y0:y1, x0:x1])
+        with timer.stage('face_inference'):
+            results = self.roi_face_mesh.process(crop)
+        if not results.multi_face_landmarks:
+            return None
+
+        self.roi_hits += 1
+        h, w = image.shape[:2]
+        return self._remap_landmarks(results.multi_face_landmarks[0], roi, w, h)
+
+    @staticmethod
+    def _remap_landmarks(face_landmarks, roi, width, height):
+        """Map crop-normalized landmarks back to full-image normalized coordinates"""
+        x0, y0, x1, y1 = roi
+        crop_w, crop_h = x1 - x0, y1 - y0
+        remapped = type(face_landmarks)()
+        remapped.CopyFrom(face_landmarks)
+        for landmark in remapped.landmark:
+            landmark.x = (landmark.x * crop_w + x0) / width
+            landmark.y = (landmark.y * crop_h + y0) / height
+            landmark.z = landmark.z * crop_w / width
+        return remapped
+
+    def get_roi_stats(self):
+        """How often the face crop and full-frame inference ran and found a face (see roi_stats)"""
+        return roi_stats({name: getattr(self, name) for name in ROI_COUNTERS})
+
     # ------------------ CLASSIFY EMOTION ------------------
     def _classify_emotion(self, features):
         try:
-            emotions = []
-
-        # Happy
-            happy_score = self._detect_happy(features)
-            if happy_score > 0.35:
-                emotions.append(('happy', happy_score))
-
-
-        # Sad
-            sad_score = self._detect_sad(features)
-            if sad_score > 0.35:
-                emotions.append(('sad', sad_score))
-
-        # Surprised
-            surprised_score = self._detect_surprised(features)
-            if surprised_score > 0.2:
-                emotions.append(('surprised', surprised_score))
-
-        # Sleepy
-            sleepy_score = self._detect_sleepy(features)
-            if sleepy_score > 0.25:
-                emotions.append(('sleepy', sleepy_score))
-
-        # Cry
-            cry_score = self._detect_cry(features)
-            if cry_score > 0.35:
-                emotions.append(('cry', cry_score))
-
-        # Flu
-            flu_score = self._detect_flu(features)
-            if flu_score > 0.25:
-                emotions.append(('flu', flu_score))
-
-        # Smoking
-            smoking_score = self._detect_smoking(features)
-            if smoking_score > 0.25:
-                emotions.append(('smoking', smoking_score))
-
-        # Anger
-            anger_score = self._detect_anger(features)
-            if anger_score > 0.35:
-                emotions.append(('anger', anger_score))
-
-
-        # Determine final emotion
-            if emotions:
-            # Pick highest confidence
-                emotion, confidence = max(emotions, key=lambda x: x[1])
-            # Fallback to neutral if highest confidence is still low
-                if confidence < 0.4:
-                    return 'neutral', confidence
-                return emotion, confidence
-            else:
-                return 'neutral', 0.6
-
+            labels, confidences = self.rule_engine.classify(self.rule_engine.features_to_matrix([features]))
+            return labels[0], float(confidences[0])
         except Exception:
             return 'neutral', 0.5
 
+    def classify_batch(self, feature_matrix):
+        """Classify a (T, 4) feature matrix in FEATURE_NAMES order; returns (labels, confidences)"""
+        return self.rule_engine.classify(feature_matrix)
+
+    def classify_faces(self, face_landmarks_list, frame_shape, timer=STAGE_TIMER):
+        """Features and emotion for every face of one frame, classified in a single batch"""
+        with timer.stage('face_features'):
+            feature_matrix = self._feature_matrix(self._feature_points(face_landmarks_list), frame_shape)
+            features = [dict(zip(FEATURE_NAMES, row)) for row in feature_matrix.tolist()]
+            boxes = [self._face_bbox(face) for face in face_landmarks_list]
+        with timer.stage('emotion_classification'):
+            labels, confidences = self.classify_batch(feature_matrix)
+
+        faces = []
+        for i, face_landmarks in enumerate(face_landmarks_list):
+            x0, y0, x1, y1 = boxes[i]
+            faces.append({
+                'emotion': str(labels[i]),
+                'confidence': float(confidences[i]),
+                'landmarks': face_landmarks,
+                'features': features[i],
+                'bbox': (x0, y0, x1, y1),
+                'center': ((x0 + x1) / 2, (y0 + y1) / 2)
+            })
+        return faces
+
+
+    @staticmethod
+    def _face_bbox(face_landmarks):
+        """Normalized (x0, y0, x1, y1) extent of the face outline"""
+        landmarks = face_landmarks.landmark
+        outline = [landmarks[i] for i in FACE_OVAL if i < len(landmarks)] or list(landmarks)
+        xs = [landmark.x for landmark in outline]
+        ys = [landmark.y for landmark in outline]
+        return min(xs), min(ys), max(xs), max(ys)
 
     # ------------------ FEATURE EXTRACTION ------------------
     def _extract_facial_features(self, landmarks, frame_shape):
+        """Compute the facial features for one face (MediaPipe landmarks or an (N, 3) array) as a dict"""
+        if isinstance(landmarks, np.ndarray):
+            points = landmarks[np.newaxis, self.feature_indices]
+        else:
+            points = self._feature_points([landmarks])
+        row = self._feature_matrix(points, frame_shape)[0]
+        return dict(zip(FEATURE_NAMES, row.tolist()))
+
+    def extract_features_batch(self, landmark_stack, frame_shape):
+        """Compute features for a (T, N, 3) landmark stack; returns a (T, 4) array in FEATURE_NAMES order"""
+        landmark_stack = np.asarray(landmark_stack, dtype=np.float64)
+        if landmark_stack.ndim == 2:
+            landmark_stack = landmark_stack[np.newaxis]
+        return self._feature_matrix(landmark_stack[:, self.feature_indices], frame_shape)
+
+    def _feature_points(self, face_landmarks_list):
+        """(F, 24, 2) array of the normalized x, y of only the landmarks the features use, one row per face"""
+        rows = []
+        for face in face_landmarks_list:
+            landmarks = face.landmark if hasattr(face, 'landmark') else face
+            rows.append([(l.x, l.y) for l in map(landmarks.__getitem__, self.feature_indices)])
+        return np.array(rows, dtype=np.float64).reshape(len(rows), len(self.feature_indices), 2)
+
+    @staticmethod
+    def _landmarks_to_array(landmarks):
+        """Convert MediaPipe landmarks into an (N, 3) float array of normalized x, y, z"""
+        if hasattr(landmarks, 'landmark'):
+            landmarks = landmarks.landmark
+        return np.array([(l.x, l.y, l.z) for l in landmarks], dtype=np.float64)
+
+    def _feature_matrix(self, points, frame_shape):
+        """(F, 4) features from the (F, 24, 2+) feature landmarks of F faces, in feature_indices order"""
+        h, w = frame_shape[:2]
+        # Same integer pixel truncation as the scalar implementation
+        px = np.trunc(points[:, :, :2] * (float(w), float(h)))
+
+        deltas = px[:, 0:8] - px[:, 8:16]
+        distances = np.sqrt((deltas * deltas).sum(axis=2))
+
+        # Eye and mouth aspect ratios, with the scalar fallbacks where a denominator is 0
+        numerators, denominators = distances @ self.ratio_terms
+        ratios = np.divide(numerators, denominators, out=np.full(numerators.shape, self.ratio_defaults),
+                           where=denominators != 0)
+
+        features = np.concatenate([ratios, px[:, :, 1] @ self.y_terms], axis=1) @ self.output_terms
+        features[:, 2] = np.abs(features[:, 2])
+        return np.clip(features, *self.feature_bounds, out=features)
+
+    def _extract_facial_features_scalar(self, landmarks, frame_shape):
+        """Per-landmark reference implementation; the tests check the vectorized features against it"""
         h, w = frame_shape[:2]
         features = {}
         points = {}
@@ -179,63 +410,6 @@ class EmotionDetector:
         import math
         return math.sqrt((p1[0]-p2[0])**2 + (p1[1]-p2[1])**2)
 
-    # ------------------ EMOTION DETECTORS ------------------
-    def _detect_happy(self, features):
-        score = 0.0
-        if features.get('mouth_curve',0) > 0.05: score+=0.4
-        ear = features.get('eye_aspect_ratio',0.3)
-        if 0.18 < ear < 0.38: score+=0.3
-        if features.get('mouth_aspect_ratio',0.5) > 0.38: score+=0.3
-        return min(score,1.0)
-
-    def _detect_sad(self, features):
-        score = 0.0
-        if features.get('mouth_curve',0) < -0.05: score+=0.4
-        if features.get('eyebrow_position',0.5) < 0.35: score+=0.3
-        if features.get('eye_aspect_ratio',0.3) < 0.28: score+=0.3
-        return min(score,1.0)
-
-    def _detect_surprised(self, features):
-        score = 0.0
-        if features.get('eye_aspect_ratio',0.3) > 0.38: score+=0.4
-        if features.get('mouth_aspect_ratio',0.5) > 0.75: score+=0.4
-        if features.get('eyebrow_position',0.5) > 0.65: score+=0.2
-        return min(score,1.0)
-
-    def _detect_sleepy(self, features):
-        return 0.6 if features.get('eye_aspect_ratio',0.3) < 0.25 else 0.0
-
-    def _detect_cry(self, features):
-        score=0.0
-        if features.get('mouth_curve',0) < -0.15: score+=0.4
-        if features.get('eye_aspect_ratio',0.3) < 0.26: score+=0.3
-        if features.get('eyebrow_position',0.5) < 0.3: score+=0.3
-        return min(score,1.0)
-
-    def _detect_flu(self, features):
-        score=0.0
-        if features.get('mouth_aspect_ratio',0.5) > 0.55: score+=0.4
-        if features.get('eye_aspect_ratio',0.3) < 0.28: score+=0.3
-        return min(score,1.0)
-
-    def _detect_smoking(self, features):
-        score=0.0
-        mar = features.get('mouth_aspect_ratio',0.5)
-        if 0.3 < mar < 0.6: score+=0.5
-        return score
-    
-    def _detect_anger(self, features):
-        score = 0.0
-        if features.get('eyebrow_position', 0.5) < 0.3:  # eyebrows niche
-            score += 0.4
-        if features.get('eye_aspect_ratio', 0.3) < 0.28:  # aankh thodi band
-            score += 0.3
-        if features.get('mouth_curve', 0) < 0.05:  # mouth flat/tight
-            score += 0.3
-        return min(score, 1.0)
-
-
-
     # ------------------ DRAWING ------------------
     def draw_landmarks(self, frame, landmarks):
         try:
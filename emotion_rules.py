@@ -0,0 +1,148 @@
+import numpy as np
+
+# ------------------ RULE TABLE ------------------
+# (emotion, feature, comparison, bound, weight)
+# An emotion's score is the sum of the weights of its satisfied rules,
+# capped at 1.0. Comparisons are strict; 'between' takes a (low, high) bound.
+# Emotions are listed in priority order: on equal scores the first one wins.
+EMOTION_RULES = (
+    ('happy', 'mouth_curve', '>', 0.05, 0.4),
+    ('happy', 'eye_aspect_ratio', 'between', (0.18, 0.38), 0.3),
+    ('happy', 'mouth_aspect_ratio', '>', 0.38, 0.3),
+
+    ('sad', 'mouth_curve', '<', -0.05, 0.4),
+    ('sad', 'eyebrow_position', '<', 0.35, 0.3),
+    ('sad', 'eye_aspect_ratio', '<', 0.28, 0.3),
+
+    ('surprised', 'eye_aspect_ratio', '>', 0.38, 0.4),
+    ('surprised', 'mouth_aspect_ratio', '>', 0.75, 0.4),
+    ('surprised', 'eyebrow_position', '>', 0.65, 0.2),
+
+    ('sleepy', 'eye_aspect_ratio', '<', 0.25, 0.6),
+
+    ('cry', 'mouth_curve', '<', -0.15, 0.4),
+    ('cry', 'eye_aspect_ratio', '<', 0.26, 0.3),
+    ('cry', 'eyebrow_position', '<', 0.3, 0.3),
+
+    ('flu', 'mouth_aspect_ratio', '>', 0.55, 0.4),
+    ('flu', 'eye_aspect_ratio', '<', 0.28, 0.3),
+
+    ('smoking', 'mouth_aspect_ratio', 'between', (0.3, 0.6), 0.5),
+
+    ('anger', 'eyebrow_position', '<', 0.3, 0.4),   # eyebrows niche
+    ('anger', 'eye_aspect_ratio', '<', 0.28, 0.3),  # aankh thodi band
+    ('anger', 'mouth_curve', '<', 0.05, 0.3),       # mouth flat/tight
+)
+
+# An emotion is a candidate only if its score is strictly above its cutoff
+EMOTION_CUTOFFS = {
+    'happy': 0.35,
+    'sad': 0.35,
+    'surprised': 0.2,
+    'sleepy': 0.25,
+    'cry': 0.35,
+    'flu': 0.25,
+    'smoking': 0.25,
+    'anger': 0.35,
+}
+
+# Value assumed for a feature missing from a features dict
+FEATURE_DEFAULTS = {
+    'eye_aspect_ratio': 0.3,
+    'mouth_aspect_ratio': 0.5,
+    'eyebrow_position': 0.5,
+    'mouth_curve': 0.0,
+}
+
+NEUTRAL_LABEL = 'neutral'
+NEUTRAL_CONFIDENCE = 0.6      # reported when no emotion passes its cutoff
+MIN_EMOTION_CONFIDENCE = 0.4  # best candidates below this fall back to neutral
+
+
+class CompiledEmotionRules:
+    """Emotion rule table compiled into arrays and evaluated over whole feature matrices"""
+
+    def __init__(self, rules, cutoffs, feature_names):
+        self.feature_names = tuple(feature_names)
+        self.labels = tuple(dict.fromkeys(rule[0] for rule in rules))
+        self.defaults = np.array([FEATURE_DEFAULTS.get(name, 0.0) for name in self.feature_names])
+
+        # Rules are laid out as (rank, emotion) slots so every emotion's weights
+        # are accumulated in table order, exactly like the scalar += chain.
+        per_emotion = {label: [] for label in self.labels}
+        for emotion, feature, comparison, bound, weight in rules:
+            per_emotion[emotion].append((self.feature_names.index(feature), comparison, bound, weight))
+        depth = max(len(entries) for entries in per_emotion.values())
+        shape = (depth, len(self.labels))
+
+        self.feature_index = np.zeros(shape, dtype=np.intp)
+        self.lower = np.full(shape, -np.inf)
+        self.upper = np.full(shape, np.inf)
+        self.has_lower = np.zeros(shape, dtype=bool)
+        self.has_upper = np.zeros(shape, dtype=bool)
+        self.weight = np.zeros(shape)
+
+        for column, label in enumerate(self.labels):
+            for rank, (feature_index, comparison, bound, weight) in enumerate(per_emotion[label]):
+                if comparison == '>':
+                    low, high = bound, None
+                elif comparison == '<':
+                    low, high = None, bound
+                elif comparison == 'between':
+                    low, high = bound
+                else:
+                    raise ValueError(f"Unknown comparison {comparison!r} in rule for {label}")
+
+                self.feature_index[rank, column] = feature_index
+                self.weight[rank, column] = weight
+                if low is not None:
+                    self.lower[rank, column] = low
+                    self.has_lower[rank, column] = True
+                if high is not None:
+                    self.upper[rank, column] = high
+                    self.has_upper[rank, column] = True
+
+        self.cutoff = np.array([cutoffs[label] for label in self.labels])
+        self.label_array = np.array(self.labels + (NEUTRAL_LABEL,), dtype=object)
+
+    def features_to_matrix(self, feature_dicts):
+        """Stack feature dicts into a (T, F) matrix, filling missing features with defaults"""
+        matrix = np.tile(self.defaults, (len(feature_dicts), 1))
+        for row, features in enumerate(feature_dicts):
+            for column, name in enumerate(self.feature_names):
+                if name in features:
+                    matrix[row, column] = features[name]
+        return matrix
+
+    def scores(self, feature_matrix):
+        """Per-emotion scores for a (T, F) feature matrix; returns a (T, E) array"""
+        feature_matrix = np.asarray(feature_matrix, dtype=np.float64)
+        scores = np.zeros((feature_matrix.shape[0], len(self.labels)))
+        for rank in range(self.weight.shape[0]):
+            values = feature_matrix[:, self.feature_index[rank]]
+            satisfied = ((~self.has_lower[rank] | (values > self.lower[rank])) &
+                         (~self.has_upper[rank] | (values < self.upper[rank])))
+            scores += np.where(satisfied, self.weight[rank], 0.0)
+        return np.minimum(scores, 1.0)
+
+    def classify(self, feature_matrix):
+        """Classify every row; returns (labels, confidences) arrays of length T"""
+        scores = self.scores(feature_matrix)
+        candidates = scores > self.cutoff
+        masked = np.where(candidates, scores, -np.inf)
+
+        # argmax picks the first maximum, matching max() over the table order
+        best = masked.argmax(axis=1)
+        confidences = masked[np.arange(len(best)), best]
+        label_index = best.copy()
+
+        no_candidate = ~candidates.any(axis=1)
+        confidences[no_candidate] = NEUTRAL_CONFIDENCE
+        label_index[no_candidate | (confidences < MIN_EMOTION_CONFIDENCE)] = len(self.labels)
+
+        return self.label_array[label_index], confidences
+
+
+def compile_rules(feature_names, rules=EMOTION_RULES, cutoffs=EMOTION_CUTOFFS):
+    """Compile a rule table for features laid out in feature_names order"""
+    return CompiledEmotionRules(rules, cutoffs, feature_names)
@@ -0,0 +1,52 @@
+"""Install the pose landmark models that do not ship with mediapipe.
+
+The high and low quality tiers use the heavy and lite pose models.
+Detectors never download models at runtime, so run this once on a
+machine with network access before deploying (or when building an image):
+
+    python fetch_models.py
+"""
+import argparse
+import os
+import sys
+
+from pose_behavior import POSE_MODEL_FILES, pose_model_path
+
+
+def fetch_models(model_complexities=(0, 2)):
+    """Download the missing pose models; returns the paths that were fetched"""
+    from mediapipe.python.solutions import download_utils
+
+    fetched = []
+    for model_complexity in model_complexities:
+        path = pose_model_path(model_complexity)
+        if os.path.exists(path):
+            print(f"{POSE_MODEL_FILES[model_complexity]} already installed")
+            continue
+        try:
+            download_utils.download_oss_model(f"mediapipe/modules/pose_landmark/{POSE_MODEL_FILES[model_complexity]}")
+        except Exception:
+            # A partial file would pass for an installed model
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+        fetched.append(path)
+    return fetched
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Download the lite and heavy pose landmark models")
+    parser.add_argument('--model-complexity', type=int, nargs='+', choices=sorted(POSE_MODEL_FILES),
+                        default=[0, 2], help="Models to install: 0 lite, 1 full (bundled), 2 heavy")
+    args = parser.parse_args(argv)
+
+    try:
+        fetch_models(args.model_complexity)
+    except OSError as e:
+        print(f"Could not download pose models: {str(e)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
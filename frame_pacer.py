@@ -0,0 +1,82 @@
+import time
+
+
+class FramePacer:
+    """Deadline-based frame pacing for capture/inference loops.
+
+    Each frame has a deadline one period after the previous one. When a
+    frame finishes early the pacer sleeps only for the remaining slack;
+    when it finishes late the deadline is missed, whole periods that have
+    already passed are counted as skipped frames, and the schedule moves
+    to the next deadline still in the future instead of trying to catch up.
+    """
+
+    def __init__(self, target_fps=30.0, latency_budget=None, clock=time.perf_counter, sleep=time.sleep):
+        self.clock = clock
+        self.sleep = sleep
+        self.set_target_fps(target_fps, latency_budget)
+        self.reset()
+
+    def set_target_fps(self, target_fps, latency_budget=None):
+        """Change the target rate; the latency budget defaults to one frame period"""
+        self.target_fps = float(target_fps)
+        self.period = 1.0 / self.target_fps
+        self.latency_budget = latency_budget if latency_budget is not None else self.period
+
+    def reset(self):
+        """Restart the schedule and clear all counters"""
+        self.started_at = None
+        self.frame_started_at = None
+        self.next_deadline = None
+        self.frames = 0
+        self.missed_deadlines = 0
+        self.frames_skipped = 0
+        self.over_budget = 0
+        self.total_latency = 0.0
+        self.last_latency = 0.0
+
+    def begin_frame(self):
+        """Mark the start of work on a frame"""
+        now = self.clock()
+        if self.started_at is None:
+            self.started_at = now
+            self.next_deadline = now + self.period
+        self.frame_started_at = now
+
+    def end_frame(self):
+        """Finish a frame and wait for its deadline; returns how many frames to skip"""
+        now = self.clock()
+        if self.frame_started_at is None:
+            self.begin_frame()
+        self.last_latency = now - self.frame_started_at
+        self.total_latency += self.last_latency
+        self.frames += 1
+        if self.last_latency > self.latency_budget:
+            self.over_budget += 1
+
+        skipped = 0
+        slack = self.next_deadline - now
+        if slack > 0:
+            self.sleep(slack)
+        else:
+            self.missed_deadlines += 1
+            skipped = int(-slack // self.period)
+            self.frames_skipped += skipped
+            self.next_deadline += skipped * self.period
+        self.next_deadline += self.period
+        self.frame_started_at = None
+        return skipped
+
+    def get_stats(self):
+        """Achieved vs target rate and deadline counters"""
+        elapsed = self.clock() - self.started_at if self.started_at is not None else 0.0
+        return {
+            'target_fps': self.target_fps,
+            'achieved_fps': self.frames / elapsed if elapsed > 0 else 0.0,
+            'frames': self.frames,
+            'missed_deadlines': self.missed_deadlines,
+            'frames_skipped': self.frames_skipped,
+            'over_budget': self.over_budget,
+            'last_latency_ms': self.last_latency * 1000,
+            'mean_latency_ms': self.total_latency / self.frames * 1000 if self.frames else 0.0
+        }
@@ -0,0 +1,131 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from stage_timing import STAGE_TIMER
+
+
+class FrameContext:
+    """Per-frame data shared by every detector in the pipeline"""
+
+    def __init__(self, frame, rgb, frame_id=0, timestamp=None, small_rgb=None, timer=STAGE_TIMER):
+        self.frame = frame
+        self.rgb = rgb
+        self.small_rgb = small_rgb
+        self.frame_id = frame_id
+        self.timestamp = timestamp if timestamp is not None else time.time()
+        self.timings = {}
+        self.reused = False
+        # StageTimer the detectors record this frame's stages into
+        self.timer = timer
+
+    @property
+    def shape(self):
+        """Shape of the original full-resolution frame"""
+        return self.frame.shape
+
+    @property
+    def inference_rgb(self):
+        """RGB image the models should run on (downscaled when available)"""
+        return self.small_rgb if self.small_rgb is not None else self.rgb
+
+
+def preprocess_frame(frame, frame_id=0, timestamp=None, downscale_width=None, timer=STAGE_TIMER):
+    """Convert a BGR frame to RGB once and optionally build a downscaled copy"""
+    with timer.stage('color_conversion'):
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        small_rgb = None
+
+        h, w = frame.shape[:2]
+        if downscale_width and downscale_width < w:
+            small_h = max(1, int(round(h * downscale_width / w)))
+            small_rgb = cv2.resize(rgb, (downscale_width, small_h), interpolation=cv2.INTER_AREA)
+            small_rgb.flags.writeable = False
+
+    # Read-only buffers let MediaPipe use the array without copying it
+    rgb.flags.writeable = False
+    return FrameContext(frame, rgb, frame_id, timestamp, small_rgb, timer)
+
+
+class FramePipeline:
+    """Runs pose and face detection on a frame that is preprocessed once.
+
+    With concurrent=True the pose graph is dispatched on a worker thread
+    while the face graph runs on the calling thread, and both are joined,
+    so frame latency approaches the slower model rather than the sum of
+    both (MediaPipe releases the GIL while a graph runs).
+    """
+
+    def __init__(self, behavior_detector, emotion_detector, downscale_width=None, concurrent=False,
+                 scheduler=None, timer=STAGE_TIMER):
+        self.behavior_detector = behavior_detector
+        self.emotion_detector = emotion_detector
+        self.downscale_width = downscale_width
+        self.concurrent = concurrent
+        self.scheduler = scheduler
+        self.timer = timer
+        self.last_results = None
+        self.executor = None
+        self.frame_count = 0
+        self.last_pose_keypoints = None
+
+    def preprocess(self, frame, frame_id=None, timestamp=None):
+        """Build the shared frame context for one BGR frame"""
+        if frame_id is None:
+            frame_id = self.frame_count
+        self.frame_count += 1
+        return preprocess_frame(frame, frame_id, timestamp, self.downscale_width, self.timer)
+
+    def process(self, frame, frame_id=None, timestamp=None):
+        """Detect behavior and emotion; returns (context, behavior_result, emotion_result)
+
+        Per-detector latencies in milliseconds are stored in context.timings.
+        When a scheduler decides the frame can be skipped, the previous
+        results are returned, no RGB conversion is done and
+        context.reused is True.
+        """
+        start = time.perf_counter()
+        if (self.scheduler is not None and not self.scheduler.should_infer(frame) and
+                self.last_results is not None):
+            if frame_id is None:
+                frame_id = self.frame_count
+            self.frame_count += 1
+            ctx = FrameContext(frame, None, frame_id, timestamp, timer=self.timer)
+            ctx.reused = True
+            ctx.timings['total_ms'] = (time.perf_counter() - start) * 1000
+            return (ctx,) + self.last_results
+
+        ctx = self.preprocess(frame, frame_id, timestamp)
+        ctx.timings['preprocess_ms'] = (time.perf_counter() - start) * 1000
+
+        if self.concurrent:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pose-detector")
+            behavior_future = self.executor.submit(self._timed, self.behavior_detector, ctx)
+            # The face crop can only use the previous frame's pose while both run at once
+            emotion_result, emotion_ms = self._timed(self.emotion_detector, ctx, self.last_pose_keypoints)
+            behavior_result, behavior_ms = behavior_future.result()
+        else:
+            behavior_result, behavior_ms = self._timed(self.behavior_detector, ctx)
+            pose_keypoints = behavior_result['keypoints'] if behavior_result else None
+            emotion_result, emotion_ms = self._timed(self.emotion_detector, ctx, pose_keypoints)
+        self.last_pose_keypoints = behavior_result['keypoints'] if behavior_result else None
+
+        ctx.timings['behavior_ms'] = behavior_ms
+        ctx.timings['emotion_ms'] = emotion_ms
+        ctx.timings['total_ms'] = (time.perf_counter() - start) * 1000
+        self.last_results = (behavior_result, emotion_result)
+        return ctx, behavior_result, emotion_result
+
+    def _timed(self, detector, ctx, *args):
+        """Run one detector on the context and measure its latency"""
+        start = time.perf_counter()
+        result = detector.detect_context(ctx, *args)
+        return result, (time.perf_counter() - start) * 1000
+
+    def close(self):
+        """Shut down the pose worker thread"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
@@ -0,0 +1,81 @@
+import time
+
+import cv2
+
+
+class InferenceScheduler:
+    """Motion-gated decision whether a frame needs full inference.
+
+    Each frame is shrunk to a small grayscale probe and compared with the
+    probe of the last inferred frame. Frames with enough motion are
+    inferred; in a static scene the previous results are reused and
+    inference only runs every idle_interval frames (0 disables the
+    cadence), and never less often than every max_staleness seconds.
+    """
+
+    def __init__(self, motion_threshold=4.0, idle_interval=5, max_staleness=1.0, probe_size=(64, 48)):
+        self.motion_threshold = motion_threshold
+        self.idle_interval = idle_interval
+        self.max_staleness = max_staleness
+        self.probe_size = probe_size
+
+        self.reference_probe = None
+        self.last_inference_time = None
+        self.frames_since_inference = 0
+        self.last_motion = 0.0
+        self.frames_inferred = 0
+        self.frames_reused = 0
+        self.reasons = {'first': 0, 'motion': 0, 'cadence': 0, 'stale': 0}
+
+    def _probe(self, frame):
+        """Downscaled grayscale copy used for frame differencing"""
+        small = cv2.resize(frame, self.probe_size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small
+
+    def should_infer(self, frame, now=None):
+        """Return True if the detectors should run on this BGR frame"""
+        now = time.time() if now is None else now
+        probe = self._probe(frame)
+
+        if self.reference_probe is None:
+            reason = 'first'
+        else:
+            self.last_motion = float(cv2.absdiff(probe, self.reference_probe).mean())
+            if self.last_motion >= self.motion_threshold:
+                reason = 'motion'
+            elif self.idle_interval and self.frames_since_inference + 1 >= self.idle_interval:
+                reason = 'cadence'
+            elif now - self.last_inference_time >= self.max_staleness:
+                reason = 'stale'
+            else:
+                reason = None
+
+        if reason is None:
+            self.frames_since_inference += 1
+            self.frames_reused += 1
+            return False
+
+        self.reference_probe = probe
+        self.last_inference_time = now
+        self.frames_since_inference = 0
+        self.frames_inferred += 1
+        self.reasons[reason] += 1
+        return True
+
+    def reset(self):
+        """Force inference on the next frame"""
+        self.reference_probe = None
+        self.frames_since_inference = 0
+
+    def get_stats(self):
+        """Counters of inferred vs reused frames"""
+        total = self.frames_inferred + self.frames_reused
+        return {
+            'frames_inferred': self.frames_inferred,
+            'frames_reused': self.frames_reused,
+            'reuse_rate': self.frames_reused / total if total else 0.0,
+            'last_motion': self.last_motion,
+            'reasons': dict(self.reasons)
+        }
@@ -0,0 +1,275 @@
+"""Local HTTP/WebSocket server that runs behavior and emotion detection on frames.
+
+Other processes on the same host post frames and get the detections back
+as JSON:
+
+    POST /detect           JPEG/PNG body (Content-Type image/jpeg or image/png),
+                           or raw BGR bytes (application/octet-stream) with
+                           ?width=W&height=H
+    WS   /stream           one binary message per frame, one JSON reply per frame;
+                           send {"format": "raw", "width": W, "height": H} as a text
+                           message first to stream raw BGR instead of JPEG
+    GET  /stats            queue, batching and request counters, face ROI
+                           hits and fallbacks per HTTP client and in total
+
+Frames go through a shared InferenceService: each client (X-Client-Id
+header, else its address; each WebSocket) is a session with its own pose
+history, concurrent requests are micro-batched, and when the queue is
+full requests are shed with 503 instead of piling up:
+
+    python inference_server.py --port 8765 --workers 1 --max-batch 8
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import numpy as np
+import tornado.web
+import tornado.websocket
+
+from inference_service import InferenceService
+
+RAW_CONTENT_TYPES = ('application/octet-stream', 'application/x-raw-bgr')
+
+
+def result_to_json(result):
+    """JSON-ready dict from a (context, behavior, emotion) service result"""
+    ctx, behavior_result, emotion_result = result
+    faces = emotion_result['faces'] if emotion_result else []
+    return {
+        'frame_id': ctx.frame_id,
+        'timestamp': ctx.timestamp,
+        'reused': ctx.reused,
+        'behavior': {
+            'behavior': behavior_result['behavior'],
+            'confidence': float(behavior_result['confidence'])
+        } if behavior_result else None,
+        'emotion': {
+            'emotion': emotion_result['emotion'],
+            'confidence': float(emotion_result['confidence'])
+        } if emotion_result else None,
+        'faces': [{
+            'emotion': face['emotion'],
+            'confidence': face['confidence'],
+            'bbox': list(face['bbox'])
+        } for face in faces],
+        'timings': {name: round(ms, 3) for name, ms in ctx.timings.items()}
+    }
+
+
+def raw_frame(body, width, height):
+    """BGR frame viewing a raw request body"""
+    if width <= 0 or height <= 0 or len(body) != width * height * 3:
+        raise ValueError(f"Raw frame must be {width}x{height}x3 bytes, got {len(body)}")
+    return np.frombuffer(body, dtype=np.uint8).reshape(height, width, 3)
+
+
+class InferenceServer:
+    """Request handling state shared by the HTTP and WebSocket handlers"""
+
+    def __init__(self, service, request_timeout=10.0, client_idle_seconds=60.0):
+        self.service = service
+        self.request_timeout = request_timeout
+        self.client_idle_seconds = client_idle_seconds
+        self.clients = {}  # client key -> (InferenceSession, last used)
+        self.started = time.time()
+
+        self.requests = 0
+        self.shed = 0
+        self.errors = 0
+        self.websockets = 0
+
+    def client_session(self, key):
+        """The session of an HTTP client; sessions idle for too long are closed"""
+        now = time.monotonic()
+        entry = self.clients.get(key)
+        if entry is None:
+            for stale in [k for k, (_, used) in self.clients.items() if now - used > self.client_idle_seconds]:
+                self.clients.pop(stale)[0].close()
+            session = self.service.open_session(max_pending=self.service.max_queue)
+        else:
+            session = entry[0]
+        self.clients[key] = (session, now)
+        return session
+
+    async def run(self, session, frame):
+        """Result JSON for one frame, or None if it was shed (queue full or superseded)"""
+        self.requests += 1
+        future = session.submit(frame)
+        if future is None:
+            self.shed += 1
+            return None
+        # wait() leaves the frame's own cancellation in the future, so a CancelledError
+        # raised here is this request being cancelled and is not swallowed
+        pending = asyncio.wrap_future(future)
+        done, _ = await asyncio.wait({pending}, timeout=self.request_timeout)
+        if not done:
+            pending.cancel()
+        if not done or pending.cancelled():
+            # Timed out, or replaced by a newer frame of the same client
+            self.shed += 1
+            return None
+        return result_to_json(pending.result())
+
+    def get_stats(self):
+        return {
+            'uptime_seconds': time.time() - self.started,
+            'requests': self.requests,
+            'shed': self.shed,
+            'errors': self.errors,
+            'http_clients': len(self.clients),
+            'websockets': self.websockets,
+            'client_roi': {key: session.get_stats()['roi'] for key, (session, _) in self.clients.items()},
+            'service': self.service.get_stats()
+        }
+
+
+class DetectHandler(tornado.web.RequestHandler):
+    def initialize(self, server):
+        self.server = server
+
+    async def post(self):
+        content_type = self.request.headers.get('Content-Type', '').split(';')[0].strip()
+        try:
+            if content_type in RAW_CONTENT_TYPES:
+                frame = raw_frame(self.request.body, int(self.get_argument('width', '0')),
+                                  int(self.get_argument('height', '0')))
+            else:
+                frame = self.request.body  # JPEG/PNG, decoded by the worker
+            if not len(frame):
+                raise ValueError("Empty request body")
+            key = self.request.headers.get('X-Client-Id') or self.request.remote_ip
+            response = await self.server.run(self.server.client_session(key), frame)
+        except ValueError as e:
+            self.server.errors += 1
+            self.set_status(400)
+            self.finish({'error': str(e)})
+            return
+
+        if response is None:
+            self.set_status(503)
+            self.set_header('Retry-After', '1')
+            self.finish({'error': "Server busy, frame dropped"})
+            return
+        self.finish(response)
+
+
+class StatsHandler(tornado.web.RequestHandler):
+    def initialize(self, server):
+        self.server = server
+
+    def get(self):
+        self.finish(self.server.get_stats())
+
+
+class StreamHandler(tornado.websocket.WebSocketHandler):
+    """Frame stream; every reply carries the sequence number of the frame it answers"""
+
+    def initialize(self, server):
+        self.server = server
+        self.session = None
+        self.replies = set()
+        self.format = 'jpeg'
+        self.width = self.height = 0
+        self.sequence = 0
+
+    def open(self):
+        self.server.websockets += 1
+        # A live stream only wants the newest frame: a frame still queued is superseded by the next
+        self.session = self.server.service.open_session(max_pending=1)
+
+    def on_message(self, message):
+        if isinstance(message, str):
+            try:
+                options = json.loads(message)
+                self.format = options.get('format', 'jpeg')
+                self.width = int(options.get('width', 0))
+                self.height = int(options.get('height', 0))
+            except (ValueError, TypeError) as e:
+                self.write_message({'error': f"Bad stream options: {str(e)}"})
+            return
+
+        sequence = self.sequence
+        self.sequence += 1
+        try:
+            frame = raw_frame(message, self.width, self.height) if self.format == 'raw' else message
+        except ValueError as e:
+            self.server.errors += 1
+            self.write_message({'seq': sequence, 'error': str(e)})
+            return
+        # Not awaited, so the next frame can be queued (and supersede this one) while it runs
+        reply = asyncio.ensure_future(self._reply(sequence, frame))
+        self.replies.add(reply)
+        reply.add_done_callback(self.replies.discard)
+
+    async def _reply(self, sequence, frame):
+        try:
+            response = await self.server.run(self.session, frame)
+        except ValueError as e:
+            self.server.errors += 1
+            response = {'error': str(e)}
+        if response is None:
+            response = {'status': 503, 'error': "Server busy, frame dropped"}
+        response['seq'] = sequence
+        try:
+            self.write_message(response)
+        except tornado.websocket.WebSocketClosedError:
+            pass
+
+    def on_close(self):
+        self.server.websockets -= 1
+        if self.session is not None:
+            self.session.close()
+
+
+def make_app(server):
+    return tornado.web.Application([
+        (r'/detect', DetectHandler, {'server': server}),
+        (r'/stream', StreamHandler, {'server': server}),
+        (r'/stats', StatsHandler, {'server': server}),
+    ])
+
+
+async def serve(service, host='127.0.0.1', port=8765, ready=None):
+    """Serve until cancelled; ready (an asyncio.Event) is set once the port is bound"""
+    server = make_app(InferenceServer(service)).listen(port, address=host, max_body_size=32 * 1024 * 1024)
+    print(f"Listening on http://{host}:{port} (POST /detect, WS /stream, GET /stats)")
+    if ready is not None:
+        ready.set()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        server.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve behavior and emotion detection over HTTP and WebSocket")
+    parser.add_argument('--host', default='127.0.0.1', help="Address to listen on (local only by default)")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=1, help="Detector pairs (inference threads)")
+    parser.add_argument('--max-queue', type=int, default=16, help="Queued frames before requests get 503")
+    parser.add_argument('--max-batch', type=int, default=8, help="Frames a worker takes per wakeup")
+    parser.add_argument('--batch-wait-ms', type=float, default=2.0, help="Wait for more frames to batch")
+    parser.add_argument('--max-faces', type=int, default=1)
+    parser.add_argument('--target-latency-ms', type=float, default=None,
+                        help="Switch model quality tiers to hold this per-frame inference time")
+    args = parser.parse_args(argv)
+
+    service = InferenceService(num_workers=args.workers, max_queue=args.max_queue, max_batch=args.max_batch,
+                               batch_wait_ms=args.batch_wait_ms, max_num_faces=args.max_faces,
+                               quality_target_ms=args.target_latency_ms)
+    print("Loading models...")
+    service.start()
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,526 @@
+import itertools
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import CancelledError, Future, TimeoutError as FutureTimeout
+
+import cv2
+import numpy as np
+
+from detector_factory import DETECTOR_FACTORY
+from emotion_engine import ROI_COUNTERS, roi_stats
+from frame_pipeline import FramePipeline
+from pose_behavior import PoseHistory
+from stage_timing import STAGE_TIMER
+from quality_controller import QualityController
+
+
+def decode_image(data):
+    """BGR frame from JPEG/PNG bytes"""
+    frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        raise ValueError("Could not decode image")
+    return frame
+
+
+class _Request:
+    __slots__ = ('frame', 'frame_id', 'timestamp', 'future', 'enqueued_at')
+
+    def __init__(self, frame, frame_id, timestamp, future, enqueued_at):
+        self.frame = frame
+        self.frame_id = frame_id
+        self.timestamp = timestamp
+        self.future = future
+        self.enqueued_at = enqueued_at
+
+
+class _SessionState:
+    """Service-side state of one session: its queue and its per-session detector state"""
+
+    def __init__(self, session_id, worker, max_pending):
+        self.id = session_id
+        self.worker = worker
+        self.pending = deque()
+        self.max_pending = max_pending
+        self.ready = False      # listed in the worker's round-robin deque
+        self.in_flight = False  # a frame of this session is being processed
+        self.closed = False
+
+        # Swapped into the shared detectors for each of this session's frames
+        self.pose_history = PoseHistory(worker.behavior_detector.max_history)
+        self.use_pose_roi = False
+        self.concurrent = False
+        self.scheduler = None
+        self.stage_timer = STAGE_TIMER
+        self.pipeline = FramePipeline(worker.behavior_detector, worker.emotion_detector)
+
+        self.submitted = 0
+        self.completed = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.roi_counts = dict.fromkeys(ROI_COUNTERS, 0)
+
+
+class _Worker:
+    """One leased detector pair, its thread and the round robin of its sessions"""
+
+    def __init__(self, index, lease, controller=None):
+        self.index = index
+        self.lease = lease
+        self.behavior_detector = lease.behavior_detector
+        self.emotion_detector = lease.emotion_detector
+        self.controller = controller
+        self.downscale_width = None
+        self.ready = deque()
+        self.queued = 0
+        self.sessions = 0
+        self.requests = 0
+        self.busy_seconds = 0.0
+        self.last_session = None  # id of the session whose frame the graphs tracked last
+        self.graph_resets = 0
+        self.thread = None
+
+
+class InferenceSession:
+    """A client's handle on an InferenceService (e.g. one per Streamlit session).
+
+    Frames submitted through a session are run on the worker the session
+    is pinned to, with the session's own pose history and pipeline state.
+    The worker resets its graphs' tracking whenever the next frame comes
+    from another session, so sessions sharing a detector pair do not see
+    each other's frames.
+    The session is closed with close() or when the handle is garbage
+    collected.
+    """
+
+    def __init__(self, service, state):
+        self.service = service
+        self._state = state
+        self._finalizer = weakref.finalize(self, service._close_state, state)
+
+    @property
+    def id(self):
+        return self._state.id
+
+    @property
+    def closed(self):
+        return self._state.closed
+
+    def configure(self, concurrent=None, scheduler=False, use_pose_roi=None, stage_timer=None):
+        """Per-session pipeline options, applied from the next frame; scheduler=None turns motion gating off"""
+        with self.service.condition:
+            if stage_timer is not None:
+                self._state.stage_timer = stage_timer
+            if concurrent is not None:
+                self._state.concurrent = concurrent
+            if scheduler is not False:
+                self._state.scheduler = scheduler
+            if use_pose_roi is not None:
+                self._state.use_pose_roi = use_pose_roi
+
+    def submit(self, frame, frame_id=None, timestamp=None):
+        """Queue a BGR frame (or JPEG/PNG bytes, decoded by the worker).
+
+        Returns a Future of (context, behavior, emotion), or None if the
+        service queue is full.
+        """
+        return self.service._submit(self._state, frame, frame_id, timestamp)
+
+    def infer(self, frame, frame_id=None, timestamp=None, timeout=5.0):
+        """Submit a frame and wait for its results; None if it was rejected, dropped or timed out"""
+        future = self.submit(frame, frame_id, timestamp)
+        if future is None:
+            return None
+        try:
+            return future.result(timeout)
+        except (CancelledError, FutureTimeout):
+            future.cancel()
+            return None
+
+    def draw_pose(self, frame, landmarks):
+        """Draw pose landmarks (drawing keeps no detector state, so any thread may call it)"""
+        return self._state.worker.behavior_detector.draw_landmarks(frame, landmarks)
+
+    def draw_face(self, frame, landmarks):
+        """Draw face mesh contours"""
+        return self._state.worker.emotion_detector.draw_landmarks(frame, landmarks)
+
+    def get_stats(self):
+        state = self._state
+        return {
+            'session_id': state.id,
+            'worker': state.worker.index,
+            'pending': len(state.pending),
+            'submitted': state.submitted,
+            'completed': state.completed,
+            'dropped': state.dropped,
+            'rejected': state.rejected,
+            'roi': roi_stats(state.roi_counts)
+        }
+
+    def close(self):
+        """Cancel queued frames and detach from the service"""
+        self._finalizer()
+
+
+class InferenceService:
+    """Fixed pool of detector pairs shared by any number of sessions.
+
+    Memory is bounded by num_workers detector pairs no matter how many
+    sessions are open. The MediaPipe graphs track across frames, so a
+    worker resets that tracking when it switches from one session's frames
+    to another's; a lone session keeps tracking, while interleaved sessions
+    pay a fresh detection per switch. The pose history is kept per
+    session. Each session is pinned to the least loaded worker when it
+    opens, which keeps its history on one worker. A worker serves the
+    sessions with queued frames round robin, one frame per turn, so a fast
+    client cannot starve the others.
+
+    Backpressure: a session holds at most max_pending queued frames, and a
+    new frame replaces its oldest queued one (whose future is cancelled),
+    because a live stream only cares about the newest frame. When the
+    whole service holds max_queue frames, new frames are rejected and
+    submit() returns None; the caller skips the frame or retries later.
+
+    Micro-batching: a worker takes up to max_batch queued frames per
+    wakeup, after waiting up to batch_wait_ms for concurrent requests to
+    arrive. MediaPipe's solutions still run one image at a time, so a
+    batch saves queue round trips and wakeups rather than model time.
+
+    Adaptive quality: with quality_target_ms set, each worker gets a
+    QualityController that steps its detectors between quality tiers to
+    keep per-frame inference time near the target. New tiers are built in
+    the background and swapped in between batches.
+    """
+
+    def __init__(self, num_workers=1, max_queue=8, max_pending=1, max_num_faces=1,
+                 max_batch=1, batch_wait_ms=0.0, factory=DETECTOR_FACTORY, stats_window=256,
+                 quality_target_ms=None):
+        self.num_workers = num_workers
+        self.max_queue = max_queue
+        self.max_pending = max_pending
+        self.max_batch = max_batch
+        self.batch_wait = batch_wait_ms / 1000
+        self.max_num_faces = max_num_faces
+        self.factory = factory
+        self.quality_target_ms = quality_target_ms
+
+        self.condition = threading.Condition()
+        self.start_lock = threading.Lock()
+        self.workers = []
+        self.running = False
+        self.session_ids = itertools.count(1)
+        self.sessions_open = 0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+
+        self.submitted = 0
+        self.completed = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.failed = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self.roi_counts = dict.fromkeys(ROI_COUNTERS, 0)
+        self.wait_ms = deque(maxlen=stats_window)
+        self.service_ms = deque(maxlen=stats_window)
+
+    def start(self):
+        """Lease the detector pairs and start one thread per worker"""
+        with self.start_lock:
+            if self.running:
+                return self
+            workers = [_Worker(index, self.factory.acquire(max_num_faces=self.max_num_faces))
+                       for index in range(self.num_workers)]
+            if self.quality_target_ms is not None:
+                for worker in workers:
+                    self._add_controller(worker, self.quality_target_ms)
+            with self.condition:
+                self.workers = workers
+                self.running = True
+            for worker in workers:
+                worker.thread = threading.Thread(target=self._worker_loop, args=(worker,), daemon=True,
+                                                 name=f"inference-worker-{worker.index}")
+                worker.thread.start()
+        return self
+
+    def stop(self):
+        """Cancel queued frames, stop the workers and give the detectors back to the factory"""
+        with self.start_lock:
+            with self.condition:
+                self.running = False
+                for worker in self.workers:
+                    while worker.ready:
+                        state = worker.ready.popleft()
+                        state.ready = False
+                        self._cancel_pending(state)
+                self.condition.notify_all()
+            for worker in self.workers:
+                worker.thread.join(timeout=5.0)
+                if worker.controller is not None:
+                    worker.controller.close()
+                worker.lease.release()
+            self.workers = []
+
+    # ------------------ QUALITY ------------------
+    def _add_controller(self, worker, target_ms):
+        # The worker's current pair is the controller's start tier
+        worker.controller = QualityController(target_ms=target_ms, max_num_faces=self.max_num_faces,
+                                              factory=self.factory, lease=worker.lease)
+
+    def _apply_quality(self, worker):
+        """Swap in a tier the worker's controller built in the background (worker thread, between batches)"""
+        controller = worker.controller
+        if controller is None:
+            return
+        lease = controller.swap()
+        if lease is None:
+            return
+        worker.lease = lease
+        worker.behavior_detector = lease.behavior_detector
+        worker.emotion_detector = lease.emotion_detector
+        worker.downscale_width = controller.tier['downscale_width']
+        # The new pair comes from the pool with its tracking reset
+        worker.last_session = None
+
+    def open_session(self, max_pending=None):
+        """New session pinned to the worker with the fewest sessions"""
+        self.start()
+        with self.condition:
+            worker = min(self.workers, key=lambda w: w.sessions)
+            worker.sessions += 1
+            self.sessions_open += 1
+            state = _SessionState(next(self.session_ids), worker, max_pending or self.max_pending)
+        return InferenceSession(self, state)
+
+    def _close_state(self, state):
+        with self.condition:
+            if state.closed:
+                return
+            state.closed = True
+            self._cancel_pending(state)
+            if state.ready:
+                state.worker.ready.remove(state)
+                state.ready = False
+            state.worker.sessions -= 1
+            self.sessions_open -= 1
+            if state.in_flight:
+                return  # the worker closes the pipeline after the frame
+        state.pipeline.close()
+
+    def _cancel_pending(self, state):
+        """Drop a session's queued frames (condition held)"""
+        while state.pending:
+            state.pending.popleft().future.cancel()
+            self.queue_depth -= 1
+            state.worker.queued -= 1
+
+    # ------------------ QUEUEING ------------------
+    def _submit(self, state, frame, frame_id, timestamp):
+        future = Future()
+        with self.condition:
+            if state.closed or not self.running:
+                raise RuntimeError("Inference session is closed")
+            state.submitted += 1
+            self.submitted += 1
+
+            if len(state.pending) >= state.max_pending:
+                # The session's oldest queued frame is stale now; replace it
+                state.pending.popleft().future.cancel()
+                state.dropped += 1
+                self.dropped += 1
+                self.queue_depth -= 1
+                state.worker.queued -= 1
+            elif self.queue_depth >= self.max_queue:
+                state.rejected += 1
+                self.rejected += 1
+                return None
+
+            state.pending.append(_Request(frame, frame_id, timestamp, future, time.perf_counter()))
+            self.queue_depth += 1
+            state.worker.queued += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+            if not state.ready:
+                state.ready = True
+                state.worker.ready.append(state)
+            self.condition.notify_all()
+        return future
+
+    def _next_batch(self, worker):
+        """Wait for queued frames and take up to max_batch of them, one per session per round"""
+        with self.condition:
+            while self.running and not worker.ready:
+                self.condition.wait()
+            if self.batch_wait > 0:
+                # Micro-batching window: give concurrent requests a moment to arrive
+                deadline = time.monotonic() + self.batch_wait
+                while self.running and worker.queued < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+            if not self.running:
+                return None
+
+            batch = []
+            while worker.ready and len(batch) < self.max_batch:
+                state = worker.ready.popleft()
+                batch.append((state, state.pending.popleft()))
+                self.queue_depth -= 1
+                worker.queued -= 1
+                if state.pending:
+                    worker.ready.append(state)
+                else:
+                    state.ready = False
+                if not state.in_flight:
+                    state.in_flight = True
+                    pipeline = state.pipeline
+                    if pipeline.concurrent != state.concurrent:
+                        pipeline.close()
+                        pipeline.concurrent = state.concurrent
+                    pipeline.scheduler = state.scheduler
+                    pipeline.timer = state.stage_timer
+                    pipeline.behavior_detector = worker.behavior_detector
+                    pipeline.emotion_detector = worker.emotion_detector
+                    pipeline.downscale_width = worker.downscale_width
+            self.batches += 1
+            self.batched_requests += len(batch)
+            return batch
+
+    def _finish_batch(self, batch):
+        """Clear the in-flight marks; closes the pipelines of sessions closed meanwhile"""
+        closed = []
+        with self.condition:
+            for state in {id(state): state for state, _ in batch}.values():
+                state.in_flight = False
+                if state.closed:
+                    closed.append(state)
+        for state in closed:
+            state.pipeline.close()
+
+    def _worker_loop(self, worker):
+        while True:
+            self._apply_quality(worker)
+            batch = self._next_batch(worker)
+            if batch is None:
+                return
+            for state, request in batch:
+                self._run_request(worker, state, request)
+            self._finish_batch(batch)
+
+    def _run_request(self, worker, state, request):
+        with self.condition:
+            if state.closed:
+                request.future.cancel()
+            elif len(state.pending) >= state.max_pending:
+                # A newer frame arrived while this one waited in the batch and would
+                # have replaced it in the queue, so run the newer one instead
+                request.future.cancel()
+                state.dropped += 1
+                self.dropped += 1
+                request = state.pending.popleft()
+                self.queue_depth -= 1
+                worker.queued -= 1
+                if not state.pending and state.ready:
+                    worker.ready.remove(state)
+                    state.ready = False
+        if not request.future.set_running_or_notify_cancel():
+            return
+
+        start = time.perf_counter()
+        if worker.last_session != state.id:
+            if worker.last_session is not None:
+                # The graphs still track the previous session's people
+                worker.behavior_detector.reset_graphs()
+                worker.emotion_detector.reset_graphs()
+                worker.graph_resets += 1
+            worker.last_session = state.id
+        worker.behavior_detector.pose_history = state.pose_history
+        worker.emotion_detector.use_pose_roi = state.use_pose_roi
+        roi_before = worker.emotion_detector.get_roi_stats()
+        try:
+            frame = request.frame
+            if isinstance(frame, (bytes, bytearray, memoryview)):
+                frame = decode_image(frame)
+            result = state.pipeline.process(frame, request.frame_id, request.timestamp)
+        except Exception as e:
+            print(f"Inference error: {str(e)}")
+            request.future.set_exception(e)
+            with self.condition:
+                self.failed += 1
+            return
+        end = time.perf_counter()
+        if worker.controller is not None and not result[0].reused:
+            worker.controller.observe(result[0].timings['total_ms'])
+        roi_after = worker.emotion_detector.get_roi_stats()
+
+        with self.condition:
+            for name in ROI_COUNTERS:
+                state.roi_counts[name] += roi_after[name] - roi_before[name]
+                self.roi_counts[name] += roi_after[name] - roi_before[name]
+            state.completed += 1
+            self.completed += 1
+            worker.requests += 1
+            worker.busy_seconds += end - start
+            self.wait_ms.append((start - request.enqueued_at) * 1000)
+            self.service_ms.append((end - start) * 1000)
+        request.future.set_result(result)
+
+    # ------------------ STATS ------------------
+    def get_stats(self):
+        """Queue depth, wait and service times (ms, recent frames), request counters and face ROI counters"""
+        with self.condition:
+            wait_ms = np.array(self.wait_ms) if self.wait_ms else np.zeros(1)
+            service_ms = np.array(self.service_ms) if self.service_ms else np.zeros(1)
+            return {
+                'workers': len(self.workers),
+                'sessions': self.sessions_open,
+                'queue_depth': self.queue_depth,
+                'max_queue_depth': self.max_queue_depth,
+                'worker_queue_depth': [worker.queued for worker in self.workers],
+                'worker_sessions': [worker.sessions for worker in self.workers],
+                'mean_wait_ms': float(wait_ms.mean()),
+                'p95_wait_ms': float(np.percentile(wait_ms, 95)),
+                'mean_service_ms': float(service_ms.mean()),
+                'mean_batch_size': self.batched_requests / self.batches if self.batches else 0.0,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'dropped': self.dropped,
+                'rejected': self.rejected,
+                'failed': self.failed,
+                'graph_resets': sum(worker.graph_resets for worker in self.workers),
+                'roi': roi_stats(self.roi_counts),
+                'quality': [worker.controller.get_stats() for worker in self.workers
+                            if worker.controller is not None]
+            }
+
+
+# One service per detector configuration, shared by every session in the process
+_SERVICES = {}
+_SERVICES_LOCK = threading.Lock()
+
+
+def get_inference_service(max_num_faces=1, num_workers=1, quality_target_ms=None, factory=DETECTOR_FACTORY):
+    """The process-wide service for this configuration, started on first use.
+
+    Services of other configurations that have no open sessions left are
+    stopped, so trying out settings does not leave detector pairs and
+    worker threads behind. num_workers and quality_target_ms are process
+    settings: they apply when the service is created and are ignored
+    afterwards.
+    """
+    with _SERVICES_LOCK:
+        for key, other in list(_SERVICES.items()):
+            with other.condition:
+                idle = other.sessions_open == 0
+            if key != max_num_faces and idle:
+                del _SERVICES[key]
+                other.stop()
+        service = _SERVICES.get(max_num_faces)
+        if service is None:
+            service = _SERVICES[max_num_faces] = InferenceService(num_workers=num_workers,
+                                                                  max_num_faces=max_num_faces,
+                                                                  quality_target_ms=quality_target_ms,
+                                                                  factory=factory)
+    return service.start()
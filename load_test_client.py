@@ -0,0 +1,178 @@
+"""Load test for inference_server.py: many concurrent clients, throughput and latency.
+
+HTTP mode runs --concurrency clients that each post frames back to back;
+WebSocket mode opens --concurrency streams that send frames at --fps:
+
+    python load_test_client.py --image face.jpg --concurrency 8 --duration 20
+    python load_test_client.py --mode ws --concurrency 4 --fps 30 --raw
+
+Prints requests/sec, shed (503) and error counts, latency percentiles of
+the answered requests and the server's batching stats.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import cv2
+import numpy as np
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError
+from tornado.websocket import websocket_connect
+
+
+class LoadStats:
+    """Latencies of answered requests plus shed and error counts"""
+
+    def __init__(self):
+        self.latencies_ms = []
+        self.sent = 0
+        self.shed = 0
+        self.errors = 0
+
+    def summary(self, elapsed):
+        latencies = np.array(self.latencies_ms) if self.latencies_ms else np.zeros(1)
+        return {
+            'sent': self.sent,
+            'ok': len(self.latencies_ms),
+            'shed': self.shed,
+            'errors': self.errors,
+            'requests_per_second': len(self.latencies_ms) / elapsed if elapsed > 0 else 0.0,
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p90_ms': float(np.percentile(latencies, 90)),
+            'p99_ms': float(np.percentile(latencies, 99)),
+            'max_ms': float(latencies.max())
+        }
+
+
+def load_frame(image_path, width):
+    """BGR test frame: the given image resized to width, or a synthetic one"""
+    if image_path:
+        frame = cv2.imread(image_path)
+        if frame is None:
+            raise SystemExit(f"Could not read {image_path}")
+    else:
+        frame = np.random.default_rng(0).integers(0, 255, (480, 640, 3), dtype=np.uint8)
+    height = round(frame.shape[0] * width / frame.shape[1])
+    return cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+
+
+def encode_frame(frame, raw):
+    """Request body and the query/options describing it"""
+    if raw:
+        return frame.tobytes(), {'format': 'raw', 'width': frame.shape[1], 'height': frame.shape[0]}
+    ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+    return buffer.tobytes(), {'format': 'jpeg'}
+
+
+async def http_client(url, body, options, client_id, deadline, stats, backoff):
+    client = AsyncHTTPClient()
+    if options['format'] == 'raw':
+        url = f"{url}/detect?width={options['width']}&height={options['height']}"
+        content_type = 'application/octet-stream'
+    else:
+        url = f"{url}/detect"
+        content_type = 'image/jpeg'
+    headers = {'Content-Type': content_type, 'X-Client-Id': client_id}
+
+    while time.perf_counter() < deadline:
+        stats.sent += 1
+        start = time.perf_counter()
+        try:
+            await client.fetch(url, method='POST', body=body, headers=headers, request_timeout=30)
+            stats.latencies_ms.append((time.perf_counter() - start) * 1000)
+        except HTTPClientError as e:
+            if e.code == 503:
+                stats.shed += 1
+                await asyncio.sleep(backoff)
+            else:
+                stats.errors += 1
+        except OSError:
+            stats.errors += 1
+            await asyncio.sleep(0.1)
+
+
+async def ws_client(url, body, options, fps, deadline, stats):
+    connection = await websocket_connect(url.replace('http', 'ws', 1) + '/stream', max_message_size=64 * 1024 * 1024)
+    connection.write_message(json.dumps(options))
+    sent_at = {}
+
+    async def receive():
+        while True:
+            message = await connection.read_message()
+            if message is None:
+                return
+            reply = json.loads(message)
+            start = sent_at.pop(reply.get('seq'), None)
+            if reply.get('status') == 503:
+                stats.shed += 1
+            elif 'error' in reply or start is None:
+                stats.errors += 1
+            else:
+                stats.latencies_ms.append((time.perf_counter() - start) * 1000)
+            if not sent_at and time.perf_counter() >= deadline:
+                return
+
+    receiver = asyncio.ensure_future(receive())
+    interval = 1.0 / fps if fps else 0.0
+    sequence = 0
+    while time.perf_counter() < deadline:
+        sent_at[sequence] = time.perf_counter()
+        await connection.write_message(body, binary=True)
+        stats.sent += 1
+        sequence += 1
+        await asyncio.sleep(interval)
+    try:
+        await asyncio.wait_for(receiver, 10.0)
+    except asyncio.TimeoutError:
+        stats.errors += len(sent_at)
+    connection.close()
+
+
+async def run_load_test(url, mode, concurrency, duration, body, options, fps, backoff=0.1):
+    AsyncHTTPClient.configure(None, max_clients=concurrency + 1)
+    stats = LoadStats()
+    start = time.perf_counter()
+    deadline = start + duration
+    if mode == 'http':
+        clients = [http_client(url, body, options, f"load-{i}", deadline, stats, backoff) for i in range(concurrency)]
+    else:
+        clients = [ws_client(url, body, options, fps, deadline, stats) for _ in range(concurrency)]
+    await asyncio.gather(*clients)
+    summary = stats.summary(time.perf_counter() - start)
+
+    response = await AsyncHTTPClient().fetch(f"{url}/stats")
+    summary['server'] = json.loads(response.body)['service']
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the local inference server")
+    parser.add_argument('--url', default='http://127.0.0.1:8765')
+    parser.add_argument('--mode', choices=['http', 'ws'], default='http')
+    parser.add_argument('--concurrency', type=int, default=4, help="Concurrent HTTP clients or WebSocket streams")
+    parser.add_argument('--duration', type=float, default=10.0, help="Seconds to send for")
+    parser.add_argument('--image', default=None, help="Test image (default: synthetic noise)")
+    parser.add_argument('--width', type=int, default=640, help="Frame width sent")
+    parser.add_argument('--raw', action='store_true', help="Send raw BGR bytes instead of JPEG")
+    parser.add_argument('--fps', type=float, default=30.0, help="Frames per second per WebSocket stream (0 = max)")
+    parser.add_argument('--backoff', type=float, default=0.1, help="Seconds an HTTP client waits after a 503")
+    args = parser.parse_args(argv)
+
+    body, options = encode_frame(load_frame(args.image, args.width), args.raw)
+    summary = asyncio.run(run_load_test(args.url, args.mode, args.concurrency, args.duration, body, options,
+                                        args.fps, args.backoff))
+    server = summary['server']
+    print(f"{args.mode.upper()} x{args.concurrency}, {len(body) / 1024:.0f} KB {options['format']} frames, "
+          f"{args.duration:.0f}s")
+    print(f"  {summary['requests_per_second']:.1f} req/s  ok {summary['ok']}  shed {summary['shed']}  "
+          f"errors {summary['errors']}")
+    print(f"  latency ms: p50 {summary['p50_ms']:.1f}  p90 {summary['p90_ms']:.1f}  "
+          f"p99 {summary['p99_ms']:.1f}  max {summary['max_ms']:.1f}")
+    print(f"  server: mean batch {server['mean_batch_size']:.2f}, mean wait {server['mean_wait_ms']:.1f} ms, "
+          f"service {server['mean_service_ms']:.1f} ms, max queue {server['max_queue_depth']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
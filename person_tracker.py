@@ -0,0 +1,108 @@
+from collections import Counter, deque
+
+import numpy as np
+
+
+class Track:
+    """One tracked person: last position and a short history of their detections"""
+    __slots__ = ('id', 'center', 'bbox', 'hits', 'missed', 'last_seen', 'history')
+
+    def __init__(self, track_id, detection, timestamp, history_size):
+        self.id = track_id
+        self.center = detection['center']
+        self.bbox = detection.get('bbox')
+        self.hits = 0
+        self.missed = 0
+        self.last_seen = timestamp
+        self.history = deque(maxlen=history_size)
+
+    def observe(self, detection, timestamp):
+        self.center = detection['center']
+        self.bbox = detection.get('bbox')
+        self.hits += 1
+        self.missed = 0
+        self.last_seen = timestamp
+        if 'emotion' in detection:
+            self.history.append((timestamp, detection['emotion'], detection['confidence']))
+
+    def dominant_emotion(self):
+        """Most frequent emotion in the recent history, or None"""
+        if not self.history:
+            return None
+        return Counter(emotion for _, emotion, _ in self.history).most_common(1)[0][0]
+
+
+class PersonTracker:
+    """Stable person ids across frames by nearest-centroid matching.
+
+    Detections are dicts with a normalized 'center' (x, y), e.g. the faces
+    returned by EmotionDetector. Each frame, detection/track pairs are
+    matched greedily from the closest pair up to max_distance; unmatched
+    detections start new tracks and tracks unseen for more than
+    max_missed frames are dropped. update() writes 'person_id' into every
+    detection and each track keeps its last history_size emotions.
+    """
+
+    def __init__(self, max_distance=0.1, max_missed=15, history_size=30):
+        self.max_distance = max_distance
+        self.max_missed = max_missed
+        self.history_size = history_size
+        self.tracks = []
+        self.next_id = 1
+
+    def update(self, detections, timestamp=None):
+        """Assign person ids to this frame's detections; returns the same list"""
+        matched_tracks = set()
+        matched_detections = set()
+
+        if detections and self.tracks:
+            centers = np.array([detection['center'] for detection in detections], dtype=np.float64)
+            track_centers = np.array([track.center for track in self.tracks], dtype=np.float64)
+            distances = np.linalg.norm(centers[:, np.newaxis] - track_centers[np.newaxis], axis=2)
+
+            for flat in np.argsort(distances, axis=None):
+                d, t = divmod(int(flat), len(self.tracks))
+                if distances[d, t] > self.max_distance:
+                    break
+                if d in matched_detections or t in matched_tracks:
+                    continue
+                matched_detections.add(d)
+                matched_tracks.add(t)
+                self.tracks[t].observe(detections[d], timestamp)
+                detections[d]['person_id'] = self.tracks[t].id
+
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.missed += 1
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+
+        for d, detection in enumerate(detections):
+            if d in matched_detections:
+                continue
+            track = Track(self.next_id, detection, timestamp, self.history_size)
+            track.observe(detection, timestamp)
+            self.next_id += 1
+            self.tracks.append(track)
+            detection['person_id'] = track.id
+
+        return detections
+
+    def get_track(self, person_id):
+        for track in self.tracks:
+            if track.id == person_id:
+                return track
+        return None
+
+    def get_tracks(self):
+        """Summary of the live tracks"""
+        return [{
+            'person_id': track.id,
+            'center': track.center,
+            'hits': track.hits,
+            'missed': track.missed,
+            'dominant_emotion': track.dominant_emotion()
+        } for track in self.tracks]
+
+    def reset(self):
+        self.tracks = []
+        self.next_id = 1
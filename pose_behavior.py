@@ -1,47 +1,212 @@
-import cv2
+import os
+
 import numpy as np
-import mediapipe as mp
-import math
+
+from frame_pipeline import preprocess_frame
+
+# Pose landmark model of each model_complexity. Only the full model ships with
+# mediapipe; fetch_models.py installs the others before deployment
+POSE_MODEL_FILES = {0: 'pose_landmark_lite.tflite', 1: 'pose_landmark_full.tflite', 2: 'pose_landmark_heavy.tflite'}
+
+# Pose landmarks used for behavior analysis, in history array order
+POSE_KEYPOINTS = {
+    'nose': 0,
+    'left_shoulder': 11,
+    'right_shoulder': 12,
+    'left_elbow': 13,
+    'right_elbow': 14,
+    'left_wrist': 15,
+    'right_wrist': 16,
+    'left_hip': 23,
+    'right_hip': 24,
+    'left_knee': 25,
+    'right_knee': 26,
+    'left_ankle': 27,
+    'right_ankle': 28
+}
+JOINT_INDEX = {name: i for i, name in enumerate(POSE_KEYPOINTS)}
+X, Y, Z, VISIBILITY = range(4)
+
+_ANKLES = np.array([JOINT_INDEX['left_ankle'], JOINT_INDEX['right_ankle']])
+_WRISTS = np.array([JOINT_INDEX['left_wrist'], JOINT_INDEX['right_wrist']])
+_KNEES = np.array([JOINT_INDEX['left_knee'], JOINT_INDEX['right_knee']])
+
+
+class PoseHistory:
+    """Fixed-size ring buffer of recent poses as a (max_history, joints, 4) array.
+
+    Missing joints are stored as NaN. Frame-to-frame ankle and wrist
+    movement is computed once when a pose arrives and kept in step rings
+    aligned with the pose slots, so temporal queries are a constant number
+    of numpy reductions no matter how long the history is.
+    """
+
+    def __init__(self, max_history=10, num_joints=len(POSE_KEYPOINTS)):
+        self.max_history = max_history
+        self.poses = np.full((max_history, num_joints, 4), np.nan)
+        # Movement from the previous pose into the pose held in the same slot
+        self.ankle_steps = np.full(max_history, np.nan)
+        self.wrist_steps = np.full((max_history, 2), np.nan)
+        self.count = 0
+        self.head = 0  # slot the next pose is written to
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        """Forget every stored pose"""
+        self.poses.fill(np.nan)
+        self.ankle_steps.fill(np.nan)
+        self.wrist_steps.fill(np.nan)
+        self.count = 0
+        self.head = 0
+
+    def append(self, pose):
+        """Store a (joints, 4) pose array and its movement since the previous pose"""
+        slot = self.head
+        if self.count:
+            previous = self.poses[slot - 1]
+            # Summed horizontal ankle travel; NaN if either ankle is missing
+            self.ankle_steps[slot] = np.abs(pose[_ANKLES, X] - previous[_ANKLES, X]).sum()
+            wrist_delta = pose[_WRISTS, :2] - previous[_WRISTS, :2]
+            self.wrist_steps[slot] = np.sqrt((wrist_delta ** 2).sum(axis=1))
+        else:
+            self.ankle_steps[slot] = np.nan
+            self.wrist_steps[slot] = np.nan
+
+        self.poses[slot] = pose
+        self.head = (slot + 1) % self.max_history
+        self.count = min(self.count + 1, self.max_history)
+
+        # The oldest pose's step pairs it with a pose that has left the window
+        oldest = (self.head - self.count) % self.max_history
+        self.ankle_steps[oldest] = np.nan
+        self.wrist_steps[oldest] = np.nan
+
+    def latest(self):
+        """Most recent pose array, or None if the history is empty"""
+        return self.poses[self.head - 1] if self.count else None
+
+    def mean_ankle_movement(self):
+        """Average ankle travel per frame, or None without usable steps"""
+        return _nan_mean(self.ankle_steps)
+
+    def mean_wrist_movement(self):
+        """Average wrist travel per hand per frame, or None without usable steps"""
+        return _nan_mean(self.wrist_steps)
+
+
+def _nan_mean(values):
+    valid = ~np.isnan(values)
+    count = np.count_nonzero(valid)
+    if not count:
+        return None
+    return float(values[valid].sum() / count)
+
+
+def _solutions():
+    """mediapipe.solutions, imported on first use (importing mediapipe takes about a second)"""
+    import mediapipe as mp
+    return mp.solutions
+
+
+def pose_model_path(model_complexity):
+    """Where mediapipe looks for the pose landmark model of this complexity"""
+    import mediapipe as mp
+    return os.path.join(os.path.dirname(mp.__file__), 'modules', 'pose_landmark', POSE_MODEL_FILES[model_complexity])
+
 
 class BehaviorDetector:
-    def __init__(self):
-        self.mp_pose = mp.solutions.pose
-        self.pose = self.mp_pose.Pose(
-            static_image_mode=False,
-            model_complexity=1,
-            enable_segmentation=False,
-            min_detection_confidence=0.5,
-            min_tracking_confidence=0.5
-        )
-        self.mp_drawing = mp.solutions.drawing_utils
-        self.mp_drawing_styles = mp.solutions.drawing_styles
+    def __init__(self, model_complexity=1, static_image_mode=False):
+        # The Pose graph is built on first use (see the pose property).
+        # model_complexity: 0 lite, 1 full, 2 heavy landmark model.
+        # static_image_mode: detect on every image instead of tracking across frames
+        self.model_complexity = model_complexity
+        self.static_image_mode = static_image_mode
+        self._pose = None
         
         # Store pose history for temporal analysis
-        self.pose_history = []
         self.max_history = 10
-    
+        self.pose_history = PoseHistory(self.max_history)
+
+    @property
+    def mp_pose(self):
+        return _solutions().pose
+
+    @property
+    def mp_drawing(self):
+        return _solutions().drawing_utils
+
+    @property
+    def mp_drawing_styles(self):
+        return _solutions().drawing_styles
+
+    @property
+    def pose(self):
+        """MediaPipe Pose graph, built on first access"""
+        if self._pose is None:
+            # MediaPipe would download a missing model here; detection must not depend on the network
+            if not os.path.exists(pose_model_path(self.model_complexity)):
+                raise FileNotFoundError(f"{POSE_MODEL_FILES[self.model_complexity]} is not installed "
+                                        f"(run python fetch_models.py)")
+            self._pose = self.mp_pose.Pose(
+                static_image_mode=self.static_image_mode,
+                model_complexity=self.model_complexity,
+                enable_segmentation=False,
+                min_detection_confidence=0.5,
+                min_tracking_confidence=0.5
+            )
+        return self._pose
+
+    @property
+    def is_loaded(self):
+        """True once the Pose graph has been built"""
+        return self._pose is not None
+
+    def reset_history(self):
+        """Forget pose history, e.g. when switching to a new video"""
+        self.pose_history.clear()
+
+    def reset_graphs(self):
+        """Forget the landmarks the Pose graph tracks (the pose history is kept)"""
+        if self._pose is not None:
+            self._pose.reset()
+
+    def reset_tracking(self):
+        """Forget pose history and the landmarks the Pose graph tracks, e.g. before serving another stream"""
+        self.reset_history()
+        self.reset_graphs()
+
+    def close(self):
+        """Free the Pose graph; it is built again if the detector is used afterwards"""
+        if self._pose is not None:
+            self._pose.close()
+            self._pose = None
+
     def detect(self, frame):
         """Detect behavior from pose landmarks"""
+        return self.detect_context(preprocess_frame(frame))
+
+    def detect_context(self, ctx):
+        """Detect behavior from a preprocessed FrameContext"""
         try:
-            # Convert BGR to RGB
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = self.pose.process(rgb_frame)
+            with ctx.timer.stage('pose_inference'):
+                results = self.pose.process(ctx.inference_rgb)
             
             if not results.pose_landmarks:
                 return None
             
             landmarks = results.pose_landmarks.landmark
             
-            # Extract key points
-            keypoints = self._extract_keypoints(landmarks)
-            
-            # Store in history
-            self.pose_history.append(keypoints)
-            if len(self.pose_history) > self.max_history:
-                self.pose_history.pop(0)
+            # Extract key points and store them in history
+            with ctx.timer.stage('pose_features'):
+                pose = self._extract_pose_array(landmarks)
+                keypoints = self._pose_array_to_keypoints(pose)
+                self.pose_history.append(pose)
             
             # Classify behavior
-            behavior, confidence = self._classify_behavior(keypoints)
+            with ctx.timer.stage('behavior_classification'):
+                behavior, confidence = self._classify_behavior(keypoints)
             
             return {
                 'behavior': behavior,
@@ -54,38 +219,27 @@ class BehaviorDetector:
             print(f"Error in behavior detection: {str(e)}  behavior_logic.py:54 - pose_behavior.py:54")
             return None
     
-    def _extract_keypoints(self, landmarks):
-        """Extract key pose points for analysis"""
-        keypoints = {}
-        
-        # Define key landmark indices
-        landmark_indices = {
-            'nose': 0,
-            'left_shoulder': 11,
-            'right_shoulder': 12,
-            'left_elbow': 13,
-            'right_elbow': 14,
-            'left_wrist': 15,
-            'right_wrist': 16,
-            'left_hip': 23,
-            'right_hip': 24,
-            'left_knee': 25,
-            'right_knee': 26,
-            'left_ankle': 27,
-            'right_ankle': 28
-        }
-        
-        for name, idx in landmark_indices.items():
+    def _extract_pose_array(self, landmarks):
+        """Extract key pose points as a (joints, 4) array of x, y, z, visibility"""
+        pose = np.full((len(POSE_KEYPOINTS), 4), np.nan)
+        for row, idx in enumerate(POSE_KEYPOINTS.values()):
             if idx < len(landmarks):
                 landmark = landmarks[idx]
-                keypoints[name] = {
-                    'x': landmark.x,
-                    'y': landmark.y,
-                    'z': landmark.z,
-                    'visibility': landmark.visibility
-                }
-        
+                pose[row] = (landmark.x, landmark.y, landmark.z, landmark.visibility)
+        return pose
+
+    def _pose_array_to_keypoints(self, pose):
+        """Convert a pose array into the keypoint dict used by the rules and results"""
+        keypoints = {}
+        for name, row in JOINT_INDEX.items():
+            x, y, z, visibility = pose[row].tolist()
+            if x == x:  # skip joints stored as NaN
+                keypoints[name] = {'x': x, 'y': y, 'z': z, 'visibility': visibility}
         return keypoints
+
+    def _extract_keypoints(self, landmarks):
+        """Extract key pose points for analysis"""
+        return self._pose_array_to_keypoints(self._extract_pose_array(landmarks))
     
     def _classify_behavior(self, keypoints):
         """Classify behavior based on pose keypoints"""
@@ -181,33 +335,18 @@ class BehaviorDetector:
         if len(self.pose_history) < 5:
             return 0.0
         # Check if knees are visible in latest frame
-        latest_pose = self.pose_history[-1]
-        if ('left_knee' not in latest_pose) or ('right_knee' not in latest_pose):
+        latest_pose = self.pose_history.latest()
+        if np.isnan(latest_pose[_KNEES, X]).any():
             return 0.0   # force unknown if knees missing
 
-
         try:
             # Analyze ankle movement patterns
-            ankle_movements = []
-            for i in range(1, len(self.pose_history)):
-                prev_pose = self.pose_history[i-1]
-                curr_pose = self.pose_history[i]
-                
-                if ('left_ankle' in prev_pose and 'left_ankle' in curr_pose and
-                    'right_ankle' in prev_pose and 'right_ankle' in curr_pose):
-                    
-                    left_movement = abs(curr_pose['left_ankle']['x'] - prev_pose['left_ankle']['x'])
-                    right_movement = abs(curr_pose['right_ankle']['x'] - prev_pose['right_ankle']['x'])
-                    ankle_movements.append(left_movement + right_movement)
-            
-            if ankle_movements:
-                avg_movement = sum(ankle_movements) / len(ankle_movements)
-                # Normalize movement score
-                walking_confidence = min(avg_movement * 10, 1.0)
-                return walking_confidence
-            
-            return 0.0
-            
+            avg_movement = self.pose_history.mean_ankle_movement()
+            if avg_movement is None:
+                return 0.0
+            # Normalize movement score
+            return min(avg_movement * 10, 1.0)
+
         except Exception:
             return 0.0
     
@@ -217,23 +356,10 @@ class BehaviorDetector:
             return 0.0
         
         try:
-            movements = []
-            for i in range(1, len(self.pose_history)):
-                prev_pose = self.pose_history[i-1]
-                curr_pose = self.pose_history[i]
-                
-                for hand in ['left_wrist', 'right_wrist']:
-                    if hand in prev_pose and hand in curr_pose:
-                        dx = curr_pose[hand]['x'] - prev_pose[hand]['x']
-                        dy = curr_pose[hand]['y'] - prev_pose[hand]['y']
-                        movement = math.sqrt(dx*dx + dy*dy)
-                        movements.append(movement)
-            
-            if movements:
-                avg_movement = sum(movements) / len(movements)
-                return min(avg_movement * 20, 1.0)
-            
-            return 0.0
+            avg_movement = self.pose_history.mean_wrist_movement()
+            if avg_movement is None:
+                return 0.0
+            return min(avg_movement * 20, 1.0)
             
         except Exception:
             return 0.0
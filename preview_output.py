@@ -0,0 +1,141 @@
+import threading
+import time
+from collections import deque
+
+import cv2
+
+
+class PreviewOutput:
+    """Downscaled JPEG preview encoded and delivered off the inference loop.
+
+    submit() is called from the video loop with every processed frame and
+    returns immediately: frames arriving faster than max_fps are rejected,
+    and a frame still waiting when a newer one is submitted is replaced
+    (stale preview dropped). A worker thread resizes the newest frame to
+    display_width, JPEG-encodes it and passes the bytes to sink, e.g. a
+    Streamlit placeholder's image method. Submitted frames are only read,
+    never copied, so they must not be modified after submit().
+    """
+
+    def __init__(self, sink, display_width=640, jpeg_quality=70, max_fps=15.0, clock=time.perf_counter):
+        self.sink = sink
+        self.display_width = display_width
+        self.jpeg_quality = jpeg_quality
+        self.max_fps = max_fps
+        self.clock = clock
+
+        self.condition = threading.Condition()
+        self.pending = None
+        self.running = False
+        self.next_due = 0.0
+        self.thread = threading.Thread(target=self._encode_loop, daemon=True)
+
+        self.frames_submitted = 0
+        self.frames_rate_limited = 0
+        self.frames_stale = 0
+        self.frames_sent = 0
+        self.encode_seconds = 0.0
+        self.last_encode_seconds = 0.0
+        self.bytes_sent = 0
+        self.recent_sends = deque(maxlen=64)  # (time, bytes) for the bytes/s estimate
+
+    def start(self):
+        """Start the encoder thread"""
+        self.running = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop the encoder thread; a pending frame is discarded"""
+        with self.condition:
+            self.running = False
+            self.pending = None
+            self.condition.notify()
+        if self.thread.is_alive():
+            self.thread.join(timeout=2.0)
+
+    def set_options(self, display_width=None, jpeg_quality=None, max_fps=None):
+        """Change preview settings; applied from the next encoded frame"""
+        if display_width is not None:
+            self.display_width = display_width
+        if jpeg_quality is not None:
+            self.jpeg_quality = jpeg_quality
+        if max_fps is not None:
+            self.max_fps = max_fps
+
+    def submit(self, frame):
+        """Offer a BGR frame for preview; returns False if it was rate limited"""
+        now = self.clock()
+        with self.condition:
+            self.frames_submitted += 1
+            if self.max_fps and now < self.next_due:
+                self.frames_rate_limited += 1
+                return False
+            self.next_due = now + (1.0 / self.max_fps if self.max_fps else 0.0)
+            if self.pending is not None:
+                self.frames_stale += 1
+            self.pending = frame
+            self.condition.notify()
+            return True
+
+    def encode(self, frame):
+        """Resize to the display width and JPEG-encode; returns the bytes"""
+        height, width = frame.shape[:2]
+        if self.display_width and width > self.display_width:
+            size = (self.display_width, max(1, round(height * self.display_width / width)))
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, int(self.jpeg_quality)])
+        if not ok:
+            raise ValueError("JPEG encoding failed")
+        return buffer.tobytes()
+
+    def _encode_loop(self):
+        while True:
+            with self.condition:
+                while self.running and self.pending is None:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                frame = self.pending
+                self.pending = None
+
+            start = self.clock()
+            try:
+                data = self.encode(frame)
+            except Exception as e:
+                print(f"Preview encoding error: {str(e)}")
+                continue
+            self.last_encode_seconds = self.clock() - start
+            self.encode_seconds += self.last_encode_seconds
+
+            try:
+                self.sink(data)
+            except Exception as e:
+                print(f"Preview output error: {str(e)}")
+                continue
+            self.frames_sent += 1
+            self.bytes_sent += len(data)
+            self.recent_sends.append((self.clock(), len(data)))
+
+    def get_stats(self):
+        """Encode time, preview rate, drop counters and bytes sent per second"""
+        sends = list(self.recent_sends)
+        bytes_per_second = 0.0
+        preview_fps = 0.0
+        if len(sends) > 1:
+            span = sends[-1][0] - sends[0][0]
+            if span > 0:
+                # The first send opens the interval, so its bytes are not counted
+                bytes_per_second = sum(size for _, size in sends[1:]) / span
+                preview_fps = (len(sends) - 1) / span
+        return {
+            'frames_submitted': self.frames_submitted,
+            'frames_sent': self.frames_sent,
+            'frames_rate_limited': self.frames_rate_limited,
+            'frames_stale': self.frames_stale,
+            'preview_fps': preview_fps,
+            'last_encode_ms': self.last_encode_seconds * 1000,
+            'mean_encode_ms': self.encode_seconds / self.frames_sent * 1000 if self.frames_sent else 0.0,
+            'bytes_per_second': bytes_per_second,
+            'mean_frame_bytes': self.bytes_sent / self.frames_sent if self.frames_sent else 0.0
+        }
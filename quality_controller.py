@@ -0,0 +1,216 @@
+import threading
+import time
+from collections import defaultdict, deque
+
+from detector_factory import DETECTOR_FACTORY
+
+# Best quality first. downscale_width is the width the models see (None = full frame)
+QUALITY_TIERS = [
+    {'name': 'high', 'model_complexity': 2, 'refine_landmarks': True, 'downscale_width': None},
+    {'name': 'standard', 'model_complexity': 1, 'refine_landmarks': True, 'downscale_width': None},
+    {'name': 'reduced', 'model_complexity': 1, 'refine_landmarks': False, 'downscale_width': 480},
+    {'name': 'low', 'model_complexity': 0, 'refine_landmarks': False, 'downscale_width': 320},
+]
+DEFAULT_TIER = 'standard'
+
+
+class QualityController:
+    """Switches detector quality tiers to hold a target inference latency.
+
+    observe() feeds per-frame inference times into an EWMA. Above
+    target_ms * downgrade_ratio the controller steps to the next cheaper
+    tier, below target_ms * upgrade_ratio to the next better one. To avoid
+    thrashing it also waits min_dwell_seconds after every switch, and a
+    tier that was over target when it was left is not retried for
+    retry_seconds. With target_ms None it returns to the start tier.
+
+    The next tier's detectors are leased from the factory (built and
+    warmed up if the pool has none) on a background thread; swap() or
+    apply() installs them between frames, so the frame loop never waits
+    for a graph. A tier whose models cannot be built, e.g. the lite and
+    heavy pose models when fetch_models.py was not run, is marked
+    unavailable and skipped.
+    """
+
+    def __init__(self, target_ms=50.0, tiers=QUALITY_TIERS, start_tier=DEFAULT_TIER, max_num_faces=1,
+                 alpha=0.1, downgrade_ratio=1.2, upgrade_ratio=0.6, min_dwell_seconds=3.0,
+                 retry_seconds=30.0, factory=DETECTOR_FACTORY, lease=None, clock=time.monotonic,
+                 max_changes=100):
+        self.target_ms = target_ms
+        self.tiers = tiers
+        self.start_index = [tier['name'] for tier in tiers].index(start_tier)
+        self.max_num_faces = max_num_faces
+        self.alpha = alpha
+        self.downgrade_ratio = downgrade_ratio
+        self.upgrade_ratio = upgrade_ratio
+        self.min_dwell_seconds = min_dwell_seconds
+        self.retry_seconds = retry_seconds
+        self.factory = factory
+        self.clock = clock
+
+        self.lock = threading.Lock()
+        self.tier_index = self.start_index
+        self.lease = lease
+        self.building = None   # tier index being built in the background
+        self.pending = None    # (tier index, lease) ready to be swapped in
+        self.ewma_ms = None
+        self.tier_since = clock()
+        self.time_in_tier = defaultdict(float)
+        self.left_over_target = {}  # tier index -> time it was left while over target
+        self.unavailable = set()
+        self.changes = deque(maxlen=max_changes)  # most recent tier changes
+        self.change_count = 0
+        self.build_failures = 0
+        self.last_error = None
+
+    @property
+    def tier(self):
+        return self.tiers[self.tier_index]
+
+    def start(self):
+        """Lease the start tier's detectors (blocking); returns the lease"""
+        if self.lease is None:
+            self.lease = self._acquire(self.start_index)
+        return self.lease
+
+    def _acquire(self, index):
+        tier = self.tiers[index]
+        return self.factory.acquire(max_num_faces=self.max_num_faces, model_complexity=tier['model_complexity'],
+                                    refine_landmarks=tier['refine_landmarks'])
+
+    # ------------------ CONTROL ------------------
+    def observe(self, latency_ms):
+        """Record one frame's inference time and start a tier change if needed"""
+        if self.ewma_ms is None:
+            self.ewma_ms = latency_ms
+        else:
+            self.ewma_ms += self.alpha * (latency_ms - self.ewma_ms)
+
+        now = self.clock()
+        if self.building is not None or self.pending is not None:
+            return
+        if now - self.tier_since < self.min_dwell_seconds:
+            return
+
+        if self.target_ms is None:
+            if self.tier_index != self.start_index:
+                self._start_build(self.start_index)
+            return
+
+        if self.ewma_ms > self.target_ms * self.downgrade_ratio:
+            index = self._next_available(self.tier_index, 1)
+        elif self.ewma_ms < self.target_ms * self.upgrade_ratio:
+            index = self._next_available(self.tier_index, -1)
+            left_at = self.left_over_target.get(index)
+            if left_at is not None and now - left_at < self.retry_seconds:
+                index = None
+        else:
+            return
+        if index is not None:
+            self._start_build(index)
+
+    def _next_available(self, index, step):
+        index += step
+        while 0 <= index < len(self.tiers):
+            if index not in self.unavailable:
+                return index
+            index += step
+        return None
+
+    def _start_build(self, index):
+        self.building = index
+        threading.Thread(target=self._build, args=(index,), daemon=True, name="quality-tier-build").start()
+
+    def _build(self, index):
+        try:
+            lease = self._acquire(index)
+        except Exception as e:
+            with self.lock:
+                self.build_failures += 1
+                self.last_error = f"{self.tiers[index]['name']}: {str(e)}"
+                self.unavailable.add(index)
+                self.building = None
+            return
+        with self.lock:
+            self.pending = (index, lease)
+            self.building = None
+
+    # ------------------ SWITCHING ------------------
+    def swap(self):
+        """Install a tier built in the background; returns the new lease or None.
+
+        Call between frames from the thread that runs the detectors: the
+        previous lease goes back to the factory pool immediately.
+        """
+        if self.pending is None:
+            return None
+        with self.lock:
+            index, lease = self.pending
+            self.pending = None
+
+        now = self.clock()
+        old_index = self.tier_index
+        spent = now - self.tier_since
+        self.time_in_tier[self.tiers[old_index]['name']] += spent
+        if self.target_ms is not None and self.ewma_ms is not None and self.ewma_ms > self.target_ms:
+            self.left_over_target[old_index] = now
+        self.changes.append({
+            'time': time.time(),
+            'from': self.tiers[old_index]['name'],
+            'to': self.tiers[index]['name'],
+            'ewma_ms': self.ewma_ms,
+            'seconds_in_previous': spent
+        })
+        self.change_count += 1
+
+        self.tier_index = index
+        self.tier_since = now
+        # Start the new tier's average from its own frames
+        self.ewma_ms = None
+
+        old = self.lease
+        self.lease = lease
+        if old is not None:
+            # Keep the pose history the temporal behaviors rely on
+            new_history = lease.behavior_detector.pose_history
+            lease.behavior_detector.pose_history = old.behavior_detector.pose_history
+            old.behavior_detector.pose_history = new_history
+            lease.emotion_detector.use_pose_roi = old.emotion_detector.use_pose_roi
+            old.release()
+        return lease
+
+    def apply(self, pipeline):
+        """Swap a newly built tier into a FramePipeline; returns True if the tier changed"""
+        lease = self.swap()
+        if lease is None:
+            return False
+        pipeline.behavior_detector = lease.behavior_detector
+        pipeline.emotion_detector = lease.emotion_detector
+        pipeline.downscale_width = self.tier['downscale_width']
+        return True
+
+    def close(self):
+        """Give the current (and any pending) detectors back to the factory"""
+        with self.lock:
+            pending, self.pending = self.pending, None
+        if pending is not None:
+            pending[1].release()
+        if self.lease is not None:
+            self.lease.release()
+
+    def get_stats(self):
+        """Current tier, latency average, tier changes, build failures and seconds spent per tier"""
+        time_in_tier = dict(self.time_in_tier)
+        time_in_tier[self.tier['name']] = time_in_tier.get(self.tier['name'], 0.0) + self.clock() - self.tier_since
+        return {
+            'tier': self.tier['name'],
+            'ewma_ms': self.ewma_ms,
+            'target_ms': self.target_ms,
+            'changes': self.change_count,
+            'last_change': self.changes[-1] if self.changes else None,
+            'build_failures': self.build_failures,
+            'last_error': self.last_error,
+            'time_in_tier': time_in_tier,
+            'unavailable': [self.tiers[index]['name'] for index in sorted(self.unavailable)],
+            'building': self.tiers[self.building]['name'] if self.building is not None else None
+        }
@@ -0,0 +1,215 @@
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Ring-wide header at the start of the shared block
+_RING_HEADER = np.dtype([
+    ('num_slots', np.uint64),
+    ('slot_bytes', np.uint64),
+    ('head', np.uint64),     # number of frames published so far
+    ('closed', np.uint64),   # set by the producer when the source is exhausted
+])
+
+# One header per slot. seq follows a seqlock protocol: 2*index+1 while frame
+# `index` is being written into the slot, 2*index+2 once it is complete.
+_SLOT_HEADER = np.dtype([
+    ('seq', np.uint64),
+    ('frame_id', np.int64),
+    ('timestamp', np.float64),
+    ('shape', np.int32, 3),
+])
+
+_ALIGN = 64
+
+
+def _aligned(size):
+    return (size + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+class SharedFrame:
+    """A frame read from the ring: metadata plus a numpy view into the slot"""
+    __slots__ = ('index', 'frame_id', 'timestamp', 'frame')
+
+    def __init__(self, index, frame_id, timestamp, frame):
+        self.index = index
+        self.frame_id = frame_id
+        self.timestamp = timestamp
+        self.frame = frame
+
+
+class SharedFrameRing:
+    """Single-producer, multi-consumer ring of preallocated frame slots in shared memory.
+
+    The producer copies each frame into the next slot once; consumers in
+    other processes get numpy views of the slot without any copy or
+    pickling. The producer never waits for consumers: a consumer that
+    falls more than num_slots - 1 frames behind skips ahead and counts the
+    lost frames as overruns. Because a view aliases the slot, a consumer
+    that keeps one must call is_current() after using it to make sure
+    the slot was not overwritten meanwhile (or read with copy=True).
+
+    Create in the producer with SharedFrameRing.create(...), pass ring.name
+    to the consumers and open it there with SharedFrameRing.attach(name).
+    """
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        self.header = np.ndarray((), dtype=_RING_HEADER, buffer=shm.buf)
+        self.num_slots = int(self.header['num_slots'])
+        self.slot_bytes = int(self.header['slot_bytes'])
+
+        slots_offset = _aligned(_RING_HEADER.itemsize)
+        self.slots = np.ndarray((self.num_slots,), dtype=_SLOT_HEADER, buffer=shm.buf, offset=slots_offset)
+        self.data_offset = _aligned(slots_offset + self.num_slots * _SLOT_HEADER.itemsize)
+        self.data = np.ndarray((self.num_slots, self.slot_bytes), dtype=np.uint8,
+                               buffer=shm.buf, offset=self.data_offset)
+
+        # Consumer-side cursor and counters (local to this process)
+        self.next_index = 0
+        self.frames_read = 0
+        self.overruns = 0
+
+    @classmethod
+    def create(cls, num_slots=4, max_shape=(480, 640, 3), name=None):
+        """Allocate a ring for frames of up to max_shape uint8 pixels"""
+        slot_bytes = _aligned(int(np.prod(max_shape)))
+        slots_offset = _aligned(_RING_HEADER.itemsize)
+        data_offset = _aligned(slots_offset + num_slots * _SLOT_HEADER.itemsize)
+        shm = shared_memory.SharedMemory(name=name, create=True, size=data_offset + num_slots * slot_bytes)
+
+        header = np.ndarray((), dtype=_RING_HEADER, buffer=shm.buf)
+        header['num_slots'] = num_slots
+        header['slot_bytes'] = slot_bytes
+        header['head'] = 0
+        header['closed'] = 0
+        del header
+        ring = cls(shm, owner=True)
+        ring.slots[:] = np.zeros((), dtype=_SLOT_HEADER)
+        return ring
+
+    @classmethod
+    def attach(cls, name):
+        """Open an existing ring by name (in a consumer process)"""
+        return cls(shared_memory.SharedMemory(name=name), owner=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def head(self):
+        return int(self.header['head'])
+
+    @property
+    def closed(self):
+        return bool(self.header['closed'])
+
+    # ------------------ PRODUCER ------------------
+    def write(self, frame, frame_id=None, timestamp=None):
+        """Copy a uint8 frame into the next slot and publish it; returns its ring index"""
+        if frame.dtype != np.uint8 or frame.nbytes > self.slot_bytes:
+            raise ValueError(f"Frame {frame.shape} {frame.dtype} does not fit a {self.slot_bytes}-byte uint8 slot")
+        index = int(self.header['head'])
+        slot = index % self.num_slots
+        header = self.slots[slot]
+
+        header['seq'] = 2 * index + 1
+        shape = frame.shape if frame.ndim == 3 else frame.shape + (1,)
+        self.data[slot, :frame.nbytes].reshape(frame.shape)[...] = frame
+        header['frame_id'] = index if frame_id is None else frame_id
+        header['timestamp'] = time.time() if timestamp is None else timestamp
+        header['shape'] = shape
+        header['seq'] = 2 * index + 2
+        self.header['head'] = index + 1
+        return index
+
+    def close_stream(self):
+        """Tell consumers that no more frames will come"""
+        self.header['closed'] = 1
+
+    # ------------------ CONSUMER ------------------
+    def _view(self, index, copy):
+        """SharedFrame for ring index, or None if that frame is not (or no longer) in its slot"""
+        slot = index % self.num_slots
+        header = self.slots[slot]
+        expected = 2 * index + 2
+        if int(header['seq']) != expected:
+            return None
+        frame_id = int(header['frame_id'])
+        timestamp = float(header['timestamp'])
+        height, width, channels = (int(v) for v in header['shape'])
+        frame = self.data[slot, :height * width * channels].reshape(
+            (height, width, channels) if channels > 1 else (height, width))
+        if copy:
+            frame = frame.copy()
+        # The slot may have been rewritten while the metadata was read
+        if int(header['seq']) != expected:
+            return None
+        return SharedFrame(index, frame_id, timestamp, frame)
+
+    def is_current(self, shared_frame):
+        """True if the slot behind shared_frame still holds that frame"""
+        return int(self.slots[shared_frame.index % self.num_slots]['seq']) == 2 * shared_frame.index + 2
+
+    def _wait(self, predicate, timeout, poll_interval):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not predicate():
+            if self.closed and not predicate():
+                return False
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(poll_interval)
+        return True
+
+    def read_next(self, timeout=1.0, copy=False, poll_interval=0.0005):
+        """Next unread frame in order; skips (and counts) frames lost to overrun"""
+        while True:
+            if not self._wait(lambda: self.head > self.next_index, timeout, poll_interval):
+                return None
+            head = self.head
+            # The slot right after the oldest may already be being rewritten, so keep one slot of margin
+            oldest = head - self.num_slots + 1
+            if self.next_index < oldest:
+                self.overruns += oldest - self.next_index
+                self.next_index = oldest
+            shared_frame = self._view(self.next_index, copy)
+            self.next_index += 1
+            if shared_frame is not None:
+                self.frames_read += 1
+                return shared_frame
+            self.overruns += 1
+
+    def read_latest(self, timeout=1.0, copy=False, poll_interval=0.0005):
+        """Newest published frame not yet read by this consumer, skipping older ones"""
+        while True:
+            if not self._wait(lambda: self.head > self.next_index, timeout, poll_interval):
+                return None
+            index = self.head - 1
+            shared_frame = self._view(index, copy)
+            if shared_frame is not None:
+                self.next_index = index + 1
+                self.frames_read += 1
+                return shared_frame
+
+    def get_stats(self):
+        """Frames published, read by this consumer, and lost to overrun"""
+        return {
+            'published': self.head,
+            'read': self.frames_read,
+            'overruns': self.overruns,
+            'lag': max(0, self.head - self.next_index),
+            'num_slots': self.num_slots,
+            'slot_bytes': self.slot_bytes
+        }
+
+    def close(self):
+        """Drop this process's mapping; the creator also frees the shared block"""
+        self.header = self.slots = self.data = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # frame views handed out are still alive; the mapping goes away with them
+        if self.owner:
+            self.shm.unlink()
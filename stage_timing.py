@@ -0,0 +1,124 @@
+import threading
+import time
+from bisect import bisect_right
+
+# Histogram bucket upper edges in seconds: log-spaced, 10 us .. ~13 s, ~5% wide
+_BUCKET_EDGES = [1e-5 * 1.05 ** i for i in range(290)]
+
+
+class LatencyHistogram:
+    """Fixed-size log-bucketed latency histogram with approximate percentiles"""
+
+    def __init__(self):
+        self.counts = [0] * (len(_BUCKET_EDGES) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect_right(_BUCKET_EDGES, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        """Upper edge of the bucket holding the q-th percentile, in seconds"""
+        if not self.count:
+            return 0.0
+        rank = q / 100.0 * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                edge = _BUCKET_EDGES[index] if index < len(_BUCKET_EDGES) else self.max
+                return min(edge, self.max)
+        return self.max
+
+
+class _NullStage:
+    """Context manager that does nothing; returned while timing is disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ('timer', 'name', 'start')
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class StageTimer:
+    """Per-stage latency histograms that can be switched on and off at runtime.
+
+    Usage:
+        with ctx.timer.stage('pose_inference'):
+            results = pose.process(rgb)
+
+    Each app session owns a timer and hands it to its pipeline, which
+    attaches it to every FrameContext, so sessions sharing detectors keep
+    separate measurements.
+
+    While disabled, stage() returns a shared no-op context manager, so the
+    only cost is one attribute check per instrumented block.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def stage(self, name):
+        """Context manager timing one execution of a stage"""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def record(self, name, seconds):
+        """Add one measurement for a stage"""
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.add(seconds)
+
+    def get_summary(self):
+        """Count, mean, p50/p95/p99 and max per stage, in milliseconds"""
+        with self.lock:
+            summary = {}
+            for name, histogram in self.histograms.items():
+                summary[name] = {
+                    'count': histogram.count,
+                    'mean_ms': histogram.total / histogram.count * 1000 if histogram.count else 0.0,
+                    'p50_ms': histogram.percentile(50) * 1000,
+                    'p95_ms': histogram.percentile(95) * 1000,
+                    'p99_ms': histogram.percentile(99) * 1000,
+                    'max_ms': histogram.max * 1000
+                }
+            return summary
+
+    def reset(self):
+        """Drop all measurements"""
+        with self.lock:
+            self.histograms.clear()
+
+
+# Default timer for frames processed outside a session (batch jobs, stream workers, benchmarks)
+STAGE_TIMER = StageTimer()
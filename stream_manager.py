@@ -0,0 +1,388 @@
+"""Run several cameras or video files at once, one worker process per stream.
+
+Each worker owns its CameraHandler and detector pair and sends small
+result records back over a shared queue; the parent feeds them into one
+AnalyticsTracker keyed by stream id:
+
+    python stream_manager.py 0 1 recordings/door.mp4 --max-fps 15 --duration 60
+"""
+import argparse
+import multiprocessing as mp
+import os
+import queue
+import sys
+import time
+from collections import deque
+
+import cv2
+
+from dashboard_metrics import AnalyticsTracker
+
+
+def parse_source(source):
+    """Camera index for digit strings, otherwise a file path or URL"""
+    return int(source) if isinstance(source, str) and source.isdigit() else source
+
+
+def _worker_factory(detector_builder):
+    """The process-wide DetectorFactory, or one using detector_builder (e.g. stand-ins in tests)"""
+    from detector_factory import DETECTOR_FACTORY, DetectorFactory
+    return DetectorFactory(builder=detector_builder) if detector_builder else DETECTOR_FACTORY
+
+
+def _stream_worker(stream_id, source, max_fps, results, stop_event, ring_name=None, detector_builder=None):
+    """Capture, detect and report results for one stream until stopped or exhausted"""
+    from cam_handler import CameraHandler
+    from frame_pacer import FramePacer
+    from frame_pipeline import FramePipeline
+
+    live = isinstance(source, int)
+    if ring_name is not None:
+        _shared_ring_worker(stream_id, live, max_fps, results, stop_event, ring_name, detector_builder)
+        return
+
+    camera = CameraHandler(headless=True)
+    if not camera.initialize_camera(source):
+        results.put(('error', stream_id, camera.last_error or f"Could not open {source}"))
+        return
+
+    # Live cameras keep only the freshest frame; files are read in order so no frame is lost
+    camera.mirror = live
+    if live:
+        camera.start_capture(buffer_size=2, drop_policy='oldest')
+
+    # Warmed up before reporting 'started', so model setup does not land on the first frame
+    lease = _worker_factory(detector_builder).acquire()
+    pipeline = FramePipeline(lease.behavior_detector, lease.emotion_detector)
+    pacer = FramePacer(max_fps) if max_fps else None
+    results.put(('started', stream_id, os.getpid()))
+    frame_id = 0
+
+    try:
+        while not stop_event.is_set():
+            if pacer is not None:
+                pacer.begin_frame()
+            if live:
+                entry = camera.read_latest_entry(timeout=1.0)
+                if entry is None:
+                    if camera.source_exhausted:
+                        break
+                    continue
+                frame_id, captured_at, frame = entry
+            else:
+                frame = camera.get_frame()
+                if frame is None:
+                    break
+                captured_at = time.time()
+                frame_id += 1
+
+            _, behavior_result, emotion_result = pipeline.process(frame, frame_id=frame_id, timestamp=captured_at)
+            results.put(('result', stream_id, {
+                'frame_id': frame_id,
+                'captured_at': captured_at,
+                'behavior': behavior_result['behavior'] if behavior_result else None,
+                'behavior_confidence': behavior_result['confidence'] if behavior_result else 0.0,
+                'emotion': emotion_result['emotion'] if emotion_result else None,
+                'emotion_confidence': emotion_result['confidence'] if emotion_result else 0.0
+            }))
+
+            if pacer is not None:
+                pacer.end_frame()
+    except Exception as e:
+        results.put(('error', stream_id, str(e)))
+    finally:
+        pipeline.close()
+        camera.release_camera()
+        results.put(('done', stream_id, None))
+
+
+def _shared_ring_worker(stream_id, live, max_fps, results, stop_event, ring_name, detector_builder=None):
+    """Detect on frames the parent process publishes into a SharedFrameRing"""
+    from frame_pacer import FramePacer
+    from frame_pipeline import FramePipeline
+    from shared_frames import SharedFrameRing
+
+    ring = SharedFrameRing.attach(ring_name)
+    lease = _worker_factory(detector_builder).acquire()
+    pipeline = FramePipeline(lease.behavior_detector, lease.emotion_detector)
+    pacer = FramePacer(max_fps) if max_fps else None
+    results.put(('started', stream_id, os.getpid()))
+    torn = 0
+
+    try:
+        while not stop_event.is_set():
+            if pacer is not None:
+                pacer.begin_frame()
+            shared_frame = ring.read_latest(timeout=1.0) if live else ring.read_next(timeout=1.0)
+            if shared_frame is None:
+                if ring.closed and ring.head <= ring.next_index:
+                    break
+                continue
+
+            # Zero-copy view: the pipeline's colour conversion is the only read of the slot
+            _, behavior_result, emotion_result = pipeline.process(
+                shared_frame.frame, frame_id=shared_frame.frame_id, timestamp=shared_frame.timestamp)
+            if not ring.is_current(shared_frame):
+                torn += 1
+            results.put(('result', stream_id, {
+                'frame_id': shared_frame.frame_id,
+                'captured_at': shared_frame.timestamp,
+                'behavior': behavior_result['behavior'] if behavior_result else None,
+                'behavior_confidence': behavior_result['confidence'] if behavior_result else 0.0,
+                'emotion': emotion_result['emotion'] if emotion_result else None,
+                'emotion_confidence': emotion_result['confidence'] if emotion_result else 0.0
+            }))
+
+            if pacer is not None:
+                pacer.end_frame()
+    except Exception as e:
+        results.put(('error', stream_id, str(e)))
+    finally:
+        pipeline.close()
+        ring_stats = ring.get_stats()
+        ring_stats['torn'] = torn
+        shared_frame = None
+        ring.close()
+        results.put(('done', stream_id, ring_stats))
+
+
+class StreamStats:
+    """Throughput and capture-to-result lag of one stream"""
+
+    def __init__(self, source):
+        self.source = source
+        self.status = 'starting'
+        self.pid = None
+        self.error = None
+        self.ring = None
+        self.frames = 0
+        self.started_at = None
+        self.total_lag = 0.0
+        self.last_lag = 0.0
+        self.recent = deque(maxlen=60)  # receive times for the current fps
+
+    def record(self, captured_at, received_at):
+        if self.started_at is None:
+            self.started_at = received_at
+        self.frames += 1
+        self.last_lag = max(0.0, received_at - captured_at)
+        self.total_lag += self.last_lag
+        self.recent.append(received_at)
+
+    def to_dict(self, now):
+        recent = list(self.recent)
+        window = recent[-1] - recent[0] if len(recent) > 1 else 0.0
+        elapsed = now - self.started_at if self.started_at is not None else 0.0
+        return {
+            'source': self.source,
+            'status': self.status,
+            'pid': self.pid,
+            'error': self.error,
+            'overruns': self.ring['overruns'] if self.ring else 0,
+            'frames': self.frames,
+            'fps': (len(recent) - 1) / window if window > 0 else 0.0,
+            'mean_fps': self.frames / elapsed if elapsed > 0 else 0.0,
+            'last_lag_ms': self.last_lag * 1000,
+            'mean_lag_ms': self.total_lag / self.frames * 1000 if self.frames else 0.0
+        }
+
+
+class StreamManager:
+    """Run N sources in worker processes and merge their detections.
+
+    sources is a list (stream ids become stream0, stream1, ...) or a
+    {stream_id: source} dict. max_fps is one limit for every stream or a
+    {stream_id: fps} dict; None runs a stream as fast as it can.
+
+    With shared_capture=True the parent owns the cameras: each stream's
+    CameraHandler publishes into a SharedFrameRing and the worker only
+    runs detection on zero-copy views of those frames. This suits live
+    cameras; a video file is decoded faster than it is analysed, so its
+    worker skips frames (reported as overruns).
+
+    detector_builder is passed to each worker's DetectorFactory in place
+    of the MediaPipe detectors; it must be a module-level function so it
+    can be sent to the spawned processes.
+    """
+
+    def __init__(self, sources, analytics=None, max_fps=None, behavior_threshold=0.5,
+                 emotion_threshold=0.6, queue_size=1024, shared_capture=False, ring_slots=4,
+                 detector_builder=None):
+        if not isinstance(sources, dict):
+            sources = {f"stream{i}": source for i, source in enumerate(sources)}
+        self.sources = {stream_id: parse_source(source) for stream_id, source in sources.items()}
+        self.analytics = analytics if analytics is not None else AnalyticsTracker()
+        self.max_fps = max_fps
+        self.behavior_threshold = behavior_threshold
+        self.emotion_threshold = emotion_threshold
+
+        # spawn: mediapipe graphs and capture threads do not survive fork reliably
+        self.context = mp.get_context('spawn')
+        self.results = self.context.Queue(maxsize=queue_size)
+        self.stop_event = self.context.Event()
+        self.shared_capture = shared_capture
+        self.ring_slots = ring_slots
+        self.detector_builder = detector_builder
+        self.cameras = {}
+        self.rings = {}
+        self.processes = {}
+        self.stats = {stream_id: StreamStats(source) for stream_id, source in self.sources.items()}
+
+    def _fps_limit(self, stream_id):
+        if isinstance(self.max_fps, dict):
+            return self.max_fps.get(stream_id)
+        return self.max_fps
+
+    def start(self):
+        """Launch one worker process per stream"""
+        for stream_id, source in self.sources.items():
+            ring_name = self._start_shared_capture(stream_id, source) if self.shared_capture else None
+            if self.shared_capture and ring_name is None:
+                continue
+            process = self.context.Process(
+                target=_stream_worker,
+                args=(stream_id, source, self._fps_limit(stream_id), self.results, self.stop_event, ring_name,
+                      self.detector_builder),
+                name=f"stream-{stream_id}",
+                daemon=True
+            )
+            process.start()
+            self.processes[stream_id] = process
+        return self
+
+    def _start_shared_capture(self, stream_id, source):
+        """Open a source in this process and publish its frames into a new ring"""
+        from cam_handler import CameraHandler
+        from shared_frames import SharedFrameRing
+
+        camera = CameraHandler(headless=True)
+        if not camera.initialize_camera(source):
+            self.stats[stream_id].status = 'error'
+            self.stats[stream_id].error = camera.last_error or f"Could not open {source}"
+            return None
+        camera.mirror = isinstance(source, int)
+        width = int(camera.cap.get(cv2.CAP_PROP_FRAME_WIDTH)) or 640
+        height = int(camera.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) or 480
+
+        ring = SharedFrameRing.create(num_slots=self.ring_slots, max_shape=(height, width, 3))
+        camera.publish_to(ring)
+        camera.start_capture(buffer_size=1, drop_policy='oldest')
+        self.cameras[stream_id] = camera
+        self.rings[stream_id] = ring
+        return ring.name
+
+    def poll(self, timeout=0.1):
+        """Drain pending worker messages into the tracker; returns how many results were handled"""
+        handled = 0
+        block_timeout = timeout
+        while True:
+            try:
+                kind, stream_id, payload = self.results.get(timeout=block_timeout) \
+                    if block_timeout else self.results.get_nowait()
+            except queue.Empty:
+                return handled
+            block_timeout = None
+            stats = self.stats[stream_id]
+
+            if kind == 'result':
+                stats.record(payload['captured_at'], time.time())
+                self._record(stream_id, payload)
+                handled += 1
+            elif kind == 'started':
+                stats.status = 'running'
+                stats.pid = payload
+            elif kind == 'error':
+                stats.error = payload
+                print(f"Stream {stream_id} error: {payload}")
+            elif kind == 'done':
+                stats.status = 'error' if stats.error else 'finished'
+                stats.ring = payload
+
+    def _record(self, stream_id, result):
+        if result['behavior'] and result['behavior_confidence'] >= self.behavior_threshold:
+            self.analytics.add_behavior_detection(result['behavior'], result['behavior_confidence'],
+                                                  timestamp=result['captured_at'], stream_id=stream_id)
+        if result['emotion'] and result['emotion_confidence'] >= self.emotion_threshold:
+            self.analytics.add_emotion_detection(result['emotion'], result['emotion_confidence'],
+                                                 timestamp=result['captured_at'], stream_id=stream_id)
+
+    def is_running(self):
+        """True while any stream has not reported that it finished"""
+        return any(stats.status in ('starting', 'running') for stats in self.stats.values()) and \
+            any(process.is_alive() for process in self.processes.values())
+
+    def run(self, duration=None, report_interval=None):
+        """Poll until every stream finishes or duration seconds pass"""
+        start = time.time()
+        last_report = start
+        while self.is_running():
+            self.poll(timeout=0.1)
+            now = time.time()
+            if duration is not None and now - start >= duration:
+                break
+            if report_interval and now - last_report >= report_interval:
+                self.print_stats()
+                last_report = now
+        self.poll(timeout=0)
+
+    def stop(self, timeout=5.0):
+        """Ask every worker to stop, collect their last results and join them"""
+        self.stop_event.set()
+        deadline = time.time() + timeout
+        while any(process.is_alive() for process in self.processes.values()) and time.time() < deadline:
+            self.poll(timeout=0.1)
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+            process.join(timeout=1.0)
+        self.poll(timeout=0)
+        for camera in self.cameras.values():
+            camera.release_camera()
+        for ring in self.rings.values():
+            ring.close()
+        self.cameras.clear()
+        self.rings.clear()
+
+    def get_stream_stats(self):
+        """Per-stream status, frames, current/mean fps and lag"""
+        now = time.time()
+        return {stream_id: stats.to_dict(now) for stream_id, stats in self.stats.items()}
+
+    def print_stats(self):
+        for stream_id, stats in self.get_stream_stats().items():
+            print(f"{stream_id:10s} {stats['status']:9s} {stats['frames']:6d} frames "
+                  f"{stats['fps']:6.1f} fps  lag {stats['mean_lag_ms']:7.1f} ms  ({stats['source']})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run detection on several cameras or video files at once")
+    parser.add_argument('sources', nargs='+', help="Camera indices or video files, one worker process each")
+    parser.add_argument('--max-fps', type=float, default=None, help="Per-stream frame rate limit")
+    parser.add_argument('--duration', type=float, default=None, help="Stop after this many seconds")
+    parser.add_argument('--report-interval', type=float, default=5.0, help="Seconds between stats lines")
+    parser.add_argument('--shared-capture', action='store_true',
+                        help="Capture in this process and hand frames to workers through shared memory")
+    args = parser.parse_args(argv)
+
+    manager = StreamManager(args.sources, max_fps=args.max_fps, shared_capture=args.shared_capture).start()
+    start = time.time()
+    try:
+        manager.run(duration=args.duration, report_interval=args.report_interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        manager.stop()
+
+    elapsed = time.time() - start
+    stats = manager.get_stream_stats()
+    total_frames = sum(stream['frames'] for stream in stats.values())
+    manager.print_stats()
+    print(f"Total: {total_frames} frames from {len(stats)} streams in {elapsed:.1f}s "
+          f"({total_frames / elapsed if elapsed > 0 else 0.0:.1f} fps)")
+    for stream_id in stats:
+        print(f"{stream_id}: {manager.analytics.get_stream_distribution(stream_id)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
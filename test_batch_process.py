@@ -0,0 +1,87 @@
+import json
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+import batch_process
+
+
+class HistoryDetector:
+    """Behavior detector that reports how many poses it had seen before each frame"""
+
+    def __init__(self):
+        self.pose_history = []
+
+    def detect_context(self, ctx):
+        seen = len(self.pose_history)
+        self.pose_history.append(ctx.frame_id)
+        return {'behavior': 'standing', 'confidence': float(seen), 'keypoints': None}
+
+    def reset_history(self):
+        self.pose_history = []
+
+
+class NoFaceDetector:
+    use_pose_roi = False
+
+    def detect_context(self, ctx, pose_keypoints=None):
+        return None
+
+
+def use_fake_detectors(monkeypatch):
+    leases = {static: SimpleNamespace(behavior_detector=HistoryDetector(), emotion_detector=NoFaceDetector())
+              for static in (False, True)}
+    monkeypatch.setattr(batch_process, '_detector_leases', leases)
+
+
+def write_images(directory, count):
+    for i in range(count):
+        cv2.imwrite(str(directory / f"{i:02d}.png"), np.full((32, 32, 3), i, dtype=np.uint8))
+
+
+def read_records(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_image_directories_are_split_into_jobs(tmp_path):
+    write_images(tmp_path, 5)
+    (tmp_path / "notes.txt").write_text("skip")
+
+    jobs = batch_process.collect_inputs([str(tmp_path)], images_per_job=2)
+    assert [kind for kind, _ in jobs] == ['images'] * 3
+    assert [len(files) for _, files in jobs] == [2, 2, 1]
+    assert jobs[2][1] == [str(tmp_path / "04.png")]
+
+
+def test_stills_do_not_share_pose_history(tmp_path, monkeypatch):
+    use_fake_detectors(monkeypatch)
+    write_images(tmp_path, 3)
+    files = [str(tmp_path / f"{i:02d}.png") for i in range(3)]
+    part_path = tmp_path / "part.jsonl"
+
+    result = batch_process.process_input('images', files, str(part_path), chunk_size=2)
+
+    records = read_records(part_path)
+    assert result['frames'] == 3
+    assert [record['source'] for record in records] == files
+    assert [record['behavior_confidence'] for record in records] == [0.0, 0.0, 0.0]
+
+
+def test_video_frames_are_streamed_in_chunks(tmp_path, monkeypatch):
+    use_fake_detectors(monkeypatch)
+    video_path = str(tmp_path / "clip.avi")
+    writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (32, 32))
+    for i in range(5):
+        writer.write(np.full((32, 32, 3), i * 40, dtype=np.uint8))
+    writer.release()
+    part_path = tmp_path / "part.jsonl"
+
+    result = batch_process.process_input('video', [video_path], str(part_path), chunk_size=2)
+
+    records = read_records(part_path)
+    assert result['frames'] == 5
+    assert [record['frame'] for record in records] == [0, 1, 2, 3, 4]
+    # Video frames keep their history
+    assert [record['behavior_confidence'] for record in records] == [0.0, 1.0, 2.0, 3.0, 4.0]
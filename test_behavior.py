@@ -1,4 +1,82 @@
-from pose_behavior import BehaviorDetector
+import math
+
+import numpy as np
+import pytest
+
+import pose_behavior
+from pose_behavior import BehaviorDetector, JOINT_INDEX, POSE_KEYPOINTS
 
 detector = BehaviorDetector()
 print("✅ BehaviorDetector imported successfully - test_behavior.py:4")
+
+
+def _reference_walking(history):
+    """Original list-of-dicts walking rule"""
+    if len(history) < 5:
+        return 0.0
+    if 'left_knee' not in history[-1] or 'right_knee' not in history[-1]:
+        return 0.0
+    movements = []
+    for prev_pose, curr_pose in zip(history, history[1:]):
+        if all(j in p for j in ('left_ankle', 'right_ankle') for p in (prev_pose, curr_pose)):
+            movements.append(abs(curr_pose['left_ankle']['x'] - prev_pose['left_ankle']['x']) +
+                             abs(curr_pose['right_ankle']['x'] - prev_pose['right_ankle']['x']))
+    return min(sum(movements) / len(movements) * 10, 1.0) if movements else 0.0
+
+
+def _reference_hand_movement(history):
+    """Original list-of-dicts wrist movement score"""
+    if len(history) < 3:
+        return 0.0
+    movements = []
+    for prev_pose, curr_pose in zip(history, history[1:]):
+        for hand in ('left_wrist', 'right_wrist'):
+            if hand in prev_pose and hand in curr_pose:
+                dx = curr_pose[hand]['x'] - prev_pose[hand]['x']
+                dy = curr_pose[hand]['y'] - prev_pose[hand]['y']
+                movements.append(math.sqrt(dx * dx + dy * dy))
+    return min(sum(movements) / len(movements) * 20, 1.0) if movements else 0.0
+
+
+def _random_pose(rng):
+    pose = np.column_stack([rng.uniform(0, 0.1, (len(POSE_KEYPOINTS), 3)),
+                            rng.uniform(0, 1, len(POSE_KEYPOINTS))])
+    for joint in ('left_ankle', 'right_wrist', 'left_knee'):
+        if rng.random() < 0.15:
+            pose[JOINT_INDEX[joint]] = np.nan
+    return pose
+
+
+def test_ring_buffer_matches_list_history():
+    behavior = BehaviorDetector()
+    rng = np.random.default_rng(0)
+    history = []
+    for _ in range(60):
+        pose = _random_pose(rng)
+        behavior.pose_history.append(pose)
+        history.append(behavior._pose_array_to_keypoints(pose))
+        history = history[-behavior.max_history:]
+
+        assert len(behavior.pose_history) == len(history)
+        assert math.isclose(behavior._detect_walking(), _reference_walking(history), abs_tol=1e-12)
+        assert math.isclose(behavior._calculate_hand_movement(), _reference_hand_movement(history),
+                            abs_tol=1e-12)
+
+
+def test_reset_history_clears_ring():
+    behavior = BehaviorDetector()
+    rng = np.random.default_rng(1)
+    for _ in range(7):
+        behavior.pose_history.append(_random_pose(rng))
+    behavior.reset_history()
+    assert len(behavior.pose_history) == 0
+    assert behavior.pose_history.latest() is None
+    assert behavior._calculate_hand_movement() == 0.0
+
+
+def test_missing_pose_model_is_not_downloaded(tmp_path, monkeypatch):
+    monkeypatch.setattr(pose_behavior, 'pose_model_path', lambda model_complexity: str(tmp_path / "missing.tflite"))
+    behavior = BehaviorDetector(model_complexity=2)
+    with pytest.raises(FileNotFoundError, match="fetch_models.py"):
+        behavior.pose
+    assert not behavior.is_loaded
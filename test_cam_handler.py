@@ -0,0 +1,108 @@
+import time
+
+import cv2
+import numpy as np
+
+from cam_handler import CameraHandler
+
+
+def _write_video(path, num_frames=20, size=(64, 48)):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'MJPG'), 30, size)
+    for i in range(num_frames):
+        frame = np.full((size[1], size[0], 3), i * 10 % 256, dtype=np.uint8)
+        writer.write(frame)
+    writer.release()
+
+
+def _open(path):
+    handler = CameraHandler(headless=True)
+    assert handler.initialize_camera(str(path))
+    handler.mirror = False
+    return handler
+
+
+def test_read_next_serves_every_frame(tmp_path):
+    video = tmp_path / "clip.avi"
+    _write_video(video, num_frames=20)
+    handler = _open(video)
+    handler.start_capture(buffer_size=64, drop_policy='oldest')
+
+    frame_ids = []
+    while True:
+        entry = handler.read_next_entry(timeout=2.0)
+        if entry is None:
+            break
+        frame_ids.append(entry[0])
+    handler.release_camera()
+
+    assert frame_ids == list(range(20))
+
+
+def test_drop_oldest_keeps_latest_frame(tmp_path):
+    video = tmp_path / "clip.avi"
+    _write_video(video, num_frames=20)
+    handler = _open(video)
+    handler.start_capture(buffer_size=3, drop_policy='oldest')
+    handler.capture_thread.join(timeout=5.0)
+
+    entry = handler.read_latest_entry(timeout=0.1)
+    stats = handler.get_capture_stats()
+    handler.release_camera()
+
+    assert entry[0] == 19
+    assert stats['source_exhausted']
+    assert stats['captured'] == 20
+    assert stats['served'] == 1
+    assert stats['dropped'] == 19
+
+
+def test_drop_newest_keeps_first_frames(tmp_path):
+    video = tmp_path / "clip.avi"
+    _write_video(video, num_frames=20)
+    handler = _open(video)
+    handler.start_capture(buffer_size=3, drop_policy='newest')
+    handler.capture_thread.join(timeout=5.0)
+
+    frame_ids = [handler.read_next_entry(timeout=0.1)[0] for _ in range(3)]
+    stats = handler.get_capture_stats()
+    handler.release_camera()
+
+    assert frame_ids == [0, 1, 2]
+    assert stats['dropped'] == 17
+
+
+class _LiveCamera:
+    """Stands in for cv2.VideoCapture on a live camera: a new frame every few ms until released"""
+
+    def __init__(self):
+        self.frames = 0
+
+    def read(self):
+        time.sleep(0.002)
+        self.frames += 1
+        return True, np.full((48, 64, 3), self.frames % 256, dtype=np.uint8)
+
+    def grab(self):
+        return self.read()[0]
+
+    def release(self):
+        pass
+
+
+def test_skip_frames_keeps_latest_frame_during_threaded_capture():
+    handler = CameraHandler(headless=True)
+    handler.cap = _LiveCamera()
+    handler.is_initialized = True
+    handler.start_capture(buffer_size=2, drop_policy='oldest')
+    try:
+        # Holding the condition keeps the capture thread from adding frames meanwhile
+        with handler.buffer_condition:
+            assert handler._wait_for_frame(2.0)
+            newest = handler.frame_buffer[-1]
+            dropped = handler.frames_dropped
+            assert handler.skip_frames(5) == 0
+            assert handler.frame_buffer[-1] is newest
+            assert handler.frames_dropped == dropped
+        assert handler.read_latest_entry(timeout=2.0)[0] >= newest[0]
+    finally:
+        handler.release_camera()
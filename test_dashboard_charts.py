@@ -0,0 +1,20 @@
+from dashboard_charts import EMOTION_COLORS, IncrementalChart
+
+
+def test_incremental_chart_skips_unchanged_data():
+    chart = IncrementalChart('emotion', 'bar', "Emotion Distribution", EMOTION_COLORS)
+    assert chart.update({'happy': 3, 'anger': 1})
+    first_spec = chart.figure.to_json()
+    assert not chart.update({'happy': 3, 'anger': 1})
+    assert chart.update({'happy': 4, 'anger': 1})
+    assert chart.figure.layout.meta == 0  # new data needs no revision bump
+    assert chart.update({'happy': 3, 'anger': 1})  # back to earlier data still redraws
+
+    assert list(chart.figure.data[0].y) == [3, 1]
+    assert chart.figure.data[0].marker.color[0] == EMOTION_COLORS['happy']
+    assert (chart.updates, chart.skipped, chart.figure.layout.meta) == (3, 1, 1)
+
+    # In the next script run the same data is drawn as the same element
+    chart.invalidate()
+    assert chart.update({'happy': 3, 'anger': 1})
+    assert chart.figure.to_json() == first_spec
@@ -0,0 +1,84 @@
+import statistics
+from datetime import datetime
+
+import numpy as np
+
+from dashboard_metrics import AnalyticsTracker, ConfidenceStats
+
+
+def test_confidence_stats_match_exact_values():
+    values = np.random.default_rng(0).uniform(0.2, 1.0, 5000).tolist()
+    stats = ConfidenceStats()
+    for value in values:
+        stats.add(value)
+
+    assert stats.count == len(values)
+    assert abs(stats.mean - statistics.fmean(values)) < 1e-9
+    assert abs(stats.variance - statistics.pvariance(values)) < 1e-9
+    assert stats.min == min(values) and stats.max == max(values)
+    for q in (0.5, 0.9, 0.99):
+        assert abs(stats.quantile(q) - float(np.quantile(values, q))) <= 0.01
+
+
+def test_average_confidence_and_export_use_aggregates():
+    tracker = AnalyticsTracker(reservoir_size=5)
+    for i in range(100):
+        tracker.add_behavior_detection('standing', 0.9)
+        tracker.add_behavior_detection('walking', 0.5)
+        tracker.add_emotion_detection('happy', 0.8)
+
+    averages = tracker.get_average_confidence()
+    assert abs(averages['behavior'] - 0.7) < 1e-9
+    assert abs(averages['emotion'] - 0.8) < 1e-9
+
+    exported = tracker.export_session_data()
+    assert exported['behavior_confidences']['walking']['count'] == 100
+    assert abs(exported['behavior_confidences']['walking']['mean'] - 0.5) < 1e-9
+    assert len(exported['emotion_confidence_samples']['happy']) == 5
+
+
+def test_windowed_distribution_and_rates():
+    tracker = AnalyticsTracker()
+    start = 60 * 20000.0
+    for second in range(600):
+        tracker.add_behavior_detection('sitting' if second < 300 else 'walking', 0.6, timestamp=start + second)
+        tracker.add_emotion_detection('happy', 0.8, timestamp=start + second)
+    now = start + 599.5
+
+    assert tracker.get_behavior_distribution(window_seconds=60, now=now) == {'walking': 60}
+    # Beyond the per-second ring the minute buckets answer, at minute granularity
+    assert tracker.get_behavior_distribution(window_seconds=600, now=now) == {'sitting': 300, 'walking': 300}
+    assert tracker.get_behavior_distribution() == {'sitting': 300, 'walking': 300}
+
+    tracker.session_start = datetime.fromtimestamp(start)
+    assert abs(tracker.get_detection_rates('emotion', 120, now=now)['happy'] - 1.0) < 1e-9
+    assert abs(tracker.get_windowed_confidence('behavior', 60, now=now)['walking'] - 0.6) < 1e-9
+
+    # Buckets older than the ring span are recycled, not accumulated
+    assert tracker.get_emotion_distribution(window_seconds=60, now=now + 3600) == {}
+
+
+def test_activity_is_coalesced_into_segments():
+    tracker = AnalyticsTracker(segment_min_frames=3, segment_max_gap=2.0)
+    labels = ['standing'] * 30 + ['sitting'] + ['standing'] * 30 + ['walking'] * 20
+    for frame, label in enumerate(labels):
+        tracker.add_behavior_detection(label, 0.8, timestamp=1000 + frame / 30)
+        # Two people's emotions are tracked separately and do not split each other's segments
+        tracker.add_emotion_detection('happy', 0.6, timestamp=1000 + frame / 30, person_id=1)
+        tracker.add_emotion_detection('sad', 0.7, timestamp=1000 + frame / 30, person_id=2)
+
+    now = 1000 + len(labels) / 30
+    behavior = [s for s in tracker.get_activity_segments(now=now) if s.type == 'behavior']
+    # The one-frame flicker is absorbed; the walking run opens a new segment
+    assert [(s.label, s.frames, s.flicker_frames) for s in behavior] == [('standing', 60, 1), ('walking', 20, 0)]
+    assert abs(behavior[0].start - 1000) < 1e-9 and abs(behavior[1].start - (1000 + 61 / 30)) < 1e-9
+
+    emotion = {s.person_id: s for s in tracker.get_activity_segments(now=now) if s.type == 'emotion'}
+    assert emotion[1].label == 'happy' and emotion[1].frames == len(labels)
+    assert abs(emotion[2].mean_confidence - 0.7) < 1e-9
+
+    # A pause longer than the gap closes the segment; stale sources are closed on query
+    tracker.add_behavior_detection('walking', 0.8, timestamp=now + 5)
+    assert len([s for s in tracker.get_activity_segments(now=now + 5) if s.label == 'walking']) == 2
+    assert tracker.get_recent_activity(10)[-1]['detection'] == 'Walking'
+    assert len(tracker.export_session_data()['recent_activity']) == 5
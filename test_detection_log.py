@@ -0,0 +1,70 @@
+import pytest
+
+from dashboard_metrics import AnalyticsTracker
+from detection_log import DetectionLog, list_segments, read_detection_log
+
+
+def test_detection_log_round_trip(tmp_path):
+    log = DetectionLog(str(tmp_path), batch_size=64)
+    tracker = AnalyticsTracker(event_log=log)
+    for i in range(1000):
+        tracker.add_behavior_detection('walking' if i % 2 else 'sitting', 0.5, timestamp=1000.0 + i,
+                                       stream_id='cam0' if i < 500 else 'cam1')
+        tracker.add_emotion_detection('happy', 0.75, timestamp=1000.0 + i)
+    log.close()
+
+    assert log.get_stats()['events_written'] == 2000
+    assert len(read_detection_log(str(tmp_path))) == 2000
+
+    window = read_detection_log(str(tmp_path), start=1100, end=1199, labels=['walking'])
+    assert len(window) == 50
+    assert set(window['type']) == {'behavior'}
+    assert window['timestamp'].between(1100, 1199).all()
+
+    assert len(read_detection_log(str(tmp_path), streams=['cam1'])) == 500
+    assert tracker.get_stream_distribution('cam0')['behavior'] == {'sitting': 250, 'walking': 250}
+
+    # Segments entirely outside the range are skipped by name
+    assert list_segments(str(tmp_path), start=5000) == []
+
+
+def test_detection_logs_sharing_a_directory_keep_their_segments(tmp_path):
+    logs = [DetectionLog(str(tmp_path), batch_size=8) for _ in range(2)]
+    for log in logs:
+        for i in range(10):
+            log.append('emotion', 'happy', 0.5, timestamp=2000.0 + i, stream_id=0)
+        log.close()
+
+    assert len(list_segments(str(tmp_path))) == 2
+    detections = read_detection_log(str(tmp_path))
+    assert len(detections) == 20
+    assert set(detections['stream']) == {'0'}
+
+
+def test_detection_log_reports_write_errors(tmp_path):
+    log = DetectionLog(str(tmp_path), batch_size=1)
+    log.append('emotion', object(), 0.5, timestamp=1.0)  # not a string label
+    log.append('emotion', 'happy', 0.5, timestamp=2.0)
+    log.flush()
+    stats = log.get_stats()
+    assert stats['events_failed'] == 1 and stats['events_written'] == 1
+
+    # A writer thread that died makes the log fail loudly instead of buffering forever
+    def broken():
+        raise OSError("disk full")
+    log._segment_full = broken
+    log.append('emotion', 'happy', 0.5, timestamp=3.0)
+    log.thread.join(5.0)
+    with pytest.raises(RuntimeError, match="disk full"):
+        log.append('emotion', 'happy', 0.5, timestamp=4.0)
+
+
+def test_stream_filter_matches_the_ids_given_to_append(tmp_path):
+    log = DetectionLog(str(tmp_path), batch_size=8)
+    for i in range(10):
+        log.append('emotion', 'happy', 0.5, timestamp=3000.0 + i, stream_id=i % 2)
+    log.close()
+
+    detections = read_detection_log(str(tmp_path), streams=[0])
+    assert len(detections) == 5
+    assert set(detections['stream']) == {'0'}
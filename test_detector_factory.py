@@ -0,0 +1,63 @@
+import gc
+
+from emotion_engine import EmotionDetector
+from pose_behavior import BehaviorDetector
+
+
+def test_detectors_build_graphs_lazily():
+    behavior_detector = BehaviorDetector()
+    emotion_detector = EmotionDetector(max_num_faces=2)
+    assert not behavior_detector.is_loaded
+    assert not emotion_detector.is_loaded
+
+
+def test_factory_warms_up_and_reuses_released_pairs(fake_factory):
+    factory = fake_factory()
+
+    lease = factory.acquire(max_num_faces=1)
+    behavior_detector = lease.behavior_detector
+    assert behavior_detector.frames == 1 and lease.emotion_detector.frames == 1
+    assert factory.get_stats()['cold_start_ms'] is not None
+
+    # Another configuration gets its own pair
+    other = factory.acquire(max_num_faces=3)
+    assert other.behavior_detector is not behavior_detector
+
+    lease.emotion_detector.use_pose_roi = True
+    lease.release()
+    assert lease.released
+    # Tracked state does not carry over to the next lease
+    assert behavior_detector.tracking_resets == lease.emotion_detector.tracking_resets == 1
+    assert not lease.emotion_detector.use_pose_roi
+    again = factory.acquire(max_num_faces=1)
+    assert again.behavior_detector is behavior_detector
+    assert behavior_detector.frames == 1  # reused pairs are not warmed up again
+
+    # Dropping a lease returns its pair too
+    del other
+    gc.collect()
+    stats = factory.get_stats()
+    assert stats['pairs_built'] == 2
+    assert stats['idle_pairs'] == 1
+    assert stats['leases'] == 3 and stats['pool_hits'] == 1
+
+
+def test_idle_pool_is_capped_and_extra_pairs_are_closed(fake_factory):
+    factory = fake_factory()
+    factory.max_idle = 1
+    leases = [factory.acquire(model_complexity=2) for _ in range(3)]
+    detectors = [lease.behavior_detector for lease in leases]
+    for lease in leases:
+        lease.release()
+
+    stats = factory.get_stats()
+    assert stats['idle_pairs'] == 1 and stats['pairs_closed'] == 2
+    assert [detector.closed for detector in detectors] == [False, True, True]
+    assert factory.acquire(model_complexity=2).behavior_detector is detectors[0]
+
+
+def test_time_to_first_detection_is_recorded_once(fake_factory):
+    factory = fake_factory()
+    first = factory.record_first_detection(0.0)
+    factory.record_first_detection(1.0)
+    assert factory.get_stats()['time_to_first_detection_ms'] == first
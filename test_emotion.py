@@ -1,3 +1,209 @@
-from emotion_engine import EmotionDetector
+from types import SimpleNamespace
+
+import numpy as np
+from mediapipe.framework.formats import landmark_pb2
+
+from emotion_engine import EmotionDetector, FEATURE_NAMES
+from frame_pipeline import preprocess_frame
 
 print(dir(EmotionDetector))
+
+
+def _synthetic_face(rng, num_landmarks=478):
+    face = landmark_pb2.NormalizedLandmarkList()
+    for x, y, z in zip(rng.uniform(0.3, 0.7, num_landmarks),
+                       rng.uniform(0.2, 0.8, num_landmarks),
+                       rng.uniform(-0.1, 0.1, num_landmarks)):
+        face.landmark.add(x=x, y=y, z=z)
+    return face
+
+
+def test_vectorized_features_match_scalar():
+    detector = EmotionDetector()
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        face = _synthetic_face(rng)
+        expected = detector._extract_facial_features_scalar(face.landmark, (480, 640, 3))
+        for landmarks in (face, detector._landmarks_to_array(face)):
+            actual = detector._extract_facial_features(landmarks, (480, 640, 3))
+            for name in expected:
+                assert abs(actual[name] - expected[name]) < 1e-9
+
+
+def test_degenerate_face_uses_scalar_fallbacks():
+    detector = EmotionDetector()
+    face = landmark_pb2.NormalizedLandmarkList()
+    for _ in range(468):
+        face.landmark.add(x=0.5, y=0.5, z=0.0)
+    expected = detector._extract_facial_features_scalar(face.landmark, (480, 640, 3))
+    assert detector._extract_facial_features(detector._landmarks_to_array(face), (480, 640, 3)) == expected
+
+
+def test_batch_features_match_single_frames():
+    detector = EmotionDetector()
+    rng = np.random.default_rng(1)
+    faces = [_synthetic_face(rng) for _ in range(8)]
+    stack = np.stack([detector._landmarks_to_array(face) for face in faces])
+    batch = detector.extract_features_batch(stack, (480, 640, 3))
+    assert batch.shape == (8, len(FEATURE_NAMES))
+    for row, face in zip(batch, faces):
+        single = detector._extract_facial_features(face.landmark, (480, 640, 3))
+        assert np.allclose(row, [single[name] for name in FEATURE_NAMES])
+
+
+def _reference_classify(features):
+    """The original hand-written _classify_emotion / _detect_* rules"""
+    ear = features.get('eye_aspect_ratio', 0.3)
+    mar = features.get('mouth_aspect_ratio', 0.5)
+    brow = features.get('eyebrow_position', 0.5)
+    curve = features.get('mouth_curve', 0)
+    emotions = []
+
+    happy = (0.4 if curve > 0.05 else 0) + (0.3 if 0.18 < ear < 0.38 else 0) + (0.3 if mar > 0.38 else 0)
+    if min(happy, 1.0) > 0.35:
+        emotions.append(('happy', min(happy, 1.0)))
+    sad = (0.4 if curve < -0.05 else 0) + (0.3 if brow < 0.35 else 0) + (0.3 if ear < 0.28 else 0)
+    if min(sad, 1.0) > 0.35:
+        emotions.append(('sad', min(sad, 1.0)))
+    surprised = (0.4 if ear > 0.38 else 0) + (0.4 if mar > 0.75 else 0) + (0.2 if brow > 0.65 else 0)
+    if min(surprised, 1.0) > 0.2:
+        emotions.append(('surprised', min(surprised, 1.0)))
+    sleepy = 0.6 if ear < 0.25 else 0.0
+    if sleepy > 0.25:
+        emotions.append(('sleepy', sleepy))
+    cry = (0.4 if curve < -0.15 else 0) + (0.3 if ear < 0.26 else 0) + (0.3 if brow < 0.3 else 0)
+    if min(cry, 1.0) > 0.35:
+        emotions.append(('cry', min(cry, 1.0)))
+    flu = (0.4 if mar > 0.55 else 0) + (0.3 if ear < 0.28 else 0)
+    if min(flu, 1.0) > 0.25:
+        emotions.append(('flu', min(flu, 1.0)))
+    smoking = 0.5 if 0.3 < mar < 0.6 else 0.0
+    if smoking > 0.25:
+        emotions.append(('smoking', smoking))
+    anger = (0.4 if brow < 0.3 else 0) + (0.3 if ear < 0.28 else 0) + (0.3 if curve < 0.05 else 0)
+    if min(anger, 1.0) > 0.35:
+        emotions.append(('anger', min(anger, 1.0)))
+
+    if emotions:
+        emotion, confidence = max(emotions, key=lambda x: x[1])
+        if confidence < 0.4:
+            return 'neutral', confidence
+        return emotion, confidence
+    return 'neutral', 0.6
+
+
+def _feature_samples(count, seed=2):
+    rng = np.random.default_rng(seed)
+    boundaries = [-0.2, -0.15, -0.1, -0.05, 0.0, 0.05, 0.1, 0.18, 0.25, 0.26, 0.28, 0.3,
+                  0.35, 0.38, 0.5, 0.55, 0.6, 0.65, 0.75, 0.8, 1.0]
+    samples = []
+    for _ in range(count):
+        features = {}
+        for name in FEATURE_NAMES:
+            roll = rng.random()
+            if roll < 0.1:
+                continue  # missing feature falls back to its default
+            if roll < 0.6:
+                features[name] = float(rng.choice(boundaries))
+            else:
+                features[name] = float(rng.uniform(-0.3, 1.0))
+        samples.append(features)
+    return samples
+
+
+def test_compiled_rules_reproduce_original_labels():
+    detector = EmotionDetector()
+    samples = _feature_samples(5000)
+    matrix = detector.rule_engine.features_to_matrix(samples)
+    labels, confidences = detector.classify_batch(matrix)
+    for features, label, confidence in zip(samples, labels, confidences):
+        expected_label, expected_confidence = _reference_classify(features)
+        assert label == expected_label
+        assert confidence == expected_confidence
+        assert detector._classify_emotion(features) == (expected_label, expected_confidence)
+
+
+def test_classify_faces_matches_single_face_path():
+    detector = EmotionDetector()
+    rng = np.random.default_rng(3)
+    faces = [_synthetic_face(rng) for _ in range(5)]
+
+    # All faces of the frame go through one feature matrix
+    batches = []
+    feature_matrix = detector._feature_matrix
+    detector._feature_matrix = lambda points, frame_shape: batches.append(points.shape) or feature_matrix(points, frame_shape)
+    results = detector.classify_faces(faces, (480, 640, 3))
+    del detector._feature_matrix
+    assert batches == [(5, 24, 2)]
+    assert len(results) == 5
+    for face, result in zip(faces, results):
+        features = detector._extract_facial_features(face, (480, 640, 3))
+        assert result['features'] == features
+        assert (result['emotion'], result['confidence']) == detector._classify_emotion(features)
+        x0, y0, x1, y1 = result['bbox']
+        assert 0.3 <= x0 < result['center'][0] < x1 <= 0.7 and 0.2 <= y0 < y1 <= 0.8
+
+
+class FakeFaceMesh:
+    """Returns the queued results in order; None means no face"""
+
+    def __init__(self, *faces):
+        self.faces = list(faces)
+        self.images = []
+
+    def process(self, image):
+        self.images.append(image)
+        face = self.faces.pop(0)
+        return SimpleNamespace(multi_face_landmarks=[face] if face is not None else None)
+
+
+def _pose_keypoints(nose_visibility=0.9):
+    return {
+        'nose': {'x': 0.5, 'y': 0.4, 'visibility': nose_visibility},
+        'left_shoulder': {'x': 0.6, 'y': 0.6, 'visibility': 0.9},
+        'right_shoulder': {'x': 0.4, 'y': 0.6, 'visibility': 0.9}
+    }
+
+
+def test_face_roi_from_pose_keypoints():
+    detector = EmotionDetector(use_pose_roi=True)
+    # 128 px shoulders -> 153.6 px square around a point 15.4 px above the nose
+    assert detector._face_roi(_pose_keypoints(), (480, 640, 3)) == (243, 99, 396, 253)
+    assert detector._face_roi(_pose_keypoints(nose_visibility=0.2), (480, 640, 3)) is None
+    # Face would fill most of the frame: no crop
+    close_up = _pose_keypoints()
+    close_up['left_shoulder']['x'], close_up['right_shoulder']['x'] = 0.9, 0.1
+    assert detector._face_roi(close_up, (480, 640, 3)) is None
+
+
+def test_roi_landmarks_are_remapped_to_the_full_frame():
+    face = landmark_pb2.NormalizedLandmarkList()
+    face.landmark.add(x=0.0, y=0.0, z=0.1)
+    face.landmark.add(x=0.5, y=1.0, z=-0.2)
+
+    remapped = EmotionDetector._remap_landmarks(face, (100, 40, 300, 240), 640, 480)
+    points = [(l.x, l.y, l.z) for l in remapped.landmark]
+    assert np.allclose(points, [(100 / 640, 40 / 480, 0.1 * 200 / 640), (200 / 640, 240 / 480, -0.2 * 200 / 640)])
+    assert face.landmark[1].x == 0.5  # the crop's landmarks are left alone
+
+
+def test_roi_hits_skip_full_frame_and_misses_fall_back():
+    rng = np.random.default_rng(4)
+    detector = EmotionDetector(use_pose_roi=True)
+    detector.roi_face_mesh = FakeFaceMesh(_synthetic_face(rng), None, None)
+    detector._face_mesh = FakeFaceMesh(_synthetic_face(rng), None)
+    ctx = preprocess_frame(np.zeros((480, 640, 3), dtype=np.uint8))
+
+    assert detector.detect_context(ctx, _pose_keypoints()) is not None
+    assert detector.roi_face_mesh.images[0].shape == (154, 153, 3)
+    assert not detector._face_mesh.images
+
+    # Crop misses: full-frame inference finds the face
+    assert detector.detect_context(ctx, _pose_keypoints()) is not None
+    # Neither finds one
+    assert detector.detect_context(ctx, _pose_keypoints()) is None
+
+    assert detector.get_roi_stats() == {
+        'roi_attempts': 3, 'roi_hits': 1, 'full_frame_runs': 2, 'full_frame_hits': 1, 'roi_fallbacks': 2,
+        'roi_rate': 0.5
+    }
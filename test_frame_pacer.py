@@ -0,0 +1,60 @@
+from frame_pacer import FramePacer
+
+
+class FakeClock:
+    """Clock whose sleep advances time instead of waiting"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def run_frame(pacer, clock, work_seconds):
+    pacer.begin_frame()
+    clock.now += work_seconds
+    return pacer.end_frame()
+
+
+def test_pacer_sleeps_only_for_slack_and_skips_missed_periods():
+    clock = FakeClock()
+    pacer = FramePacer(target_fps=8, clock=clock, sleep=clock.sleep)  # 125 ms period
+
+    assert run_frame(pacer, clock, 0.0625) == 0
+    assert clock.sleeps == [0.0625] and clock.now == 0.125
+
+    # 312.5 ms of work misses the 250 ms deadline by more than a whole period
+    assert run_frame(pacer, clock, 0.3125) == 1
+    assert clock.sleeps == [0.0625]
+
+    # The schedule moved on to the 500 ms deadline instead of catching up
+    assert run_frame(pacer, clock, 0.0) == 0
+    assert clock.sleeps == [0.0625, 0.0625] and clock.now == 0.5
+
+    stats = pacer.get_stats()
+    assert stats['frames'] == 3
+    assert stats['missed_deadlines'] == 1 and stats['frames_skipped'] == 1
+    assert stats['over_budget'] == 1
+    assert stats['achieved_fps'] == 6.0
+    assert stats['mean_latency_ms'] == 125.0
+
+
+def test_latency_budget_and_reset():
+    clock = FakeClock()
+    pacer = FramePacer(target_fps=8, latency_budget=0.05, clock=clock, sleep=clock.sleep)
+    run_frame(pacer, clock, 0.0625)
+    assert pacer.get_stats()['over_budget'] == 1
+    assert pacer.get_stats()['missed_deadlines'] == 0
+
+    pacer.set_target_fps(4)
+    pacer.reset()
+    assert pacer.get_stats()['frames'] == 0
+    run_frame(pacer, clock, 0.125)
+    assert clock.sleeps[-1] == 0.125  # 250 ms period, default budget of one period
+    assert pacer.get_stats()['over_budget'] == 0
@@ -0,0 +1,68 @@
+import threading
+
+import numpy as np
+
+from frame_pipeline import FramePipeline
+
+
+class RecordingDetector:
+    """Records the image and pose keypoints it was given; pose keypoints are the frame id"""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.images = []
+        self.pose_keypoints = []
+        self.threads = []
+
+    def detect_context(self, ctx, pose_keypoints=None):
+        self.images.append(ctx.inference_rgb)
+        self.pose_keypoints.append(pose_keypoints)
+        self.threads.append(threading.current_thread().name)
+        if self.kind == 'behavior':
+            return {'behavior': 'standing', 'confidence': 1.0, 'keypoints': {'frame': ctx.frame_id}}
+        return {'emotion': 'happy', 'confidence': 1.0}
+
+
+def make_frame(value):
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+    frame[..., 0] = value  # blue
+    return frame
+
+
+def test_both_detectors_share_one_rgb_conversion():
+    behavior, emotion = RecordingDetector('behavior'), RecordingDetector('emotion')
+    pipeline = FramePipeline(behavior, emotion)
+
+    ctx, _, _ = pipeline.process(make_frame(200))
+    assert behavior.images[0] is emotion.images[0] is ctx.rgb
+    assert ctx.rgb[0, 0].tolist() == [0, 0, 200]
+    assert not ctx.rgb.flags.writeable
+
+    pipeline.downscale_width = 32
+    ctx, _, _ = pipeline.process(make_frame(200))
+    assert behavior.images[1] is emotion.images[1] is ctx.small_rgb
+    assert ctx.inference_rgb.shape == (24, 32, 3)
+    assert ctx.shape == (48, 64, 3)
+
+
+def test_concurrent_mode_runs_pose_on_a_worker_thread():
+    behavior, emotion = RecordingDetector('behavior'), RecordingDetector('emotion')
+    sequential = FramePipeline(behavior, emotion)
+    for frame_id in range(3):
+        sequential.process(make_frame(frame_id), frame_id=frame_id)
+    # Sequentially the face step gets this frame's pose
+    assert emotion.pose_keypoints == [{'frame': 0}, {'frame': 1}, {'frame': 2}]
+
+    behavior, emotion = RecordingDetector('behavior'), RecordingDetector('emotion')
+    concurrent = FramePipeline(behavior, emotion, concurrent=True)
+    try:
+        results = [concurrent.process(make_frame(frame_id), frame_id=frame_id) for frame_id in range(3)]
+    finally:
+        concurrent.close()
+    # Concurrently it can only use the previous frame's pose
+    assert emotion.pose_keypoints == [None, {'frame': 0}, {'frame': 1}]
+    assert [result[1]['keypoints'] for result in results] == [{'frame': 0}, {'frame': 1}, {'frame': 2}]
+    assert all(name.startswith('pose-detector') for name in behavior.threads)
+    assert emotion.threads == [threading.current_thread().name] * 3
+    assert {'behavior_ms', 'emotion_ms', 'total_ms'} <= set(results[0][0].timings)
+    assert concurrent.executor is None
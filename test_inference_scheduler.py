@@ -0,0 +1,63 @@
+import numpy as np
+
+from frame_pipeline import FramePipeline
+from inference_scheduler import InferenceScheduler
+
+
+def frame(value):
+    return np.full((48, 64, 3), value, dtype=np.uint8)
+
+
+class CountingDetector:
+    def __init__(self, result):
+        self.result = result
+        self.calls = 0
+
+    def detect_context(self, ctx, pose_keypoints=None):
+        self.calls += 1
+        return dict(self.result, frame_id=ctx.frame_id)
+
+
+def test_static_scene_is_inferred_on_cadence_and_motion_is_inferred_at_once():
+    scheduler = InferenceScheduler(motion_threshold=4.0, idle_interval=3, max_staleness=60.0)
+    static = [scheduler.should_infer(frame(100), now=i * 0.1) for i in range(7)]
+    assert static == [True, False, False, True, False, False, True]
+
+    # A small change stays below the threshold, a large one is motion
+    assert not scheduler.should_infer(frame(102), now=0.8)
+    assert scheduler.should_infer(frame(160), now=0.9)
+
+    stats = scheduler.get_stats()
+    assert stats['reasons'] == {'first': 1, 'motion': 1, 'cadence': 2, 'stale': 0}
+    assert stats['frames_inferred'] == 4 and stats['frames_reused'] == 5
+    assert stats['last_motion'] == 60.0
+
+
+def test_stale_results_are_refreshed_and_reset_forces_inference():
+    scheduler = InferenceScheduler(idle_interval=0, max_staleness=1.0)
+    assert scheduler.should_infer(frame(50), now=10.0)
+    assert not scheduler.should_infer(frame(50), now=10.9)
+    assert scheduler.should_infer(frame(50), now=11.0)
+    assert scheduler.get_stats()['reasons']['stale'] == 1
+
+    scheduler.reset()
+    assert scheduler.should_infer(frame(50), now=11.1)
+    assert scheduler.get_stats()['reasons']['first'] == 2
+
+
+def test_pipeline_reuses_previous_results_without_running_detectors():
+    behavior = CountingDetector({'behavior': 'standing', 'confidence': 0.9, 'keypoints': None})
+    emotion = CountingDetector({'emotion': 'happy', 'confidence': 0.8})
+    scheduler = InferenceScheduler(idle_interval=0, max_staleness=60.0)
+    pipeline = FramePipeline(behavior, emotion, scheduler=scheduler)
+
+    first = pipeline.process(frame(100), frame_id=0)
+    reused = pipeline.process(frame(100), frame_id=1)
+    moved = pipeline.process(frame(200), frame_id=2)
+
+    assert not first[0].reused and first[1]['frame_id'] == 0
+    assert reused[0].reused and reused[0].rgb is None
+    assert reused[0].frame_id == 1
+    assert reused[1:] == first[1:]
+    assert not moved[0].reused and moved[1]['frame_id'] == 2
+    assert behavior.calls == emotion.calls == 2
@@ -0,0 +1,126 @@
+import asyncio
+import json
+import threading
+
+import cv2
+import numpy as np
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError
+from tornado.httpserver import HTTPServer
+from tornado.testing import bind_unused_port
+from tornado.websocket import websocket_connect
+
+from inference_server import InferenceServer, make_app
+from inference_service import InferenceService
+
+
+def mean_pixel(detector, ctx):
+    """Reports the mean pixel value of each frame as its confidence"""
+    confidence = round(float(ctx.frame.mean()) / 255, 2)
+    if detector.kind == 'behavior':
+        return {'behavior': 'standing', 'confidence': confidence, 'keypoints': None}
+    face = {'emotion': 'happy', 'confidence': confidence, 'bbox': (0.1, 0.1, 0.3, 0.3)}
+    return dict(face, faces=[face])
+
+
+def make_service(factory, max_queue=8):
+    return InferenceService(max_queue=max_queue, max_batch=4, batch_wait_ms=1.0, factory=factory).start()
+
+
+async def run_requests(service):
+    sock, port = bind_unused_port()
+    server = HTTPServer(make_app(InferenceServer(service)))
+    server.add_sockets([sock])
+    url = f"http://127.0.0.1:{port}"
+    client = AsyncHTTPClient()
+    frame = np.full((48, 64, 3), 51, dtype=np.uint8)
+    responses = {}
+
+    try:
+        png = cv2.imencode('.png', frame)[1].tobytes()
+        response = await client.fetch(f"{url}/detect", method='POST', body=png,
+                                      headers={'Content-Type': 'image/png'})
+        responses['encoded'] = json.loads(response.body)
+
+        response = await client.fetch(f"{url}/detect?width=64&height=48", method='POST', body=frame.tobytes(),
+                                      headers={'Content-Type': 'application/octet-stream'})
+        responses['raw'] = json.loads(response.body)
+
+        try:
+            await client.fetch(f"{url}/detect?width=10&height=10", method='POST', body=frame.tobytes(),
+                               headers={'Content-Type': 'application/octet-stream'})
+        except HTTPClientError as e:
+            responses['bad_raw'] = e.code
+
+        connection = await websocket_connect(f"ws://127.0.0.1:{port}/stream")
+        connection.write_message(json.dumps({'format': 'raw', 'width': 64, 'height': 48}))
+        connection.write_message(frame.tobytes(), binary=True)
+        responses['stream'] = json.loads(await connection.read_message())
+        connection.close()
+
+        service.max_queue = 0  # every new frame is shed
+        try:
+            await client.fetch(f"{url}/detect", method='POST', body=png, headers={'Content-Type': 'image/png'})
+        except HTTPClientError as e:
+            responses['shed'] = e.code
+
+        responses['stats'] = json.loads((await client.fetch(f"{url}/stats")).body)
+    finally:
+        server.stop()
+    return responses
+
+
+def test_http_and_websocket_round_trips_and_load_shedding(fake_factory):
+    service = make_service(fake_factory(behavior=mean_pixel, emotion=mean_pixel))
+    try:
+        responses = asyncio.run(run_requests(service))
+    finally:
+        service.stop()
+
+    for name in ('encoded', 'raw', 'stream'):
+        assert responses[name]['behavior'] == {'behavior': 'standing', 'confidence': 0.2}
+        assert responses[name]['faces'][0]['emotion'] == 'happy'
+    assert responses['stream']['seq'] == 0
+    assert responses['bad_raw'] == 400
+    assert responses['shed'] == 503
+    assert responses['stats']['shed'] == 1
+    assert responses['stats']['service']['completed'] == 3
+    assert responses['stats']['service']['roi']['full_frame_runs'] == 0
+    assert list(responses['stats']['client_roi']) == ['127.0.0.1']
+
+
+def test_superseded_frames_are_shed_but_cancelled_requests_propagate(fake_factory):
+    gate = threading.Event()
+
+    def blocked(detector, ctx):
+        gate.wait(5.0)
+        return None
+
+    service = InferenceService(factory=fake_factory(behavior=blocked)).start()
+    server = InferenceServer(service)
+    session = service.open_session()
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+
+    async def requests():
+        blocker = asyncio.ensure_future(server.run(service.open_session(), frame))
+        await asyncio.sleep(0.05)  # the worker is now blocked on this frame
+        stale = asyncio.ensure_future(server.run(session, frame))
+        await asyncio.sleep(0.01)
+        fresh = asyncio.ensure_future(server.run(session, frame))
+        assert await stale is None
+
+        fresh.cancel()
+        gate.set()
+        try:
+            await fresh
+        except asyncio.CancelledError:
+            pass
+        else:
+            raise AssertionError("a cancelled request must not look like a shed frame")
+        await blocker
+
+    try:
+        asyncio.run(requests())
+    finally:
+        gate.set()
+        service.stop()
+    assert server.shed == 1
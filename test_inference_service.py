@@ -0,0 +1,220 @@
+import gc
+import threading
+import time
+
+import numpy as np
+
+import inference_service
+from inference_service import InferenceService, get_inference_service
+from stage_timing import StageTimer
+
+
+def make_service(fake_factory, **kwargs):
+    """Service whose behavior detector records the tag of every frame and blocks while the gate is closed"""
+    gate = threading.Event()
+    holds = {}  # tag -> Event, blocks only that frame
+    seen = []
+
+    def respond(detector, ctx):
+        tag = int(ctx.frame[0, 0, 0])
+        with ctx.timer.stage('detect'):
+            if detector.kind == 'behavior':
+                holds.get(tag, gate).wait(5.0)
+                seen.append(tag)
+        return {'tag': tag, 'history': id(detector.pose_history), 'keypoints': None}
+
+    service = InferenceService(factory=fake_factory(behavior=respond, emotion=respond), **kwargs)
+    service.start()
+    return service, gate, seen, holds
+
+
+def wait_until_taken(service):
+    """Wait for the worker to take the queued frame"""
+    deadline = time.monotonic() + 5.0
+    while service.queue_depth and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+def frame(tag):
+    return np.full((4, 4, 3), tag, dtype=np.uint8)
+
+
+def test_sessions_are_served_round_robin(fake_factory):
+    service, gate, seen, holds = make_service(fake_factory, max_pending=3, max_queue=8)
+    try:
+        busy = service.open_session()
+        first = service.open_session()
+        second = service.open_session()
+
+        blocker = busy.submit(frame(0))
+        wait_until_taken(service)
+        futures = [first.submit(frame(tag)) for tag in (1, 2, 3)]
+        futures.append(second.submit(frame(10)))
+        gate.set()
+
+        results = [future.result(5.0) for future in [blocker] + futures]
+        # One frame per session per turn: the second session is not stuck behind the first one's backlog
+        assert seen == [0, 1, 10, 2, 3]
+        # Each session's pose history is swapped into the shared detector
+        assert results[1][1]['history'] != results[4][1]['history']
+    finally:
+        service.stop()
+
+
+def test_backpressure_drops_stale_frames_and_rejects_when_full(fake_factory):
+    service, gate, seen, holds = make_service(fake_factory, max_pending=1, max_queue=2)
+    try:
+        sessions = [service.open_session() for _ in range(3)]
+        blocker = sessions[0].submit(frame(0))
+        wait_until_taken(service)
+
+        stale = sessions[1].submit(frame(1))
+        fresh = sessions[1].submit(frame(2))
+        assert stale.cancelled()
+        sessions[2].submit(frame(3))
+        assert sessions[0].submit(frame(4)) is None  # service queue is full
+
+        stats = service.get_stats()
+        assert stats['queue_depth'] == 2
+        assert stats['dropped'] == 1 and stats['rejected'] == 1
+
+        gate.set()
+        assert fresh.result(5.0)[1]['tag'] == 2
+        blocker.result(5.0)
+        assert 1 not in seen
+
+        # Closed sessions free their slot on the worker
+        del sessions
+        gc.collect()
+        assert service.get_stats()['sessions'] == 0
+    finally:
+        service.stop()
+
+
+def test_batched_frame_is_superseded_by_a_newer_one(fake_factory):
+    service, gate, seen, holds = make_service(fake_factory, max_pending=1, max_batch=2)
+    try:
+        holds.update({0: threading.Event(), 1: threading.Event()})
+        gate.set()
+        first, second, stream = (service.open_session() for _ in range(3))
+
+        blocker = first.submit(frame(0))
+        wait_until_taken(service)
+        held = second.submit(frame(1))
+        stale = stream.submit(frame(2))
+        holds[0].set()
+        wait_until_taken(service)  # the worker now holds the batch [1, 2]
+
+        fresh = stream.submit(frame(3))
+        holds[1].set()
+        assert fresh.result(5.0)[1]['tag'] == 3
+        assert stale.cancelled()
+        assert seen == [0, 1, 3]
+        assert blocker.done() and held.done()
+        assert service.get_stats()['mean_batch_size'] == 1.5
+    finally:
+        service.stop()
+
+
+def test_sessions_keep_separate_stage_timings(fake_factory):
+    service, gate, seen, holds = make_service(fake_factory, max_pending=3)
+    gate.set()
+    try:
+        timers = [StageTimer(enabled=True), StageTimer(enabled=False)]
+        sessions = [service.open_session() for _ in timers]
+        for session, timer in zip(sessions, timers):
+            session.configure(stage_timer=timer)
+
+        for tag in (1, 2):
+            sessions[0].infer(frame(tag))
+            sessions[1].infer(frame(tag + 10))
+
+        # Both detectors of the first session's frames, nothing from the second session
+        assert timers[0].get_summary()['detect']['count'] == 4
+        assert timers[1].get_summary() == {}
+    finally:
+        service.stop()
+
+
+def face_roi(detector, ctx):
+    """Emotion detector that tries the face crop when ROI is on; crops find the face on even tags only"""
+    if detector.kind == 'emotion':
+        found = False
+        if detector.use_pose_roi:
+            detector.roi_attempts += 1
+            found = int(ctx.frame[0, 0, 0]) % 2 == 0
+            detector.roi_hits += found
+        if not found:
+            detector.full_frame_runs += 1
+            detector.full_frame_hits += 1
+    return None
+
+
+def test_roi_counts_are_kept_per_session(fake_factory):
+    service = InferenceService(factory=fake_factory(emotion=face_roi)).start()
+    try:
+        cropped, full = service.open_session(), service.open_session()
+        cropped.configure(use_pose_roi=True)
+        for tag in (1, 2, 3, 4):
+            cropped.infer(frame(tag))
+            full.infer(frame(tag))
+
+        assert cropped.get_stats()['roi'] == {'roi_attempts': 4, 'roi_hits': 2, 'full_frame_runs': 2,
+                                              'full_frame_hits': 2, 'roi_fallbacks': 2, 'roi_rate': 0.5}
+        assert full.get_stats()['roi']['roi_attempts'] == 0
+        assert full.get_stats()['roi']['full_frame_runs'] == 4
+        assert service.get_stats()['roi']['full_frame_runs'] == 6
+    finally:
+        service.stop()
+
+
+def tracking_graph(detector, ctx):
+    """Answers like a MediaPipe graph in tracking mode: the result depends on the previous frame it saw"""
+    tag = int(ctx.frame[0, 0, 0])
+    previous, detector.tracked = detector.tracked, tag
+    return {'tag': tag, 'previous': previous, 'keypoints': None}
+
+
+def run_sessions(fake_factory, interleaved):
+    """Tags 1-3 from one session, each followed by a frame of a second session if interleaved"""
+    service = InferenceService(factory=fake_factory(behavior=tracking_graph, emotion=tracking_graph))
+    try:
+        session, other = service.open_session(), service.open_session()
+        results = []
+        for tag in (1, 2, 3):
+            results.append(session.infer(frame(tag))[1])
+            if interleaved:
+                results.append(other.infer(frame(tag + 10))[1])
+        return results, service.get_stats()['graph_resets']
+    finally:
+        service.stop()
+
+
+def test_single_session_keeps_tracking(fake_factory):
+    results, resets = run_sessions(fake_factory, interleaved=False)
+    assert [result['previous'] for result in results] == [None, 1, 2]
+    assert resets == 0
+
+
+def test_interleaved_sessions_do_not_see_each_others_frames(fake_factory):
+    results, resets = run_sessions(fake_factory, interleaved=True)
+    # Each session switch resets the graphs, so no frame is tracked from another session's frame
+    assert [result['previous'] for result in results] == [None] * 6
+    assert resets == 5
+
+
+def test_services_of_abandoned_settings_are_stopped(fake_factory, monkeypatch):
+    monkeypatch.setattr(inference_service, '_SERVICES', {})
+    factory = fake_factory()
+    one_face = get_inference_service(1, factory=factory)
+    session = one_face.open_session()
+    three_faces = get_inference_service(3, factory=factory)
+    # The first service still has a session
+    assert one_face.running and factory.get_stats()['leases'] == 2
+
+    session.close()
+    assert get_inference_service(2, factory=factory) is not three_faces
+    assert not one_face.running and not three_faces.running
+    assert list(inference_service._SERVICES) == [2]
+    assert factory.get_stats()['idle_pairs'] == 2
+    inference_service._SERVICES[2].stop()
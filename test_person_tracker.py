@@ -0,0 +1,52 @@
+from dashboard_metrics import AnalyticsTracker
+from person_tracker import PersonTracker
+
+
+def _faces(*centers, emotion='happy'):
+    return [{'center': center, 'emotion': emotion, 'confidence': 0.8} for center in centers]
+
+
+def test_ids_follow_people_across_frames():
+    tracker = PersonTracker(max_distance=0.1, max_missed=2)
+    first = tracker.update(_faces((0.2, 0.5), (0.7, 0.5)))
+    left_id, right_id = first[0]['person_id'], first[1]['person_id']
+    assert left_id != right_id
+
+    # Listed in the other order and slightly moved: ids stick to positions
+    moved = tracker.update(_faces((0.72, 0.52), (0.23, 0.49), emotion='sad'))
+    assert [face['person_id'] for face in moved] == [right_id, left_id]
+    assert [emotion for _, emotion, _ in tracker.get_track(left_id).history] == ['happy', 'sad']
+
+    # Someone new far away gets a new id; a person missing too long is dropped
+    newcomer = tracker.update(_faces((0.25, 0.5), (0.5, 0.9)))
+    assert newcomer[0]['person_id'] == left_id
+    assert newcomer[1]['person_id'] not in (left_id, right_id)
+    for _ in range(2):
+        tracker.update(_faces((0.25, 0.5)))
+    assert tracker.get_track(right_id) is None
+    assert tracker.get_track(left_id).hits == 5
+
+
+def test_tracks_expire_on_frames_without_faces():
+    tracker = PersonTracker(max_missed=2)
+    person_id = tracker.update(_faces((0.5, 0.5)))[0]['person_id']
+    tracker.update([])
+    tracker.update([])
+    assert tracker.get_track(person_id).missed == 2
+
+    tracker.update([])
+    assert tracker.get_tracks() == []
+    # Someone showing up at the same spot afterwards is a new person
+    assert tracker.update(_faces((0.5, 0.5)))[0]['person_id'] != person_id
+
+
+def test_per_person_counts_in_analytics():
+    tracker = PersonTracker()
+    analytics = AnalyticsTracker()
+    for frame in range(10):
+        for face in tracker.update(_faces((0.2, 0.5), (0.7, 0.5), emotion='happy' if frame < 6 else 'sad')):
+            analytics.add_emotion_detection(face['emotion'], face['confidence'], person_id=face['person_id'])
+
+    assert analytics.get_people() == [1, 2]
+    assert analytics.get_person_distribution(1)['emotion'] == {'happy': 6, 'sad': 4}
+    assert tracker.get_tracks()[1]['dominant_emotion'] == 'happy'
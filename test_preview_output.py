@@ -0,0 +1,40 @@
+import threading
+
+import cv2
+import numpy as np
+
+from preview_output import PreviewOutput
+
+
+def test_preview_rate_limit_stale_drop_and_resize():
+    now = [0.0]
+    sent = []
+    release = threading.Event()
+
+    def sink(data):
+        release.wait(2.0)
+        sent.append(data)
+
+    preview = PreviewOutput(sink, display_width=320, jpeg_quality=60, max_fps=10, clock=lambda: now[0]).start()
+    frame = np.random.default_rng(0).integers(0, 255, (480, 640, 3), dtype=np.uint8)
+
+    assert preview.submit(frame)
+    assert not preview.submit(frame)  # within 1/max_fps of the previous preview
+    while preview.pending is not None:  # the worker has taken the first frame into the blocked sink
+        threading.Event().wait(0.01)
+    for _ in range(3):
+        now[0] += 0.1
+        assert preview.submit(frame)  # the sink is blocked, so older pending frames go stale
+    release.set()
+    for _ in range(200):
+        if preview.get_stats()['frames_sent'] == 2:
+            break
+        threading.Event().wait(0.01)
+    preview.stop()
+
+    stats = preview.get_stats()
+    assert stats['frames_rate_limited'] == 1
+    assert stats['frames_stale'] == 2
+    assert stats['frames_sent'] == 2
+    decoded = cv2.imdecode(np.frombuffer(sent[0], np.uint8), cv2.IMREAD_COLOR)
+    assert decoded.shape == (240, 320, 3)
@@ -0,0 +1,72 @@
+import time
+
+from frame_pipeline import FramePipeline
+from quality_controller import QualityController
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def wait_for_build(controller):
+    deadline = time.monotonic() + 5.0
+    while controller.building is not None and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_controller_steps_tiers_with_hysteresis(fake_factory):
+    clock = FakeClock()
+    controller = QualityController(target_ms=50.0, alpha=1.0, min_dwell_seconds=3.0, retry_seconds=30.0,
+                                   factory=fake_factory(unavailable=(0,)), clock=clock)
+    lease = controller.start()
+    pipeline = FramePipeline(lease.behavior_detector, lease.emotion_detector)
+    lease.behavior_detector.pose_history.append('pose')
+
+    # Too slow, but still within the dwell time after the (initial) switch
+    controller.observe(80.0)
+    assert controller.building is None
+
+    clock.now = 4.0
+    controller.observe(80.0)
+    wait_for_build(controller)
+    assert controller.apply(pipeline)
+    assert controller.tier['name'] == 'reduced'
+    assert pipeline.behavior_detector.key == (1, 1, False, False)
+    assert pipeline.downscale_width == 480
+    assert pipeline.behavior_detector.pose_history == ['pose']
+    assert lease.released
+
+    # Inside the hysteresis band nothing changes
+    clock.now = 10.0
+    controller.observe(45.0)
+    assert controller.building is None and not controller.apply(pipeline)
+
+    # The low tier cannot be built and is skipped from then on
+    clock.now = 20.0
+    controller.observe(90.0)
+    wait_for_build(controller)
+    assert not controller.apply(pipeline)
+    stats = controller.get_stats()
+    assert stats['unavailable'] == ['low']
+    assert stats['build_failures'] == 1 and stats['last_error'].startswith('low: ')
+
+    # Standard was left over target, so it is not retried straight away
+    clock.now = 25.0
+    controller.observe(10.0)
+    assert controller.building is None
+    clock.now = 40.0
+    controller.observe(10.0)
+    wait_for_build(controller)
+    assert controller.apply(pipeline)
+    assert controller.tier['name'] == 'standard'
+    assert pipeline.downscale_width is None
+
+    stats = controller.get_stats()
+    assert stats['changes'] == 2
+    assert stats['last_change']['from'] == 'reduced' and stats['last_change']['to'] == 'standard'
+    assert stats['time_in_tier'] == {'standard': 4.0, 'reduced': 36.0}
+    controller.close()
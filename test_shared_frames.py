@@ -0,0 +1,96 @@
+import multiprocessing as mp
+import time
+
+import numpy as np
+
+from shared_frames import SharedFrameRing
+
+FRAME_SHAPE = (480, 640, 3)
+TRANSFER_FRAMES = 300
+
+
+def _frame(index):
+    frame = np.empty(FRAME_SHAPE, dtype=np.uint8)
+    frame[...] = index % 251
+    return frame
+
+
+def test_ring_views_overrun_and_slot_reuse():
+    ring = SharedFrameRing.create(num_slots=4, max_shape=FRAME_SHAPE)
+    try:
+        consumer = SharedFrameRing.attach(ring.name)
+        ring.write(_frame(0), frame_id=100, timestamp=1.5)
+        first = consumer.read_next(timeout=0)
+        assert (first.frame_id, first.timestamp, first.frame.shape) == (100, 1.5, FRAME_SHAPE)
+        assert np.shares_memory(first.frame, consumer.data)  # a view, not a copy
+        assert first.frame[0, 0, 0] == 0
+
+        for index in range(1, 10):
+            ring.write(_frame(index), frame_id=100 + index)
+        assert not consumer.is_current(first)  # its slot has been reused
+
+        # Frames 1..6 were overwritten before the consumer got to them
+        second = consumer.read_next(timeout=0)
+        assert second.frame_id == 107 and second.frame[0, 0, 0] == 7
+        assert consumer.get_stats()['overruns'] == 6
+        assert consumer.read_latest(timeout=0).frame_id == 109
+        assert consumer.read_next(timeout=0) is None
+
+        ring.write(np.zeros((240, 320, 3), np.uint8))
+        assert consumer.read_next(timeout=0).frame.shape == (240, 320, 3)
+        first = second = None
+        consumer.close()
+    finally:
+        ring.close()
+
+
+def _ring_consumer(name, count, progress, checksum):
+    ring = SharedFrameRing.attach(name)
+    total = 0
+    for _ in range(count):
+        shared_frame = ring.read_next(timeout=10)
+        total += int(shared_frame.frame[0, 0, 0])
+        progress.value = shared_frame.index + 1
+    checksum.value = total
+    shared_frame = None
+    ring.close()
+
+
+def _queue_consumer(frames, count, checksum):
+    total = 0
+    for _ in range(count):
+        total += int(frames.get()[0, 0, 0])
+    checksum.value = total
+
+
+def test_shared_ring_outpaces_queue_pickling():
+    context = mp.get_context('spawn')
+    expected = sum(index % 251 for index in range(TRANSFER_FRAMES))
+    source = [_frame(index) for index in range(TRANSFER_FRAMES)]
+
+    ring = SharedFrameRing.create(num_slots=8, max_shape=FRAME_SHAPE)
+    progress, checksum = context.Value('q', 0), context.Value('q', -1)
+    consumer = context.Process(target=_ring_consumer, args=(ring.name, TRANSFER_FRAMES, progress, checksum))
+    consumer.start()
+    start = time.perf_counter()
+    for index, frame in enumerate(source):
+        while index - progress.value >= ring.num_slots - 1:  # stay within the ring so no frame is lost
+            time.sleep(0.0001)
+        ring.write(frame, frame_id=index)
+    consumer.join()
+    ring_seconds = time.perf_counter() - start
+    ring.close()
+    assert checksum.value == expected
+
+    frames, checksum = context.Queue(maxsize=8), context.Value('q', -1)
+    consumer = context.Process(target=_queue_consumer, args=(frames, TRANSFER_FRAMES, checksum))
+    consumer.start()
+    start = time.perf_counter()
+    for frame in source:
+        frames.put(frame)
+    consumer.join()
+    queue_seconds = time.perf_counter() - start
+    assert checksum.value == expected
+
+    print(f"shared ring {TRANSFER_FRAMES / ring_seconds:.0f} fps, queue {TRANSFER_FRAMES / queue_seconds:.0f} fps")
+    assert ring_seconds < queue_seconds
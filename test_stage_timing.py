@@ -0,0 +1,53 @@
+from stage_timing import LatencyHistogram, StageTimer, _NULL_STAGE
+
+
+def test_percentiles_of_a_known_distribution():
+    histogram = LatencyHistogram()
+    for ms in range(1, 1001):
+        histogram.add(ms / 1000)
+
+    # A percentile is the upper edge of its ~5% wide bucket
+    for q, expected in ((50, 0.5), (95, 0.95), (99, 0.99)):
+        assert expected <= histogram.percentile(q) <= expected * 1.05
+    assert histogram.percentile(100) == histogram.max == 1.0
+    assert histogram.count == 1000
+    assert LatencyHistogram().percentile(50) == 0.0
+
+
+def test_disabled_timer_records_nothing():
+    timer = StageTimer(enabled=False)
+    stage = timer.stage('pose_inference')
+    assert stage is _NULL_STAGE
+    with stage:
+        pass
+    assert timer.get_summary() == {}
+
+
+def test_timer_can_be_toggled_at_runtime():
+    timer = StageTimer(enabled=False)
+    with timer.stage('face_inference'):
+        pass
+
+    timer.enabled = True
+    for _ in range(3):
+        with timer.stage('face_inference'):
+            pass
+
+    timer.enabled = False
+    with timer.stage('face_inference'):
+        pass
+
+    summary = timer.get_summary()['face_inference']
+    assert summary['count'] == 3
+    assert 0.0 <= summary['p50_ms'] <= summary['p99_ms'] <= summary['max_ms']
+
+
+def test_reset_drops_all_measurements():
+    timer = StageTimer(enabled=True)
+    timer.record('pose_inference', 0.01)
+    timer.record('face_inference', 0.02)
+    timer.reset()
+    assert timer.get_summary() == {}
+
+    timer.record('pose_inference', 0.03)
+    assert timer.get_summary()['pose_inference']['count'] == 1
@@ -0,0 +1,48 @@
+from benchmark_suite import write_synthetic_video
+from conftest import FakeDetector
+from stream_manager import StreamManager
+
+
+def standing(detector, ctx):
+    return {'behavior': 'standing', 'confidence': 0.9, 'keypoints': None}
+
+
+def happy_on_even_frames(detector, ctx):
+    """Happy on even frame ids, a sad face below the emotion threshold on odd ones"""
+    if ctx.frame_id % 2 == 0:
+        return {'emotion': 'happy', 'confidence': 0.9}
+    return {'emotion': 'sad', 'confidence': 0.3}
+
+
+def build_fake_detectors(max_num_faces, model_complexity, refine_landmarks, static_image_mode):
+    key = (max_num_faces, model_complexity, refine_landmarks, static_image_mode)
+    return FakeDetector('behavior', key, standing), FakeDetector('emotion', key, happy_on_even_frames)
+
+
+def test_streams_run_in_separate_processes_and_report_per_stream(tmp_path):
+    sources = {}
+    for name, frames in (('door', 12), ('hall', 8)):
+        path = str(tmp_path / f"{name}.avi")
+        write_synthetic_video(path, frames=frames)
+        sources[name] = path
+
+    manager = StreamManager(sources, behavior_threshold=0.5, emotion_threshold=0.6,
+                            detector_builder=build_fake_detectors).start()
+    try:
+        manager.run(duration=120)
+    finally:
+        manager.stop()
+
+    stats = manager.get_stream_stats()
+    assert stats['door']['frames'] == 12 and stats['hall']['frames'] == 8
+    assert stats['door']['status'] == stats['hall']['status'] == 'finished'
+    assert stats['door']['pid'] != stats['hall']['pid']
+    assert stats['door']['mean_lag_ms'] > 0
+
+    # Every result lands in the shared tracker, attributed to its stream (frame ids start at 1)
+    assert manager.analytics.get_streams() == ['door', 'hall']
+    assert manager.analytics.get_stream_distribution('door') == {'behavior': {'standing': 12},
+                                                                 'emotion': {'happy': 6}}
+    assert manager.analytics.get_stream_distribution('hall') == {'behavior': {'standing': 8},
+                                                                 'emotion': {'happy': 4}}
+    assert manager.analytics.total_detections == 30